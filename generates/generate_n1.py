@@ -3,41 +3,99 @@ import json
 import os
 import sys
 import time
+from functools import partial
 from pathlib import Path
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, Iterable, List
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableSerializable
-from langchain_ollama import OllamaLLM
-
 from config.models import MODEL_NAMES
+from utils.generates.call_metrics import CallMetrics, call_labels, call_metrics_enabled
+from utils.generates.dedup import Dedup, dedup_enabled, work_key
 from utils.generates.generate_config import generate_config
+from utils.generates.get_hosts import get_hosts
 from utils.generates.invoke_with_timeout import invoke_with_timeout
+from utils.generates.llm_cache import open_cache
+from utils.generates.llm_chain import build_chain
 from utils.generates.meta import build_meta, env_seed
-from utils.generates.reset_model import reset_model
-from utils.generates.resume import (
-    append_checkpoint,
-    clear_checkpoint,
-    load_existing_output,
-)
+from utils.generates.predict_store import PredictStore
+from utils.generates.request_sizing import RequestSizer, sizing_enabled
+from utils.generates.retry_policy import RetryPolicy
+from utils.generates.run_layers import close_layers, layers_meta
+from utils.generates.run_pipeline import config_error
+from utils.generates.streaming_chain import StreamStats, streaming_enabled
+from utils.generates.text_scheduler import run_texts
+from utils.logs import metrics_exporter
 from utils.logs.init_log import init_log
 from utils.n1.empty_operators import empty_operators
+from utils.n1.expected_output_tokens import expected_output_tokens
+from utils.n1.output_complete import output_complete
 from utils.n1.process_text import process_text
 
 
 PROMPT_PATH: Path = Path("prompts") / "n1.txt"
 
 
+def _process_text(
+    chain: Any,
+    item: Dict[str, Any],
+    host: str,
+    retry: RetryPolicy,
+    log: Callable[[str], None],
+) -> List[str]:
+    processed_result: List[str] = []
+    for attempt in retry.attempts(host):
+        log(f"Chamando modelo (tentativa {attempt})")
+        try:
+            result: str | None
+            timed_out: bool
+            with call_labels(attempt=attempt):
+                result, timed_out = invoke_with_timeout(
+                    chain,
+                    {"text": item["text"]},
+                    log=log,
+                )
+            if timed_out:
+                raise TimeoutError("Timeout na chamada do modelo (requisicao cancelada).")
+            if result is None:
+                raise RuntimeError("Resposta vazia do modelo.")
+        except Exception as exc:
+            print(f"Erro na chamada do modelo (tentativa {attempt}): {exc}")
+            log(f"Erro na chamada do modelo (tentativa {attempt}): {exc}")
+            if not retry.failure(host, exc, attempt):
+                break
+            continue
+        retry.success(host)
+        log(f"Saida do modelo:\n{result}")
+        env_debug = os.getenv("GENERATE_DEBUG", "1").strip().lower()
+        if env_debug in {"1", "true", "yes", "on"}:
+            print("Saida do modelo:")
+            print(result)
+        processed_result = process_text(result)
+        if processed_result:
+            break
+        metrics_exporter.count("parse_failures", level="n1")
+        print(f"Tentativa {attempt} retornou vazio. Repetindo.")
+        log(f"Tentativa {attempt} retornou vazio. Repetindo.")
+    return processed_result
+
+
+def _work_key(item: Dict[str, Any]) -> str:
+    return work_key("n1", {"text": item["text"]})
+
+
 def generate_n1(
     input_path: str | None = None,
     output_path: str | None = None,
     model_id: str | None = None,
     log_path: str | None = None,
+    hosts: List[str] | None = None,
+    source: Iterable[Dict[str, Any]] | None = None,
+    sink: Callable[[int, Dict[str, Any]], None] | None = None,
 ) -> None:
+    chained = source is not None or sink is not None
     if input_path is None or output_path is None or model_id is None:
         parser = argparse.ArgumentParser(description="Gerar sentencas RASE N1.")
         parser.add_argument(
@@ -62,25 +120,27 @@ def generate_n1(
         log_path = log_path or args.log_path
 
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    data: Dict[str, Any] = {}
     log: Callable[[str], None]
     close_log: Callable[[], None]
     log, close_log = init_log(output_path, log_path)
 
-    try:
-        with open(input_path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-    except FileNotFoundError:
-        print("Erro: Arquivo de entrada nao encontrado.")
-        return
-    except json.JSONDecodeError:
-        print("Erro: Falha ao decodificar JSON de entrada.")
-        return
+    if source is None:
+        # Sem estagio anterior (run_pipeline.py), le o predict/dataset de entrada.
+        try:
+            with open(input_path, "r", encoding="utf-8") as file:
+                data: Dict[str, Any] = json.load(file)
+        except FileNotFoundError:
+            config_error("Erro: Arquivo de entrada nao encontrado.", chained)
+            return
+        except json.JSONDecodeError:
+            config_error("Erro: Falha ao decodificar JSON de entrada.", chained)
+            return
+        source = data.get("datas", [])
 
     try:
         template: str = PROMPT_PATH.read_text(encoding="utf-8")
     except FileNotFoundError:
-        print("Erro: prompt n1 nao encontrado em prompts/n1.txt.")
+        config_error("Erro: prompt n1 nao encontrado em prompts/n1.txt.", chained)
         return
 
     seed = env_seed()
@@ -93,18 +153,37 @@ def generate_n1(
         "repeat_penalty": 1.1,
         "num_predict": 512,
         "stop": ["TEXTO_INICIO", "TEXTO_FIM", "Entrada:", "Saida:"],
-        "client_kwargs": {"timeout": 600},
     }
     if seed is not None:
         llm_kwargs["seed"] = seed
     if keep_alive:
         llm_kwargs["keep_alive"] = keep_alive
-    llm: OllamaLLM = OllamaLLM(**llm_kwargs)
-    prompt: ChatPromptTemplate = ChatPromptTemplate.from_template(template)
-    chain: RunnableSerializable[Dict[str, str], str] = prompt | llm
+    stream_stats: StreamStats | None = StreamStats() if streaming_enabled() else None
+    cache = open_cache(seed)
+    retry = RetryPolicy(log, level="n1")
+    sizer: RequestSizer | None = (
+        RequestSizer(expected_output_tokens, log) if sizing_enabled() else None
+    )
+    hosts = hosts or get_hosts()
+    chains: Dict[str, Any] = {}
+
+    def _chain(host: str) -> Any:
+        # Um cliente por host; so a thread do worker daquele host usa a chain.
+        if host not in chains:
+            chains[host] = build_chain(
+                template, llm_kwargs, host, metrics=call_metrics, sizer=sizer,
+                stream_stats=stream_stats, stream_check=output_complete, cache=cache,
+                log=log,
+            )
+        return chains[host]
 
-    existing = load_existing_output(output_path)
+    store = PredictStore(output_path)
+    existing = store.load()
     resume_from = len(existing.get("datas", [])) if existing else 0
+    call_metrics: CallMetrics | None = (
+        CallMetrics(output_path, resume=existing is not None, level="n1")
+        if call_metrics_enabled() else None
+    )
     result_data: Dict[str, Any] = {
         "meta": build_meta(model_id=model_id, prompt_text=template, seed=seed),
         "counts": resume_from,
@@ -112,100 +191,90 @@ def generate_n1(
         "time": float(existing.get("time", 0.0)) if existing else 0.0,
     }
     total_start_time: float = time.time() - result_data["time"]
+    dedup: Dedup | None = None
+    if dedup_enabled():
+        dedup = Dedup(
+            [_work_key(item) for item in source[resume_from:]]
+            if isinstance(source, list) else None
+        )
+        result_data["meta"]["dedup"] = dedup.snapshot()
 
-    if resume_from == 0:
-        with open(output_path, "w", encoding="utf-8") as file:
-            json.dump(result_data, file, ensure_ascii=False, indent=2)
-        clear_checkpoint(output_path)
-    else:
+    store.begin(result_data)
+    if resume_from > 0:
         log(f"Retomando execucao a partir do item {resume_from + 1}.")
 
     log(
         f"Inicio geracao N1. Modelo={model_id} Entrada={input_path} Saida={output_path}"
     )
-    log(f"Total de textos: {len(data.get('datas', []))} (ja processados: {resume_from})")
+    total = len(source) if isinstance(source, list) else "em fluxo"
+    if isinstance(source, list):
+        metrics_exporter.set_gauge("texts", len(source), level="n1", model=model_id)
+    log(f"Total de textos: {total} (ja processados: {resume_from})")
+    if dedup is not None:
+        print(dedup.describe())
+        log(dedup.describe())
+    if sizer is not None:
+        counter = sizer.estimator.name or "razao caracteres/token"
+        log(f"num_ctx e num_predict por chamada; tokens contados por {counter}.")
+
+    if len(hosts) > 1:
+        log(f"Hosts Ollama: {', '.join(hosts)}")
+
+    def _process(host: str, count: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        raw_text = item["text"].replace("\n", " ").strip()
+        preview = raw_text[:40].rstrip()
+        suffix = "..." if len(raw_text) > 40 else ""
+        start_time: float = time.time()
+        where = f" [{host}]" if len(hosts) > 1 else ""
+
+        log(f"Iniciando Texto {count}{where}: {preview}{suffix}")
+        job = partial(_process_text, _chain(host), item, host, retry, log)
+        if dedup is not None:
+            job = partial(dedup.run, _work_key(item), job)
+        with call_labels(text=count):
+            processed_result = job()
+        elapsed_time: float = time.time() - start_time
+        if not processed_result:
+            msg = "Falha ao processar texto apos as tentativas. Seguindo."
+            print(msg)
+            log(msg)
+        texts_n1: List[Dict[str, Any]] = [
+            {"text_n1": sentence, "operators_n2": empty_operators()}
+            for sentence in processed_result
+        ]
+        print(f"Texto {count} ({elapsed_time:.2f}s): {preview}{suffix}")
+        log(f"Texto {count} concluido ({elapsed_time:.2f}s)")
+        return {"text": item["text"], "texts_n1": texts_n1}
+
+    def _commit(count: int, result_entry: Dict[str, Any]) -> None:
+        result_data["datas"].append(result_entry)
+        result_data["counts"] = count
+        metrics_exporter.set_gauge("text_index", count, level="n1", model=model_id)
+        result_data["time"] = time.time() - total_start_time
+
+        layers_meta(
+            result_data["meta"], retry, dedup, sizer, None, cache, stream_stats,
+            call_metrics,
+        )
+
+        store.commit(count, result_entry)
+        if sink is not None:
+            sink(count, result_entry)
 
     try:
-        for count, item in enumerate(data["datas"], start=1):
-            if count <= resume_from:
-                continue
-            raw_text = item["text"].replace("\n", " ").strip()
-            preview = raw_text[:40].rstrip()
-            suffix = "..." if len(raw_text) > 40 else ""
-            start_time: float = time.time()
-            processed_result: List[str] = []
-
-            log(f"Iniciando Texto {count}: {preview}{suffix}")
-            for attempt in range(1, 4):
-                log(f"Chamando modelo (tentativa {attempt})")
-                try:
-                    result: str | None
-                    timed_out: bool
-                    result, timed_out = invoke_with_timeout(
-                        chain,
-                        {"text": item["text"]},
-                        600.0,
-                        60.0,
-                        log,
-                    )
-                    if timed_out:
-                        msg = (
-                            "Timeout na chamada do modelo "
-                            f"apos {int(600.0)}s."
-                        )
-                        print(msg)
-                        log(msg)
-                        reset_model(model_id, log)
-                        continue
-                    if result is None:
-                        raise RuntimeError("Resposta vazia do modelo.")
-                except Exception as exc:
-                    print(f"Erro na chamada do modelo (tentativa {attempt}): {exc}")
-                    log(f"Erro na chamada do modelo (tentativa {attempt}): {exc}")
-                    if attempt < 3:
-                        time.sleep(1)
-                    continue
-                log(f"Saida do modelo:\n{result}")
-                env_debug = os.getenv("GENERATE_DEBUG", "1").strip().lower()
-                if env_debug in {"1", "true", "yes", "on"}:
-                    print("Saida do modelo:")
-                    print(result)
-                processed_result = process_text(result)
-                if processed_result:
-                    break
-                print(f"Tentativa {attempt} retornou vazio. Repetindo.")
-                log(f"Tentativa {attempt} retornou vazio. Repetindo.")
-            end_time: float = time.time()
-
-            elapsed_time: float = end_time - start_time
-            if not processed_result:
-                msg = (
-                    "Falha ao processar texto "
-                    "apos 3 tentativas. Seguindo."
-                )
-                print(msg)
-                log(msg)
-            texts_n1: List[Dict[str, Any]] = [
-                {"text_n1": sentence, "operators_n2": empty_operators()}
-                for sentence in processed_result
-            ]
-            result_entry: Dict[str, Any] = {"text": item["text"], "texts_n1": texts_n1}
-
-            result_data["datas"].append(result_entry)
-            result_data["counts"] = count
-            result_data["time"] = time.time() - total_start_time
-
-            append_checkpoint(output_path, result_entry)
-            tmp_path = output_path + ".tmp"
-            with open(tmp_path, "w", encoding="utf-8") as file:
-                json.dump(result_data, file, ensure_ascii=False, indent=2)
-                file.flush()
-                os.fsync(file.fileno())
-            os.replace(tmp_path, output_path)
-
-            print(f"Texto {count} ({elapsed_time:.2f}s): {preview}{suffix}")
-            log(f"Texto {count} concluido ({elapsed_time:.2f}s)")
+        if sink is not None:
+            # Textos ja gerados numa execucao anterior seguem para o proximo estagio.
+            for count, result_entry in enumerate(result_data["datas"], start=1):
+                sink(count, result_entry)
+        pending = (
+            (count, item)
+            for count, item in enumerate(source, start=1)
+            if count > resume_from
+        )
+        run_texts(pending, hosts, _process, _commit, log)
     finally:
+        close_layers(log, cache, stream_stats, call_metrics)
+        store.close()
         close_log()
 
     print(f"Processamento concluido. Tempo total: {result_data['time']:.2f} segundos.")
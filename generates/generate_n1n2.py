@@ -61,6 +61,7 @@ def generate_n1n2() -> None:
     parser.add_argument("--input", dest="input_path", default=None)
     parser.add_argument("--output", dest="output_path", default=None)
     parser.add_argument("--log", dest="log_path", default=None)
+    parser.add_argument("--batch-size", dest="batch_size", type=int, default=None)
     args: argparse.Namespace = parser.parse_args()
 
     if args.model not in MODELS:
@@ -82,6 +83,7 @@ def generate_n1n2() -> None:
         output_path=output_path,
         model_id=model_id,
         log_path=args.log_path,
+        batch_size=args.batch_size,
     )
 
 
@@ -8,6 +8,7 @@ if str(PROJECT_ROOT) not in sys.path:
 
 from config.models import MODELS, MODEL_NAMES
 from generates.generate_n3 import generate_n3
+from utils.generates.n3_mode import N3_MODES
 
 
 def generate_n1n2n3() -> None:
@@ -21,6 +22,7 @@ def generate_n1n2n3() -> None:
     parser.add_argument("--input", dest="input_path", default=None)
     parser.add_argument("--output", dest="output_path", default=None)
     parser.add_argument("--log", dest="log_path", default=None)
+    parser.add_argument("--mode", choices=N3_MODES, default=None)
     args: argparse.Namespace = parser.parse_args()
 
     if args.model not in MODELS:
@@ -42,6 +44,7 @@ def generate_n1n2n3() -> None:
         output_path=output_path,
         model_id=model_id,
         log_path=args.log_path,
+        mode=args.mode,
     )
 
 
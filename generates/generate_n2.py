@@ -3,33 +3,258 @@ import json
 import os
 import sys
 import time
+from functools import partial
 from pathlib import Path
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableSerializable
-from langchain_ollama import OllamaLLM
-
 from config.models import MODEL_NAMES
+from utils.generates.async_engine import max_inflight, run_bounded
+from utils.generates.call_metrics import CallMetrics, call_labels, call_metrics_enabled
+from utils.generates.cascade import Cascade, cascade_model
+from utils.generates.dedup import Dedup, dedup_enabled, work_key
 from utils.generates.generate_config import generate_config
+from utils.generates.get_hosts import get_hosts
 from utils.generates.meta import build_meta, env_seed
-from utils.generates.resume import (
-    append_checkpoint,
-    clear_checkpoint,
-    load_existing_output,
-)
+from utils.generates.pause_controller import PauseController
+from utils.generates.predict_store import PredictStore
+from utils.generates.request_sizing import RequestSizer, sizing_enabled
+from utils.generates.retry_policy import RetryPolicy
+from utils.generates.run_layers import close_layers, layers_meta
+from utils.generates.run_pipeline import config_error
 from utils.generates.invoke_with_timeout import invoke_with_timeout
-from utils.generates.reset_model import reset_model
+from utils.generates.llm_cache import open_cache
+from utils.generates.llm_chain import build_chain
+from utils.generates.streaming_chain import StreamStats, streaming_enabled
+from utils.generates.text_scheduler import run_texts
+from utils.logs import metrics_exporter
 from utils.logs.init_log import init_log
 from utils.n2.build_operators import build_operators
-from utils.n2.process_text import process_text
+from utils.n2.expected_output_tokens import expected_output_tokens
+from utils.n2.output_accepted import output_accepted
+from utils.n2.output_complete import batch_output_complete, output_complete
+from utils.n2.process_text import process_batch_text, process_text
 
 
 PROMPT_PATH: Path = Path("prompts") / "n2.txt"
+BATCH_PROMPT_PATH: Path = Path("prompts") / "n2_batch.txt"
+
+
+def _process_sentence(
+    chain: Any,
+    item: Dict[str, Any],
+    text_n1: str,
+    count: int,
+    n1_index: int,
+    host: str,
+    retry: RetryPolicy,
+    log: Callable[[str], None],
+) -> Dict[str, str]:
+    processed_result: Dict[str, str] = {}
+
+    for attempt in retry.attempts(host):
+        log(
+            "Chamando modelo "
+            f"(texto {count}, sentenca {n1_index}, tentativa {attempt})"
+        )
+        try:
+            result: str | None
+            timed_out: bool
+            with call_labels(text=count, sentence=n1_index, attempt=attempt):
+                result, timed_out = invoke_with_timeout(
+                    chain,
+                    {"text": item["text"], "text_n1": text_n1},
+                    log=log,
+                )
+            if timed_out:
+                raise TimeoutError("Timeout na chamada do modelo (requisicao cancelada).")
+            if result is None:
+                raise RuntimeError("Resposta vazia do modelo.")
+        except Exception as exc:
+            print(
+                "Erro na chamada do modelo "
+                f"(texto {count}, sentenca {n1_index}, "
+                f"tentativa {attempt}): {exc}"
+            )
+            log(
+                "Erro na chamada do modelo "
+                f"(texto {count}, sentenca {n1_index}, "
+                f"tentativa {attempt}): {exc}"
+            )
+            if not retry.failure(host, exc, attempt):
+                break
+            continue
+
+        retry.success(host)
+        log(f"Saida do modelo:\n{result}")
+        env_debug = os.getenv("GENERATE_DEBUG", "1").strip().lower()
+        if env_debug in {"1", "true", "yes", "on"}:
+            print("Saida do modelo:")
+            print(result)
+        processed_result = process_text(result)
+        if not processed_result:
+            metrics_exporter.count("parse_failures", level="n2")
+        break
+
+    if not processed_result:
+        msg = (
+            "Falha ao processar texto "
+            f"(texto {count}, sentenca {n1_index})."
+        )
+        print(msg)
+        log(msg)
+    return processed_result
+
+
+def _format_batch(texts: List[str]) -> str:
+    return "\n".join(
+        f'Sentenca {index}:\n"{text_n1}"' for index, text_n1 in enumerate(texts, start=1)
+    )
+
+
+def _process_batch(
+    chain: Any,
+    item: Dict[str, Any],
+    window: List[Tuple[int, str]],
+    count: int,
+    host: str,
+    retry: RetryPolicy,
+    log: Callable[[str], None],
+) -> List[Dict[str, str] | None]:
+    """Uma chamada para varias sentencas; None marca as que precisam de chamada individual."""
+    first, last = window[0][0], window[-1][0]
+    payload = {
+        "text": item["text"],
+        "texts_n1": _format_batch([text_n1 for _, text_n1 in window]),
+    }
+    parsed: List[Dict[str, str] | None] = [None] * len(window)
+
+    for attempt in retry.attempts(host):
+        log(
+            "Chamando modelo "
+            f"(texto {count}, sentencas {first}-{last}, tentativa {attempt})"
+        )
+        try:
+            with call_labels(text=count, sentence=f"{first}-{last}", attempt=attempt):
+                result, timed_out = invoke_with_timeout(chain, payload, log=log)
+            if timed_out:
+                raise TimeoutError("Timeout na chamada do modelo (requisicao cancelada).")
+            if result is None:
+                raise RuntimeError("Resposta vazia do modelo.")
+        except Exception as exc:
+            log(
+                "Erro na chamada do modelo "
+                f"(texto {count}, sentencas {first}-{last}, "
+                f"tentativa {attempt}): {exc}"
+            )
+            if not retry.failure(host, exc, attempt):
+                break
+            continue
+
+        retry.success(host)
+        log(f"Saida do modelo (lote {first}-{last}):\n{result}")
+        parsed = process_batch_text(result, len(window))
+        if any(block is not None for block in parsed):
+            break
+        metrics_exporter.count("parse_failures", level="n2")
+    return parsed
+
+
+def _sentence_key(item: Dict[str, Any], text_n1: str) -> str:
+    return work_key("n2", {"text": item["text"], "text_n1": text_n1})
+
+
+def _batch_key(item: Dict[str, Any], texts: List[str]) -> str:
+    return work_key("n2_batch", {"text": item["text"], "texts_n1": texts})
+
+
+def _plan_keys(
+    item: Dict[str, Any], batch_size: int, recorded: Callable[[int], Any]
+) -> List[str]:
+    """Chaves das chamadas previstas para o texto (janelas como em `_process_batched`).
+
+    `recorded(sentenca)` devolve o resultado ja registrado no journal; essas
+    sentencas nao voltam ao modelo e ficam fora do plano.
+    """
+    texts = [
+        n1_item.get("text_n1", "")
+        for index, n1_item in enumerate(item.get("texts_n1", []), start=1)
+        if recorded(index) is None
+    ]
+    if batch_size == 1:
+        return [_sentence_key(item, text_n1) for text_n1 in texts]
+    size = max(1, len(texts)) if batch_size <= 0 else batch_size
+    windows = [texts[i : i + size] for i in range(0, len(texts), size)]
+    return [
+        _sentence_key(item, window[0]) if len(window) == 1 else _batch_key(item, window)
+        for window in windows
+    ]
+
+
+# Fabricas de jobs montadas em generate_n2 (modelo principal, cascata, deduplicacao).
+SentenceJob = Callable[[int, str], Callable[[], Dict[str, str]]]
+BatchJob = Callable[
+    [List[Tuple[int, str]]], Callable[[], List[Dict[str, str] | None]]
+]
+
+
+def _process_batched(
+    batch_job: BatchJob,
+    sentence_job: SentenceJob,
+    item: Dict[str, Any],
+    batch_size: int,
+    count: int,
+    host: str,
+    store: PredictStore,
+    log: Callable[[str], None],
+) -> List[Dict[str, str]]:
+    texts = [n1_item.get("text_n1", "") for n1_item in item.get("texts_n1", [])]
+    # Sentencas ja registradas no journal (retomada) ficam fora dos lotes.
+    results: List[Dict[str, str] | None] = [
+        store.call_result(count, index) for index in range(1, len(texts) + 1)
+    ]
+    indexed = [
+        (index, text_n1)
+        for index, text_n1 in enumerate(texts, start=1)
+        if results[index - 1] is None
+    ]
+    size = max(1, len(indexed)) if batch_size <= 0 else batch_size
+    windows = [indexed[i : i + size] for i in range(0, len(indexed), size)]
+
+    jobs: List[Callable[[], List[Dict[str, str] | None]]] = [
+        batch_job(window) for window in windows if len(window) > 1
+    ]
+    batch_results = iter(run_bounded(jobs, host))
+    for window in windows:
+        if len(window) == 1:
+            continue
+        for (index, _), parsed in zip(window, next(batch_results)):
+            if parsed is not None:
+                store.record_call(count, index, "", parsed)
+                results[index - 1] = parsed
+
+    fallback = [index for index, parsed in enumerate(results) if parsed is None]
+    if fallback:
+        log(
+            f"Texto {count}: {len(fallback)} sentenca(s) fora do lote; "
+            "chamando individualmente."
+        )
+    fallback_jobs: List[Callable[[], Dict[str, str]]] = [
+        partial(
+            store.resumable,
+            count,
+            index + 1,
+            "",
+            sentence_job(index + 1, texts[index]),
+        )
+        for index in fallback
+    ]
+    for index, parsed in zip(fallback, run_bounded(fallback_jobs, host)):
+        results[index] = parsed
+    return [parsed or {} for parsed in results]
 
 
 def generate_n2(
@@ -37,7 +262,12 @@ def generate_n2(
     output_path: str | None = None,
     model_id: str | None = None,
     log_path: str | None = None,
+    batch_size: int | None = None,
+    hosts: List[str] | None = None,
+    source: Iterable[Dict[str, Any]] | None = None,
+    sink: Callable[[int, Dict[str, Any]], None] | None = None,
 ) -> None:
+    chained = source is not None or sink is not None
     if input_path is None or output_path is None or model_id is None:
         parser = argparse.ArgumentParser(description="Gerar operadores RASE N2.")
         parser.add_argument(
@@ -49,6 +279,13 @@ def generate_n2(
         parser.add_argument("--input", dest="input_path", default=None)
         parser.add_argument("--output", dest="output_path", default=None)
         parser.add_argument("--log", dest="log_path", default=None)
+        parser.add_argument(
+            "--batch-size",
+            dest="batch_size",
+            type=int,
+            default=None,
+            help="Sentencas N1 por chamada (1 = uma por chamada, 0 = todas do texto).",
+        )
         args: argparse.Namespace = parser.parse_args()
 
         input_path, output_path, model_id = generate_config("n2", args.model)
@@ -60,32 +297,35 @@ def generate_n2(
         if args.output_path:
             output_path = args.output_path
         log_path = args.log_path
+        batch_size = args.batch_size
 
     if input_path is None or output_path is None or model_id is None:
-        print("Erro: parametros obrigatorios nao encontrados.")
+        config_error("Erro: parametros obrigatorios nao encontrados.", chained)
         return
 
     try:
         template: str = PROMPT_PATH.read_text(encoding="utf-8")
     except FileNotFoundError:
-        print("Erro: prompt n2 nao encontrado em prompts/n2.txt.")
+        config_error("Erro: prompt n2 nao encontrado em prompts/n2.txt.", chained)
         return
 
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    data: Dict[str, Any] = {}
     log: Callable[[str], None]
     close_log: Callable[[], None]
     log, close_log = init_log(output_path, log_path)
 
-    try:
-        with open(input_path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-    except FileNotFoundError:
-        print("Erro: Arquivo de entrada nao encontrado.")
-        return
-    except json.JSONDecodeError:
-        print("Erro: Falha ao decodificar JSON de entrada.")
-        return
+    if source is None:
+        # Sem estagio anterior (run_pipeline.py), le o predict/dataset de entrada.
+        try:
+            with open(input_path, "r", encoding="utf-8") as file:
+                data: Dict[str, Any] = json.load(file)
+        except FileNotFoundError:
+            config_error("Erro: Arquivo de entrada nao encontrado.", chained)
+            return
+        except json.JSONDecodeError:
+            config_error("Erro: Falha ao decodificar JSON de entrada.", chained)
+            return
+        source = data.get("datas", [])
 
     seed = env_seed()
 
@@ -110,6 +350,18 @@ def generate_n2(
     num_predict = _env_int("N2_NUM_PREDICT", 512)
     keep_alive = os.environ.get("N2_KEEP_ALIVE", "30s").strip()
     pause_between_texts = _env_float("N2_TEMP_PAUSE", 2.0)
+    if batch_size is None:
+        batch_size = _env_int("N2_BATCH_SIZE", 1)
+
+    batch_template: str = ""
+    if batch_size != 1:
+        try:
+            batch_template = BATCH_PROMPT_PATH.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            config_error(
+                "Erro: prompt n2 em lote nao encontrado em prompts/n2_batch.txt.", chained
+            )
+            return
 
     llm_kwargs: Dict[str, Any] = {
         "model": model_id,
@@ -117,145 +369,249 @@ def generate_n2(
         "top_p": 0.9,
         "repeat_penalty": 1.1,
         "num_predict": num_predict,
-        "client_kwargs": {"timeout": 600},
     }
     if seed is not None:
         llm_kwargs["seed"] = seed
     if keep_alive:
         llm_kwargs["keep_alive"] = keep_alive
-    llm: OllamaLLM = OllamaLLM(**llm_kwargs)
-    prompt: ChatPromptTemplate = ChatPromptTemplate.from_template(template)
-    chain: RunnableSerializable[Dict[str, str], str] = prompt | llm
-
-    existing = load_existing_output(output_path)
+    stream_stats: StreamStats | None = StreamStats() if streaming_enabled() else None
+    cache = open_cache(seed)
+    retry = RetryPolicy(log, level="n2")
+    sizer: RequestSizer | None = (
+        RequestSizer(expected_output_tokens, log) if sizing_enabled() else None
+    )
+    prompt_for_meta = "\n---\n".join(t for t in (template, batch_template) if t)
+    hosts = hosts or get_hosts()
+    chains: Dict[Tuple[str, str], Any] = {}
+    pausers: Dict[str, PauseController] = {}
+    batch_chains: Dict[Tuple[str, int], Any] = {}
+
+    def _pauser(host: str) -> PauseController:
+        if host not in pausers:
+            pausers[host] = PauseController(pause_between_texts, host)
+        return pausers[host]
+
+    def _chain(host: str, chain_model: str | None = None) -> Any:
+        # Um cliente por host (e modelo, na cascata); so o worker daquele host usa a chain.
+        chain_model = chain_model or model_id
+        if (host, chain_model) not in chains:
+            chains[(host, chain_model)] = build_chain(
+                template, {**llm_kwargs, "model": chain_model}, host,
+                metrics=call_metrics, sizer=sizer, pauser=_pauser(host),
+                stream_stats=stream_stats, stream_check=output_complete, cache=cache,
+                log=log,
+            )
+        return chains[(host, chain_model)]
+
+    def _batch_chain(host: str, size: int) -> Any:
+        # num_predict cresce com o lote; uma chain por host e tamanho de janela.
+        if (host, size) not in batch_chains:
+            batch_chains[(host, size)] = build_chain(
+                batch_template, {**llm_kwargs, "num_predict": num_predict * size}, host,
+                metrics=call_metrics, sizer=sizer, pauser=_pauser(host),
+                stream_stats=stream_stats, stream_check=batch_output_complete(size),
+                cache=cache, group_template=prompt_for_meta, log=log,
+            )
+        return batch_chains[(host, size)]
+
+    store = PredictStore(output_path)
+    existing = store.load()
     resume_from = len(existing.get("datas", [])) if existing else 0
+    call_metrics: CallMetrics | None = (
+        CallMetrics(output_path, resume=existing is not None, level="n2")
+        if call_metrics_enabled() else None
+    )
     result_data: Dict[str, Any] = {
-        "meta": build_meta(model_id=model_id, prompt_text=template, seed=seed),
+        "meta": build_meta(
+            model_id=model_id,
+            prompt_text=prompt_for_meta,
+            seed=seed,
+            extra={"batch_size": batch_size},
+        ),
         "counts": resume_from,
         "datas": list(existing.get("datas", [])) if existing else [],
         "time": float(existing.get("time", 0.0)) if existing else 0.0,
+        "time_pause": float(existing.get("time_pause", 0.0)) if existing else 0.0,
+        "time_compute": 0.0,
     }
+    previous_pause: float = result_data["time_pause"]
     total_start_time: float = time.time() - result_data["time"]
+    cheap_model = cascade_model(model_id)
+    cascade: Cascade | None = None
+    if cheap_model is not None:
+        cascade = Cascade(cheap_model, (existing or {}).get("meta", {}).get("cascade"), log)
+        result_data["meta"]["cascade"] = cascade.snapshot()
+    dedup: Dedup | None = None
+    if dedup_enabled():
+        dedup = Dedup(
+            [
+                key
+                for count, item in enumerate(source[resume_from:], start=resume_from + 1)
+                for key in _plan_keys(
+                    item, batch_size, partial(store.call_result, count)
+                )
+            ]
+            if isinstance(source, list) else None
+        )
+        result_data["meta"]["dedup"] = dedup.snapshot()
 
-    if resume_from == 0:
-        with open(output_path, "w", encoding="utf-8") as file:
-            json.dump(result_data, file, ensure_ascii=False, indent=2)
-        clear_checkpoint(output_path)
-    else:
+    store.begin(result_data)
+    if resume_from > 0:
         log(f"Retomando execucao N2 a partir do item {resume_from + 1}.")
+    if store.recovered_calls():
+        log(f"Retomando {store.recovered_calls()} chamada(s) ja concluidas no journal.")
 
     log(
         "Inicio geracao N2. "
         f"Modelo={model_id} Entrada={input_path} Saida={output_path}"
     )
-    log(f"Total de textos: {len(data.get('datas', []))} (ja processados: {resume_from})")
-
-    try:
-        for count, item in enumerate(data["datas"], start=1):
-            if count <= resume_from:
-                continue
-            raw_text = item["text"].replace("\n", " ").strip()
-            preview = raw_text[:40].rstrip()
-            suffix = "..." if len(raw_text) > 40 else ""
-            start_time: float = time.time()
-
-            log(f"Iniciando Texto {count}: {preview}{suffix}")
-            texts_n1: List[Dict[str, Any]] = []
-            for n1_index, n1_item in enumerate(item.get("texts_n1", []), start=1):
-                text_n1 = n1_item.get("text_n1", "")
-                processed_result: Dict[str, str] = {}
-
-                for attempt in range(1, 4):
-                    log(
-                        "Chamando modelo "
-                        f"(texto {count}, sentenca {n1_index}, tentativa {attempt})"
-                    )
-                    try:
-                        result: str | None
-                        timed_out: bool
-                        result, timed_out = invoke_with_timeout(
-                            chain,
-                            {"text": item["text"], "text_n1": text_n1},
-                            600.0,
-                            60.0,
-                            log,
-                        )
-                        if timed_out:
-                            msg = (
-                                "Timeout na chamada do modelo "
-                                f"apos {int(600.0)}s."
-                            )
-                            print(msg)
-                            log(msg)
-                            reset_model(model_id, log)
-                            continue
-                        if result is None:
-                            raise RuntimeError("Resposta vazia do modelo.")
-                    except Exception as exc:
-                        print(
-                            "Erro na chamada do modelo "
-                            f"(texto {count}, sentenca {n1_index}, "
-                            f"tentativa {attempt}): {exc}"
-                        )
-                        log(
-                            "Erro na chamada do modelo "
-                            f"(texto {count}, sentenca {n1_index}, "
-                            f"tentativa {attempt}): {exc}"
-                        )
-                        if attempt < 3:
-                            time.sleep(1)
-                        continue
-
-                    log(f"Saida do modelo:\n{result}")
-                    env_debug = os.getenv("GENERATE_DEBUG", "1").strip().lower()
-                    if env_debug in {"1", "true", "yes", "on"}:
-                        print("Saida do modelo:")
-                        print(result)
-                    processed_result = process_text(result)
-                    break
-
-                if not processed_result:
-                    msg = (
-                        "Falha ao processar texto "
-                        f"(texto {count}, sentenca {n1_index})."
-                    )
-                    print(msg)
-                    log(msg)
-                operators_n2 = build_operators(processed_result)
-                texts_n1.append(
-                    {
-                        "text_n1": text_n1,
-                        "operators_n2": operators_n2,
-                    }
+    total = len(source) if isinstance(source, list) else "em fluxo"
+    if isinstance(source, list):
+        metrics_exporter.set_gauge("texts", len(source), level="n2", model=model_id)
+    log(f"Total de textos: {total} (ja processados: {resume_from})")
+    log(f"Chamadas simultaneas por host: {max_inflight()}")
+    if dedup is not None:
+        print(dedup.describe())
+        log(dedup.describe())
+    if sizer is not None:
+        counter = sizer.estimator.name or "razao caracteres/token"
+        log(f"num_ctx e num_predict por chamada; tokens contados por {counter}.")
+    if batch_size != 1:
+        window_label = "todas" if batch_size <= 0 else str(batch_size)
+        log(f"Modo em lote: {window_label} sentencas N1 por chamada.")
+
+    if cheap_model is not None:
+        log(f"Modo cascata: {cheap_model} primeiro, {model_id} nas escaladas.")
+    if len(hosts) > 1:
+        log(f"Hosts Ollama: {', '.join(hosts)}")
+
+    def _sentence_job(
+        host: str, item: Dict[str, Any], count: int, n1_index: int, text_n1: str
+    ) -> Callable[[], Dict[str, str]]:
+        main_job = partial(
+            _process_sentence, _chain(host), item, text_n1, count, n1_index,
+            host, retry, log,
+        )
+        job: Callable[[], Dict[str, str]] = main_job
+        if cascade is not None and cheap_model is not None:
+            # Circuito proprio para o modelo barato: falhas dele nao derrubam o host.
+            cheap_job = partial(
+                _process_sentence, _chain(host, cheap_model), item, text_n1, count,
+                n1_index, f"{host} [{cheap_model}]", retry, log,
+            )
+            key = f"{count}:{n1_index}"
+            answer: Callable[[], Tuple[str, Dict[str, str]]] = partial(
+                cascade.run, host, key, cheap_job, main_job,
+                partial(output_accepted, text_n1=text_n1),
+            )
+            if dedup is not None:
+                # O nivel acompanha o resultado copiado para as outras posicoes.
+                answer = partial(dedup.run, _sentence_key(item, text_n1), answer)
+            return partial(cascade.record, key, answer)
+        if dedup is not None:
+            job = partial(dedup.run, _sentence_key(item, text_n1), job)
+        return job
+
+    def _batch_job(
+        host: str, item: Dict[str, Any], count: int, window: List[Tuple[int, str]]
+    ) -> Callable[[], List[Dict[str, str] | None]]:
+        job: Callable[[], List[Dict[str, str] | None]] = partial(
+            _process_batch, _batch_chain(host, len(window)), item, window, count,
+            host, retry, log,
+        )
+        if dedup is not None:
+            texts = [text_n1 for _, text_n1 in window]
+            job = partial(dedup.run, _batch_key(item, texts), job)
+        return job
+
+    def _process(host: str, count: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        raw_text = item["text"].replace("\n", " ").strip()
+        preview = raw_text[:40].rstrip()
+        suffix = "..." if len(raw_text) > 40 else ""
+        start_time: float = time.time()
+        where = f" [{host}]" if len(hosts) > 1 else ""
+
+        log(f"Iniciando Texto {count}{where}: {preview}{suffix}")
+        n1_items: List[Dict[str, Any]] = item.get("texts_n1", [])
+        results: List[Dict[str, str]]
+        if batch_size == 1:
+            jobs: List[Callable[[], Dict[str, str]]] = [
+                partial(
+                    store.resumable,
+                    count,
+                    n1_index,
+                    "",
+                    _sentence_job(
+                        host, item, count, n1_index, n1_item.get("text_n1", "")
+                    ),
                 )
-
-            end_time: float = time.time()
-            elapsed_time: float = end_time - start_time
-
-            result_entry: Dict[str, Any] = {
-                "text": item["text"],
-                "texts_n1": texts_n1,
+                for n1_index, n1_item in enumerate(n1_items, start=1)
+            ]
+            results = run_bounded(jobs, host)
+        else:
+            results = _process_batched(
+                partial(_batch_job, host, item, count),
+                partial(_sentence_job, host, item, count),
+                item, batch_size, count, host, store, log,
+            )
+        texts_n1: List[Dict[str, Any]] = [
+            {
+                "text_n1": n1_item.get("text_n1", ""),
+                "operators_n2": build_operators(processed_result),
             }
+            for n1_item, processed_result in zip(n1_items, results)
+        ]
+
+        elapsed_time: float = time.time() - start_time
+        print(f"Texto {count} ({elapsed_time:.2f}s): {preview}{suffix}")
+        log(f"Texto {count} concluido ({elapsed_time:.2f}s)")
+
+        _pauser(host).maybe_pause(log)
+        result_entry: Dict[str, Any] = {
+            "text": item["text"],
+            "texts_n1": texts_n1,
+        }
+        tiers = cascade.tiers(count) if cascade is not None else {}
+        if tiers:
+            result_entry["cascade"] = tiers
+        return result_entry
+
+    def _commit(count: int, result_entry: Dict[str, Any]) -> None:
+        result_data["datas"].append(result_entry)
+        result_data["counts"] = count
+        metrics_exporter.set_gauge("text_index", count, level="n2", model=model_id)
+        result_data["time"] = time.time() - total_start_time
+        # Pausas somadas por worker; com varios hosts elas correm em paralelo.
+        result_data["time_pause"] = previous_pause + sum(
+            pauser.paused for pauser in list(pausers.values())
+        )
+        result_data["time_compute"] = max(
+            0.0, result_data["time"] - result_data["time_pause"] / len(hosts)
+        )
 
-            result_data["datas"].append(result_entry)
-            result_data["counts"] = count
-            result_data["time"] = time.time() - total_start_time
-
-            append_checkpoint(output_path, result_entry)
-            tmp_path = output_path + ".tmp"
-            with open(tmp_path, "w", encoding="utf-8") as file:
-                json.dump(result_data, file, ensure_ascii=False, indent=2)
-                file.flush()
-                os.fsync(file.fileno())
-            os.replace(tmp_path, output_path)
+        layers_meta(
+            result_data["meta"], retry, dedup, sizer, cascade, cache, stream_stats,
+            call_metrics,
+        )
 
-            print(f"Texto {count} ({elapsed_time:.2f}s): {preview}{suffix}")
-            log(f"Texto {count} concluido ({elapsed_time:.2f}s)")
+        store.commit(count, result_entry)
+        if sink is not None:
+            sink(count, result_entry)
 
-            if pause_between_texts > 0:
-                log(f"Pausa termica de {pause_between_texts:.1f}s.")
-                time.sleep(pause_between_texts)
+    try:
+        if sink is not None:
+            # Textos ja gerados numa execucao anterior seguem para o proximo estagio.
+            for count, result_entry in enumerate(result_data["datas"], start=1):
+                sink(count, result_entry)
+        pending = (
+            (count, item)
+            for count, item in enumerate(source, start=1)
+            if count > resume_from
+        )
+        run_texts(pending, hosts, _process, _commit, log)
     finally:
+        close_layers(log, cache, stream_stats, call_metrics)
+        store.close()
         close_log()
 
     print(f"Processamento concluido. Tempo total: {result_data['time']:.2f} segundos.")
@@ -2,31 +2,49 @@ import argparse
 import json
 import os
 import sys
+import threading
 import time
+from functools import partial
 from pathlib import Path
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableSerializable
-from langchain_ollama import OllamaLLM
-
 from config.models import MODEL_NAMES
+from utils.generates.async_engine import max_inflight, run_bounded
+from utils.generates.call_metrics import CallMetrics, call_labels, call_metrics_enabled
+from utils.generates.cascade import Cascade, cascade_model
+from utils.generates.dedup import Dedup, dedup_enabled, work_key
 from utils.generates.generate_config import generate_config
+from utils.generates.get_hosts import get_hosts
 from utils.generates.invoke_with_timeout import invoke_with_timeout
+from utils.generates.llm_cache import open_cache
+from utils.generates.llm_chain import build_chain, escape_braces
 from utils.generates.meta import build_meta, env_seed
-from utils.generates.reset_model import reset_model
-from utils.generates.resume import (
-    append_checkpoint,
-    clear_checkpoint,
-    load_existing_output,
-)
+from utils.generates.n3_mode import N3_MODES, n3_mode
+from utils.generates.pause_controller import PauseController
+from utils.generates.predict_store import PredictStore
+from utils.generates.request_sizing import RequestSizer, sizing_enabled
+from utils.generates.retry_policy import RetryPolicy
+from utils.generates.run_layers import close_layers, layers_meta
+from utils.generates.run_pipeline import config_error
+from utils.generates.streaming_chain import StreamStats, streaming_enabled
+from utils.generates.text_scheduler import run_texts
+from utils.logs import metrics_exporter
 from utils.logs.init_log import init_log
 from utils.n2.empty_properties import empty_properties
+from utils.n3.expected_output_tokens import expected_output_tokens
+from utils.n3.output_accepted import output_accepted
+from utils.n3.output_complete import output_complete
+from utils.n3.parse_combined_properties import parse_combined_properties
 from utils.n3.parse_properties import parse_properties
+from utils.n3.properties_schema import (
+    combined_properties_schema,
+    properties_schema,
+    schema_enabled,
+)
 
 
 PROMPT_PATHS: Dict[str, Path] = {
@@ -36,12 +54,7 @@ PROMPT_PATHS: Dict[str, Path] = {
     "requeriments": Path("prompts") / "n3_requisito.txt",
 }
 
-
-def _escape_braces(template: str, variables: List[str]) -> str:
-    escaped = template.replace("{", "{{").replace("}", "}}")
-    for var in variables:
-        escaped = escaped.replace("{{" + var + "}}", "{" + var + "}")
-    return escaped
+COMBINED_PROMPT_PATH: Path = Path("prompts") / "n3_combined.txt"
 
 
 _LEGACY_VARS_BY_KEY: Dict[str, List[str]] = {
@@ -51,6 +64,10 @@ _LEGACY_VARS_BY_KEY: Dict[str, List[str]] = {
     "requeriments": ["text", "text_n1", "requisito"],
 }
 
+_COMBINED_VARS: List[str] = [
+    "text", "text_n1", "aplicabilidade", "selecao", "execao", "requisito",
+]
+
 INPUT_KEYS: Dict[str, str] = {
     "aplicability": "aplicabilidade",
     "selection": "selecao",
@@ -66,67 +83,374 @@ TYPE_BY_OPERATOR: Dict[str, str] = {
 }
 
 
-def _process_per_operator(
-    chains: Dict[str, RunnableSerializable[Dict[str, str], str]],
+class _CallCounter:
+    """Chamadas ao modelo por modo, respostas sem propriedades aproveitaveis
+    (`parse_failures`: JSON invalido ou vazio) e retentativas; compartilhado entre
+    as threads do async_engine."""
+
+    _MODES = ("combined", "per_operator")
+
+    def __init__(self, initial: Dict[str, Any] | None = None) -> None:
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {
+            "combined": 0, "per_operator": 0, "parse_failures": 0, "retries": 0,
+        }
+        for key, value in (initial or {}).items():
+            if key in self.counts and isinstance(value, int):
+                self.counts[key] = value
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+        if key == "parse_failures":
+            metrics_exporter.count("parse_failures", level="n3")
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {key: self.counts[key] for key in self._MODES}
+
+    def parse_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "failures": self.counts["parse_failures"],
+                "retries": self.counts["retries"],
+            }
+
+
+def _has_content(properties: Dict[str, str]) -> bool:
+    return any(value for key, value in properties.items() if key != "type")
+
+
+# Operador vazio que o N2 grava como aspas (`""`); no modo combinado conta como ausente.
+_EMPTY_PLACEHOLDERS = {'""', "''"}
+
+
+def _combined_text_n2(operator: Dict[str, Any]) -> str:
+    """text_n2 do operador para o prompt combinado ("" se vazio ou placeholder)."""
+    text_n2 = operator.get("text_n2", "").strip()
+    return "" if text_n2 in _EMPTY_PLACEHOLDERS else text_n2
+
+
+def _operator_key(op_key: str, item: Dict[str, Any], text_n1: str, text_n2: str) -> str:
+    return work_key(
+        op_key,
+        {"text": item.get("text", ""), "text_n1": text_n1, INPUT_KEYS[op_key]: text_n2},
+    )
+
+
+def _combined_key(
+    item: Dict[str, Any], text_n1: str, operators_n2: Dict[str, Any], present: List[str]
+) -> str:
+    variables: Dict[str, Any] = {"text": item.get("text", ""), "text_n1": text_n1}
+    for op_key, input_key in INPUT_KEYS.items():
+        variables[input_key] = _combined_text_n2(operators_n2.get(op_key, {}))
+    # `present` muda o resultado devolvido (so os operadores pedidos).
+    variables["present"] = present
+    return work_key("combined", variables)
+
+
+def _plan_keys(
+    item: Dict[str, Any], mode: str, recorded: Callable[[int, str], Any]
+) -> List[str]:
+    """Chaves das chamadas previstas para o texto (sem o fallback do combinado).
+
+    `recorded(sentenca, operador)` devolve o resultado ja registrado no journal;
+    essas chamadas nao voltam ao modelo e ficam fora do plano.
+    """
+    keys: List[str] = []
+    for n1_index, n1_item in enumerate(item.get("texts_n1", []), start=1):
+        text_n1 = n1_item.get("text_n1", "")
+        operators_n2 = n1_item.get("operators_n2", {})
+        if mode == "combined":
+            present = [
+                op_key
+                for op_key in INPUT_KEYS
+                if _combined_text_n2(operators_n2.get(op_key, {}))
+                and recorded(n1_index, op_key) is None
+            ]
+            if present:
+                keys.append(_combined_key(item, text_n1, operators_n2, present))
+            continue
+        present = [
+            op_key
+            for op_key in INPUT_KEYS
+            if operators_n2.get(op_key, {}).get("text_n2", "").strip()
+            and recorded(n1_index, op_key) is None
+        ]
+        keys.extend(
+            _operator_key(
+                op_key, item, text_n1, operators_n2[op_key]["text_n2"].strip()
+            )
+            for op_key in present
+        )
+    return keys
+
+
+def _process_operator(
+    chain: Any,
     item: Dict[str, Any],
     text_n1: str,
-    operators_n2: Dict[str, Any],
-    model_id: str,
+    op_key: str,
+    text_n2: str,
     count: int,
     n1_index: int,
+    calls: _CallCounter,
+    host: str,
+    retry: RetryPolicy,
     log: Callable[[str], None],
-) -> None:
-    for op_key, input_key in INPUT_KEYS.items():
-        operator = operators_n2.get(op_key, {})
-        text_n2 = operator.get("text_n2", "").strip()
-        if not text_n2:
-            operator["properties_n3"] = empty_properties()
-            continue
-
-        processed: Dict[str, str] = {}
-        for attempt in range(1, 4):
-            log(
-                "Chamando modelo "
-                f"(texto {count}, sentenca {n1_index}, "
-                f"operador {op_key}, tentativa {attempt})"
-            )
-            try:
+) -> Dict[str, str]:
+    processed: Dict[str, str] = {}
+    for attempt in retry.attempts(host):
+        log(
+            "Chamando modelo "
+            f"(texto {count}, sentenca {n1_index}, "
+            f"operador {op_key}, tentativa {attempt})"
+        )
+        if attempt > 1:
+            calls.add("retries")
+        try:
+            calls.add("per_operator")
+            with call_labels(
+                text=count, sentence=n1_index, operator=op_key, attempt=attempt
+            ):
                 result, timed_out = invoke_with_timeout(
-                    chains[op_key],
+                    chain,
                     {
-                        input_key: text_n2,
+                        INPUT_KEYS[op_key]: text_n2,
                         "text": item.get("text", ""),
                         "text_n1": text_n1,
                     },
-                    600.0,
-                    60.0,
-                    log,
+                    log=log,
                 )
-                if timed_out:
-                    msg = f"Timeout na chamada do modelo apos {int(600.0)}s."
-                    print(msg)
-                    log(msg)
-                    reset_model(model_id, log)
-                    continue
-                if result is None:
-                    raise RuntimeError("Resposta vazia do modelo.")
-            except Exception as exc:
-                log(f"Erro op={op_key} tentativa={attempt}: {exc}")
-                if attempt < 3:
-                    time.sleep(1)
+            if timed_out:
+                raise TimeoutError("Timeout na chamada do modelo (requisicao cancelada).")
+            if result is None:
+                raise RuntimeError("Resposta vazia do modelo.")
+        except Exception as exc:
+            log(f"Erro op={op_key} tentativa={attempt}: {exc}")
+            if not retry.failure(host, exc, attempt):
+                break
+            continue
+
+        retry.success(host)
+        log(f"Saida do modelo ({op_key}):\n{result}")
+        processed = parse_properties(result)
+        if processed != empty_properties():
+            break
+        calls.add("parse_failures")
+
+    if not processed:
+        processed = empty_properties()
+    if not processed.get("type"):
+        processed["type"] = TYPE_BY_OPERATOR[op_key]
+    return processed
+
+
+def _run_operator_major(
+    op_keys: List[str],
+    targets: List[Dict[str, Any]],
+    jobs: List[Callable[[], Dict[str, str]]],
+    host: str,
+) -> List[tuple[Dict[str, Any], Dict[str, str]]]:
+    """Roda as chamadas agrupadas por operador (todas as sentencas de um, depois o outro).
+
+    Chamadas seguidas com o mesmo template e o mesmo `text` compartilham o prefixo
+    do prompt, que o Ollama reaproveita do KV cache do slot em vez de reavaliar.
+    """
+    position = {op_key: index for index, op_key in enumerate(INPUT_KEYS)}
+    ordered = sorted(
+        zip(op_keys, targets, jobs), key=lambda entry: position[entry[0]]
+    )
+    results = run_bounded([job for _, _, job in ordered], host)
+    return [
+        (operator, processed)
+        for (_, operator, _), processed in zip(ordered, results)
+    ]
+
+
+# Fabricas de jobs montadas em generate_n3 (modelo principal ou cascata):
+# (op_key, sentenca, text_n1, text_n2) e (sentenca, text_n1, operators_n2, presentes).
+OperatorJob = Callable[[str, int, str, str], Callable[[], Dict[str, str]]]
+CombinedJob = Callable[
+    [int, str, Dict[str, Any], List[str]], Callable[[], Dict[str, Dict[str, str]]]
+]
+
+
+def _process_per_operator(
+    operator_job: OperatorJob,
+    item: Dict[str, Any],
+    count: int,
+    host: str,
+    store: PredictStore,
+    log: Callable[[str], None],
+) -> List[Dict[str, Any]]:
+    """Dispara as chamadas (sentenca, operador) do texto e remonta `texts_n1` na ordem."""
+    texts_n1: List[Dict[str, Any]] = []
+    op_keys: List[str] = []
+    targets: List[Dict[str, Any]] = []
+    jobs: List[Callable[[], Dict[str, str]]] = []
+
+    for n1_index, n1_item in enumerate(item.get("texts_n1", []), start=1):
+        text_n1 = n1_item.get("text_n1", "")
+        operators_n2 = n1_item.get("operators_n2", {})
+        for op_key in INPUT_KEYS:
+            operator = operators_n2.get(op_key, {})
+            text_n2 = operator.get("text_n2", "").strip()
+            if not text_n2:
+                operator["properties_n3"] = empty_properties()
                 continue
+            operators_n2[op_key] = operator
+            op_keys.append(op_key)
+            targets.append(operator)
+            jobs.append(
+                partial(
+                    store.resumable,
+                    count,
+                    n1_index,
+                    op_key,
+                    operator_job(op_key, n1_index, text_n1, text_n2),
+                )
+            )
+        texts_n1.append({"text_n1": text_n1, "operators_n2": operators_n2})
+
+    for operator, processed in _run_operator_major(op_keys, targets, jobs, host):
+        operator["properties_n3"] = processed
+    return texts_n1
+
+
+def _process_combined(
+    chain: Any,
+    item: Dict[str, Any],
+    text_n1: str,
+    operators_n2: Dict[str, Any],
+    present: List[str],
+    count: int,
+    n1_index: int,
+    calls: _CallCounter,
+    host: str,
+    retry: RetryPolicy,
+    log: Callable[[str], None],
+) -> Dict[str, Dict[str, str]]:
+    """Uma chamada para os 4 operadores; devolve as propriedades dos operadores presentes."""
+    payload: Dict[str, str] = {"text": item.get("text", ""), "text_n1": text_n1}
+    for op_key, input_key in INPUT_KEYS.items():
+        payload[input_key] = _combined_text_n2(operators_n2.get(op_key, {}))
 
-            log(f"Saida do modelo ({op_key}):\n{result}")
-            processed = parse_properties(result)
-            if processed != empty_properties():
+    parsed: Dict[str, Dict[str, str]] = {}
+    for attempt in retry.attempts(host):
+        log(
+            "Chamando modelo "
+            f"(texto {count}, sentenca {n1_index}, combinado, tentativa {attempt})"
+        )
+        if attempt > 1:
+            calls.add("retries")
+        try:
+            calls.add("combined")
+            with call_labels(
+                text=count, sentence=n1_index, operator="combined", attempt=attempt
+            ):
+                result, timed_out = invoke_with_timeout(chain, payload, log=log)
+            if timed_out:
+                raise TimeoutError("Timeout na chamada do modelo (requisicao cancelada).")
+            if result is None:
+                raise RuntimeError("Resposta vazia do modelo.")
+        except Exception as exc:
+            log(f"Erro combinado tentativa={attempt}: {exc}")
+            if not retry.failure(host, exc, attempt):
                 break
+            continue
+
+        retry.success(host)
+
+        log(f"Saida do modelo (combinado):\n{result}")
+        combined = parse_combined_properties(result)
+        parsed = {op_key: combined[TYPE_BY_OPERATOR[op_key]] for op_key in present}
+        if any(_has_content(props) for props in parsed.values()):
+            break
+        calls.add("parse_failures")
+    return parsed
+
+
+def _process_combined_text(
+    operator_job: OperatorJob,
+    combined_job: CombinedJob,
+    item: Dict[str, Any],
+    count: int,
+    host: str,
+    store: PredictStore,
+    log: Callable[[str], None],
+) -> List[Dict[str, Any]]:
+    """Modo combinado: 1 chamada por sentenca; operadores vazios caem no prompt individual.
+
+    Operadores sem texto N2 (vazio ou o placeholder `""`) ficam fora da chamada
+    e recebem propriedades vazias, sem fallback.
+    """
+    texts_n1: List[Dict[str, Any]] = []
+    pending: List[tuple[Dict[str, Any], str, int, List[str]]] = []
+    jobs: List[Callable[[], Dict[str, Dict[str, str]]]] = []
+
+    for n1_index, n1_item in enumerate(item.get("texts_n1", []), start=1):
+        text_n1 = n1_item.get("text_n1", "")
+        operators_n2 = n1_item.get("operators_n2", {})
+        present: List[str] = []
+        for op_key in INPUT_KEYS:
+            operator = operators_n2.get(op_key, {})
+            if not _combined_text_n2(operator):
+                operator["properties_n3"] = empty_properties()
+                continue
+            operators_n2[op_key] = operator
+            present.append(op_key)
+        texts_n1.append({"text_n1": text_n1, "operators_n2": operators_n2})
+        # Operadores ja registrados no journal (retomada) nao voltam ao modelo.
+        missing: List[str] = []
+        for op_key in present:
+            recovered = store.call_result(count, n1_index, op_key)
+            if recovered is None:
+                missing.append(op_key)
+            else:
+                operators_n2[op_key]["properties_n3"] = recovered
+        present = missing
+        if not present:
+            continue
+        pending.append((operators_n2, text_n1, n1_index, present))
+        jobs.append(combined_job(n1_index, text_n1, operators_n2, present))
+
+    fallback_keys: List[str] = []
+    fallback_targets: List[Dict[str, Any]] = []
+    fallback_jobs: List[Callable[[], Dict[str, str]]] = []
+    for (operators_n2, text_n1, n1_index, present), parsed in zip(
+        pending, run_bounded(jobs, host)
+    ):
+        for op_key in present:
+            operator = operators_n2[op_key]
+            properties = parsed.get(op_key)
+            if properties is not None and _has_content(properties):
+                store.record_call(count, n1_index, op_key, properties)
+                operator["properties_n3"] = properties
+                continue
+            log(
+                f"Operador {op_key} vazio no modo combinado "
+                f"(texto {count}, sentenca {n1_index}); usando prompt individual."
+            )
+            fallback_keys.append(op_key)
+            fallback_targets.append(operator)
+            fallback_jobs.append(
+                partial(
+                    store.resumable,
+                    count,
+                    n1_index,
+                    op_key,
+                    operator_job(
+                        op_key, n1_index, text_n1, operator.get("text_n2", "").strip()
+                    ),
+                )
+            )
 
-        if not processed:
-            processed = empty_properties()
-        if not processed.get("type"):
-            processed["type"] = TYPE_BY_OPERATOR[op_key]
+    for operator, processed in _run_operator_major(
+        fallback_keys, fallback_targets, fallback_jobs, host
+    ):
         operator["properties_n3"] = processed
-        operators_n2[op_key] = operator
+    return texts_n1
 
 
 def generate_n3(
@@ -134,7 +458,12 @@ def generate_n3(
     output_path: str | None = None,
     model_id: str | None = None,
     log_path: str | None = None,
+    mode: str | None = None,
+    hosts: List[str] | None = None,
+    source: Iterable[Dict[str, Any]] | None = None,
+    sink: Callable[[int, Dict[str, Any]], None] | None = None,
 ) -> None:
+    chained = source is not None or sink is not None
     if input_path is None or output_path is None or model_id is None:
         parser = argparse.ArgumentParser(description="Gerar propriedades RASE N3.")
         parser.add_argument(
@@ -146,6 +475,12 @@ def generate_n3(
         parser.add_argument("--input", dest="input_path", default=None)
         parser.add_argument("--output", dest="output_path", default=None)
         parser.add_argument("--log", dest="log_path", default=None)
+        parser.add_argument(
+            "--mode",
+            choices=N3_MODES,
+            default=None,
+            help="legacy (4 chamadas/sentenca) ou combined (1 chamada/sentenca).",
+        )
         args: argparse.Namespace = parser.parse_args()
 
         input_path, output_path, model_id = generate_config("n3", args.model)
@@ -157,23 +492,27 @@ def generate_n3(
         if args.output_path:
             output_path = args.output_path
         log_path = args.log_path
+        mode = args.mode
 
     if input_path is None or output_path is None or model_id is None:
-        print("Erro: parametros obrigatorios nao encontrados.")
+        config_error("Erro: parametros obrigatorios nao encontrados.", chained)
         return
 
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     log, close_log = init_log(output_path, log_path)
 
-    try:
-        with open(input_path, "r", encoding="utf-8") as file:
-            data: Dict[str, Any] = json.load(file)
-    except FileNotFoundError:
-        print("Erro: Arquivo de entrada nao encontrado.")
-        return
-    except json.JSONDecodeError:
-        print("Erro: Falha ao decodificar JSON de entrada.")
-        return
+    if source is None:
+        # Sem estagio anterior (run_pipeline.py), le o predict/dataset de entrada.
+        try:
+            with open(input_path, "r", encoding="utf-8") as file:
+                data: Dict[str, Any] = json.load(file)
+        except FileNotFoundError:
+            config_error("Erro: Arquivo de entrada nao encontrado.", chained)
+            return
+        except json.JSONDecodeError:
+            config_error("Erro: Falha ao decodificar JSON de entrada.", chained)
+            return
+        source = data.get("datas", [])
 
     seed = env_seed()
 
@@ -205,111 +544,321 @@ def generate_n3(
         "top_p": 0.9,
         "repeat_penalty": 1.1,
         "num_predict": num_predict,
-        "client_kwargs": {"timeout": 600},
     }
     if seed is not None:
         llm_kwargs["seed"] = seed
     if keep_alive:
         llm_kwargs["keep_alive"] = keep_alive
-    llm: OllamaLLM = OllamaLLM(**llm_kwargs)
-
-    chains: Dict[str, RunnableSerializable[Dict[str, str], str]] = {}
-
     try:
         templates = {
             key: path.read_text(encoding="utf-8")
             for key, path in PROMPT_PATHS.items()
         }
     except FileNotFoundError as exc:
-        print(f"Erro: prompt N3 nao encontrado ({exc}).")
+        config_error(f"Erro: prompt N3 nao encontrado ({exc}).", chained)
         return
-    for key, template in templates.items():
-        safe_template = _escape_braces(template, _LEGACY_VARS_BY_KEY[key])
-        prompt = ChatPromptTemplate.from_template(safe_template)
-        chains[key] = prompt | llm
-    prompt_for_meta = "\n---\n".join(templates.values())
+    mode = n3_mode(mode)
+    combined_template: str = ""
+    if mode == "combined":
+        try:
+            combined_template = COMBINED_PROMPT_PATH.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            config_error(
+                "Erro: prompt N3 combinado nao encontrado em prompts/n3_combined.txt.", chained
+            )
+            return
+    prompt_for_meta = "\n---\n".join(
+        ([combined_template] if combined_template else []) + list(templates.values())
+    )
+    stream_stats: StreamStats | None = StreamStats() if streaming_enabled() else None
+    cache = open_cache(seed)
+    retry = RetryPolicy(log, level="n3")
+    sizer: RequestSizer | None = (
+        RequestSizer(expected_output_tokens, log) if sizing_enabled() else None
+    )
+    # JSON schema no `format` do Ollama: a decodificacao so produz JSON valido.
+    use_schema = schema_enabled()
+    legacy_format: Dict[str, Any] = (
+        {"format": properties_schema()} if use_schema else {}
+    )
+    combined_format: Dict[str, Any] = (
+        {"format": combined_properties_schema()} if use_schema else {}
+    )
+    hosts = hosts or get_hosts()
+    chains_by_host: Dict[Tuple[str, str], Tuple[Dict[str, Any], Any]] = {}
+    pausers: Dict[str, PauseController] = {}
+
+    def _pauser(host: str) -> PauseController:
+        if host not in pausers:
+            pausers[host] = PauseController(pause_between_texts, host)
+        return pausers[host]
+
+    def _chains(host: str, chain_model: str | None = None) -> Tuple[Dict[str, Any], Any]:
+        # Um cliente por host (e modelo, na cascata), compartilhado pelos prompts.
+        chain_model = chain_model or model_id
+        if (host, chain_model) in chains_by_host:
+            return chains_by_host[(host, chain_model)]
+        chain = partial(
+            build_chain,
+            llm_kwargs={**llm_kwargs, "model": chain_model},
+            host=host,
+            metrics=call_metrics,
+            sizer=sizer,
+            pauser=_pauser(host),
+            stream_stats=stream_stats,
+            stream_check=output_complete,
+            cache=cache,
+            group_template=prompt_for_meta,
+            log=log,
+        )
+        chains: Dict[str, Any] = {
+            key: chain(
+                escape_braces(template, _LEGACY_VARS_BY_KEY[key]), llm_format=legacy_format
+            )
+            for key, template in templates.items()
+        }
+        combined_chain: Any = None
+        if combined_template:
+            combined_chain = chain(
+                escape_braces(combined_template, _COMBINED_VARS),
+                llm_format=combined_format,
+            )
+        chains_by_host[(host, chain_model)] = (chains, combined_chain)
+        return chains_by_host[(host, chain_model)]
 
-    existing = load_existing_output(output_path)
+    store = PredictStore(output_path)
+    existing = store.load()
     resume_from = len(existing.get("datas", [])) if existing else 0
+    call_metrics: CallMetrics | None = (
+        CallMetrics(output_path, resume=existing is not None, level="n3")
+        if call_metrics_enabled() else None
+    )
+    existing_meta: Dict[str, Any] = (existing or {}).get("meta", {})
+    same_setup = (
+        existing_meta.get("mode") == mode
+        and existing_meta.get("schema", False) == use_schema
+    )
+    calls = _CallCounter(
+        {
+            **existing_meta.get("calls", {}),
+            "parse_failures": existing_meta.get("parse", {}).get("failures", 0),
+            "retries": existing_meta.get("parse", {}).get("retries", 0),
+        }
+        if same_setup else None
+    )
     result_data: Dict[str, Any] = {
         "meta": build_meta(
             model_id=model_id,
             prompt_text=prompt_for_meta,
             seed=seed,
-            extra={"mode": "legacy"},
+            extra={
+                "mode": mode,
+                "schema": use_schema,
+                "calls": calls.snapshot(),
+                "parse": calls.parse_stats(),
+            },
         ),
         "counts": resume_from,
         "datas": list(existing.get("datas", [])) if existing else [],
         "time": float(existing.get("time", 0.0)) if existing else 0.0,
+        "time_pause": float(existing.get("time_pause", 0.0)) if existing else 0.0,
+        "time_compute": 0.0,
     }
+    previous_pause: float = result_data["time_pause"]
     total_start_time: float = time.time() - result_data["time"]
+    cheap_model = cascade_model(model_id)
+    cascade: Cascade | None = None
+    if cheap_model is not None:
+        cascade = Cascade(cheap_model, existing_meta.get("cascade"), log)
+        result_data["meta"]["cascade"] = cascade.snapshot()
+    dedup: Dedup | None = None
+    if dedup_enabled():
+        dedup = Dedup(
+            [
+                key
+                for count, item in enumerate(source[resume_from:], start=resume_from + 1)
+                for key in _plan_keys(item, mode, partial(store.call_result, count))
+            ]
+            if isinstance(source, list) else None
+        )
+        result_data["meta"]["dedup"] = dedup.snapshot()
 
-    if resume_from == 0:
-        with open(output_path, "w", encoding="utf-8") as file:
-            json.dump(result_data, file, ensure_ascii=False, indent=2)
-        clear_checkpoint(output_path)
-    else:
+    store.begin(result_data)
+    if resume_from > 0:
         log(f"Retomando execucao N3 a partir do item {resume_from + 1}.")
+    if store.recovered_calls():
+        log(f"Retomando {store.recovered_calls()} chamada(s) ja concluidas no journal.")
 
+    mode_label = (
+        "combined (1 call/sentenca)" if mode == "combined"
+        else "legacy (4 calls/sentenca)"
+    )
     log(
-        f"Inicio geracao N3 [legacy (4 calls/sentenca)]. Modelo={model_id} "
+        f"Inicio geracao N3 [{mode_label}]. Modelo={model_id} "
         f"Entrada={input_path} Saida={output_path}"
     )
-    log(f"Total de textos: {len(data.get('datas', []))} (ja processados: {resume_from})")
+    total = len(source) if isinstance(source, list) else "em fluxo"
+    if isinstance(source, list):
+        metrics_exporter.set_gauge("texts", len(source), level="n3", model=model_id)
+    log(f"Total de textos: {total} (ja processados: {resume_from})")
+    log(f"Chamadas simultaneas por host: {max_inflight()}")
+    if dedup is not None:
+        print(dedup.describe())
+        log(dedup.describe())
+    if sizer is not None:
+        counter = sizer.estimator.name or "razao caracteres/token"
+        log(f"num_ctx e num_predict por chamada; tokens contados por {counter}.")
+    if use_schema:
+        log("Saida restrita ao JSON schema das propriedades (N3_SCHEMA=1).")
+    if cheap_model is not None:
+        log(f"Modo cascata: {cheap_model} primeiro, {model_id} nas escaladas.")
+
+    if len(hosts) > 1:
+        log(f"Hosts Ollama: {', '.join(hosts)}")
+
+    def _operator_job(
+        host: str,
+        item: Dict[str, Any],
+        count: int,
+        op_key: str,
+        n1_index: int,
+        text_n1: str,
+        text_n2: str,
+    ) -> Callable[[], Dict[str, str]]:
+        def _job(chain_model: str, retry_key: str) -> Callable[[], Dict[str, str]]:
+            return partial(
+                _process_operator, _chains(host, chain_model)[0][op_key], item,
+                text_n1, op_key, text_n2, count, n1_index, calls, retry_key, retry, log,
+            )
 
-    try:
-        for count, item in enumerate(data.get("datas", []), start=1):
-            if count <= resume_from:
-                continue
-            raw_text = item.get("text", "").replace("\n", " ").strip()
-            preview = raw_text[:40].rstrip()
-            suffix = "..." if len(raw_text) > 40 else ""
-            start_time: float = time.time()
+        job = _job(model_id, host)
+        work = _operator_key(op_key, item, text_n1, text_n2)
+        if cascade is not None and cheap_model is not None:
+            # Circuito proprio para o modelo barato: falhas dele nao derrubam o host.
+            key = f"{count}:{n1_index}:{op_key}"
+            answer: Callable[[], Tuple[str, Dict[str, str]]] = partial(
+                cascade.run, host, key,
+                _job(cheap_model, f"{host} [{cheap_model}]"), job,
+                output_accepted,
+            )
+            if dedup is not None:
+                # O nivel acompanha o resultado copiado para as outras posicoes.
+                answer = partial(dedup.run, work, answer)
+            return partial(cascade.record, key, answer)
+        if dedup is not None:
+            job = partial(dedup.run, work, job)
+        return job
+
+    def _combined_job(
+        host: str,
+        item: Dict[str, Any],
+        count: int,
+        n1_index: int,
+        text_n1: str,
+        operators_n2: Dict[str, Any],
+        present: List[str],
+    ) -> Callable[[], Dict[str, Dict[str, str]]]:
+        def _job(chain_model: str, retry_key: str) -> Callable[[], Dict[str, Dict[str, str]]]:
+            return partial(
+                _process_combined, _chains(host, chain_model)[1], item, text_n1,
+                operators_n2, present, count, n1_index, calls, retry_key, retry, log,
+            )
 
-            log(f"Iniciando Texto {count}: {preview}{suffix}")
-            texts_n1 = []
+        job = _job(model_id, host)
+        work = _combined_key(item, text_n1, operators_n2, present)
+        if cascade is not None and cheap_model is not None:
+            key = f"{count}:{n1_index}:combined"
+            answer: Callable[[], Tuple[str, Dict[str, Dict[str, str]]]] = partial(
+                cascade.run, host, key,
+                _job(cheap_model, f"{host} [{cheap_model}]"), job,
+                lambda parsed: all(
+                    output_accepted(parsed.get(op_key)) for op_key in present
+                ),
+            )
+            if dedup is not None:
+                answer = partial(dedup.run, work, answer)
+            return partial(cascade.record, key, answer)
+        if dedup is not None:
+            job = partial(dedup.run, work, job)
+        return job
+
+    def _process(host: str, count: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        raw_text = item.get("text", "").replace("\n", " ").strip()
+        preview = raw_text[:40].rstrip()
+        suffix = "..." if len(raw_text) > 40 else ""
+        start_time: float = time.time()
+        where = f" [{host}]" if len(hosts) > 1 else ""
+
+        log(f"Iniciando Texto {count}{where}: {preview}{suffix}")
+        operator_job = partial(_operator_job, host, item, count)
+        if mode == "combined":
+            texts_n1 = _process_combined_text(
+                operator_job, partial(_combined_job, host, item, count),
+                item, count, host, store, log,
+            )
+        else:
+            texts_n1 = _process_per_operator(
+                operator_job, item, count, host, store, log
+            )
 
-            for n1_index, n1_item in enumerate(item.get("texts_n1", []), start=1):
-                text_n1 = n1_item.get("text_n1", "")
-                operators_n2 = n1_item.get("operators_n2", {})
+        elapsed_time = time.time() - start_time
+        print(f"Texto {count} ({elapsed_time:.2f}s): {preview}{suffix}")
+        log(f"Texto {count} concluido ({elapsed_time:.2f}s)")
 
-                _process_per_operator(
-                    chains, item, text_n1, operators_n2,
-                    model_id, count, n1_index, log,
-                )
+        _pauser(host).maybe_pause(log)
+        result_entry: Dict[str, Any] = {
+            "text": item.get("text", ""),
+            "texts_n1": texts_n1,
+        }
+        tiers = cascade.tiers(count) if cascade is not None else {}
+        if tiers:
+            result_entry["cascade"] = tiers
+        return result_entry
+
+    def _commit(count: int, result_entry: Dict[str, Any]) -> None:
+        result_data["datas"].append(result_entry)
+        result_data["counts"] = count
+        metrics_exporter.set_gauge("text_index", count, level="n3", model=model_id)
+        result_data["time"] = time.time() - total_start_time
+        # Pausas somadas por worker; com varios hosts elas correm em paralelo.
+        result_data["time_pause"] = previous_pause + sum(
+            pauser.paused for pauser in list(pausers.values())
+        )
+        result_data["time_compute"] = max(
+            0.0, result_data["time"] - result_data["time_pause"] / len(hosts)
+        )
 
-                texts_n1.append(
-                    {"text_n1": text_n1, "operators_n2": operators_n2}
-                )
+        result_data["meta"]["calls"] = calls.snapshot()
+        result_data["meta"]["parse"] = calls.parse_stats()
+        layers_meta(
+            result_data["meta"], retry, dedup, sizer, cascade, cache, stream_stats,
+            call_metrics,
+        )
 
-            elapsed_time = time.time() - start_time
-            result_entry: Dict[str, Any] = {
-                "text": item.get("text", ""),
-                "texts_n1": texts_n1,
-            }
-            result_data["datas"].append(result_entry)
-            result_data["counts"] = count
-            result_data["time"] = time.time() - total_start_time
-
-            append_checkpoint(output_path, result_entry)
-            tmp_path = output_path + ".tmp"
-            with open(tmp_path, "w", encoding="utf-8") as file:
-                json.dump(result_data, file, ensure_ascii=False, indent=2)
-                file.flush()
-                os.fsync(file.fileno())
-            os.replace(tmp_path, output_path)
-
-            print(f"Texto {count} ({elapsed_time:.2f}s): {preview}{suffix}")
-            log(f"Texto {count} concluido ({elapsed_time:.2f}s)")
-
-            if pause_between_texts > 0:
-                log(f"Pausa termica de {pause_between_texts:.1f}s.")
-                time.sleep(pause_between_texts)
+        store.commit(count, result_entry)
+        if sink is not None:
+            sink(count, result_entry)
+
+    try:
+        if sink is not None:
+            # Textos ja gerados numa execucao anterior seguem para o proximo estagio.
+            for count, result_entry in enumerate(result_data["datas"], start=1):
+                sink(count, result_entry)
+        pending = (
+            (count, item)
+            for count, item in enumerate(source, start=1)
+            if count > resume_from
+        )
+        run_texts(pending, hosts, _process, _commit, log)
     finally:
+        close_layers(log, cache, stream_stats, call_metrics)
+        store.close()
         close_log()
 
     print(f"Processamento concluido. Tempo total: {result_data['time']:.2f} segundos.")
     print(f"Resultado salvo em {output_path}")
+    log(f"Chamadas ao modelo por modo: {calls.snapshot()}")
+    log(f"Falhas de parse e retentativas: {calls.parse_stats()}")
     log(f"Processamento concluido. Tempo total: {result_data['time']:.2f} segundos.")
     log(f"Resultado salvo em {output_path}")
 
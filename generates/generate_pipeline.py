@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from config.models import MODELS, MODEL_NAMES, predict_path
+from generates.generate_n1 import generate_n1
+from generates.generate_n2 import generate_n2
+from generates.generate_n3 import generate_n3
+from utils.generates.get_hosts import get_hosts
+from utils.generates.n3_mode import N3_MODES
+from utils.generates.run_pipeline import run_pipeline
+
+
+def generate_pipeline() -> None:
+    parser = argparse.ArgumentParser(
+        description="Gerar N1 -> N1N2 -> N1N2N3 encadeados por norma."
+    )
+    parser.add_argument(
+        "--model",
+        choices=MODEL_NAMES,
+        default="mistral",
+        help="Modelo base para geracao.",
+    )
+    parser.add_argument("--input", dest="input_path", default="dataset.json")
+    parser.add_argument("--mode", choices=N3_MODES, default=None)
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.model not in MODELS:
+        print("Modelo invalido.")
+        return
+    if args.mode:
+        os.environ["N3_MODE"] = args.mode
+
+    n1_path = predict_path("n1", args.model)
+    n1n2_path = predict_path("n1n2", args.model)
+    n1n2n3_path = predict_path("n1n2n3", args.model)
+    Path(n1_path).parent.mkdir(parents=True, exist_ok=True)
+    failed = run_pipeline(
+        [
+            ("n1", generate_n1, args.input_path, n1_path),
+            ("n1n2", generate_n2, n1_path, n1n2_path),
+            ("n1n2n3", generate_n3, n1n2_path, n1n2n3_path),
+        ],
+        MODELS[args.model],
+        get_hosts(),
+    )
+    if failed:
+        print(f"Estagios com erro: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    generate_pipeline()
@@ -1,6 +1,7 @@
+import os
 from typing import List, Tuple
 
-from utils.generates.run_generator import run_generator
+from utils.generates.n3_mode import n3_mode
 from utils.screens.clear_screen import clear_screen
 from utils.screens.menu_bar_line import menu_bar_line
 from utils.screens.menu_prompt import menu_prompt
@@ -31,6 +32,8 @@ def menu_generate() -> None:
         ("f", "qwen", False),
     ]
 
+    mode_n3: str = n3_mode()
+
     key_index_n = {opt[0]: i for i, opt in enumerate(options_n)}
     key_index_model = {opt[0]: i for i, opt in enumerate(options_model)}
 
@@ -45,6 +48,8 @@ def menu_generate() -> None:
         for key, name, active in options_model:
             print(menu_text_line(f"{key} - [{'x' if active else ' '}] {name}"))
         print(menu_bar_line())
+        print(menu_text_line(f"m - Modo N3: {mode_n3}"))
+        print(menu_bar_line())
         print(menu_text_line("Enter - Processar"))
         print(menu_bar_line())
         print(menu_text_line("0 - Voltar", color="red"))
@@ -63,6 +68,10 @@ def menu_generate() -> None:
             i = key_index_n[choice]
             options_n[i] = _toggle(options_n[i])
             continue
+        if choice == "m":
+            clear_screen()
+            mode_n3 = "combined" if mode_n3 == "legacy" else "legacy"
+            continue
         if choice in key_index_model:
             clear_screen()
             i = key_index_model[choice]
@@ -85,8 +94,11 @@ def menu_generate() -> None:
                 input("Digite qualquer tecla para voltar ao menu.")
                 continue
 
-            for n_key in active_ns:
-                run_generator(n_key, active_models)
+            # Importado aqui: traz o cliente ollama/httpx, que o menu nao precisa.
+            from utils.generates.run_generator import run_generators
+
+            os.environ["N3_MODE"] = mode_n3
+            run_generators(active_ns, active_models)
 
             wait_to_return()
             clear_screen()
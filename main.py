@@ -1,8 +1,6 @@
 import argparse
 import os
 
-from generates.menu_generate import menu_generate
-from tools.menu_tables import menu_tables
 from utils.app._bootstrap_venv import _bootstrap_venv
 from utils.screens.clear_screen import clear_screen
 from utils.screens.menu_bar_line import menu_bar_line
@@ -10,7 +8,6 @@ from utils.screens.menu_prompt import menu_prompt
 from utils.screens.menu_text_line import menu_text_line
 from utils.screens.read_single_key import read_single_key
 from utils.screens.show_debug_banner import show_debug_banner
-from validates.menu_validate import menu_validate
 
 
 def main() -> None:
@@ -51,15 +48,22 @@ def main() -> None:
             choice: str = read_single_key().strip()
             print()
 
+            # Cada menu importa o seu lado (langchain/ollama, torch...) so quando escolhido.
             if choice == "1":
+                from generates.menu_generate import menu_generate
+
                 clear_screen()
                 menu_generate()
                 print()
             elif choice == "2":
+                from validates.menu_validate import menu_validate
+
                 clear_screen()
                 menu_validate()
                 print()
             elif choice == "3":
+                from tools.menu_tables import menu_tables
+
                 clear_screen()
                 menu_tables()
                 print()
@@ -0,0 +1,595 @@
+"""Benchmark de vazao da geracao (N1, N2 e N3 em todos os modos).
+
+Uso:
+    python tools/benchmark_generation.py --model llama --limit 10 \
+        --fake-args "--eval-ms 30 --prompt-ms 0.5 --load-s 2 --parallel 2"
+    python tools/benchmark_generation.py --model mistral --backend http://localhost:11434 \
+        --stages n2 n2-batch --repeat 3 --env GEN_STREAM=1
+    python tools/benchmark_generation.py --model llama --compare runs/benchmarks/generation_<commit>.json
+
+Cada estagio roda o gerador (`generates/generate_nX.py`) num subprocesso sobre
+uma fatia do dataset (`--offset`/`--limit`). O N2 le a saida do N1 e o N3 a do
+N2; sem o estagio anterior na lista, ele roda uma vez antes, fora da medicao.
+
+O backend e o `tools/fake_ollama.py` numa thread (default; `--fake-args` repassa
+as opcoes de latencia, slots e falhas) ou um Ollama real (`--backend <url>`).
+Nos dois casos as chamadas passam por um proxy local que mede cada requisicao
+como o gerador a ve, ate o ultimo byte ou o cancelamento.
+
+Por execucao: textos/s, chamadas/s, latencia p50/p95/p99 das chamadas com
+prompt, tempo com o backend ocupado (uniao dos intervalos das requisicoes,
+inclusive carga/descarga de modelo), overhead fora do LLM (parede - ocupado:
+imports, parse, checkpoint, log), partida ate a primeira requisicao, pico de
+RSS do gerador e os contadores do `meta` (retry, dedup, cache, stream...).
+Com `--repeat`, o resumo de cada estagio e a mediana das execucoes.
+
+Uma execucao em que o gerador sai com erro ou grava menos textos que a fatia
+fica marcada com `failed` no JSON, fora das medianas e do `--compare`; nesse
+caso o benchmark termina com codigo 1.
+
+O JSON (default `runs/benchmarks/generation_<commit>.json`) traz commit, flags
+de ambiente e backend, para comparar execucoes de commits diferentes com
+`--compare <json anterior>`.
+
+O cache do LLM, a retomada e as pausas termicas ficam desligados (`--cache`,
+`--thermal` religam); `--env CHAVE=VALOR` fixa outras variaveis no gerador.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from config.models import MODEL_NAMES, MODELS
+from tools import fake_ollama
+
+# estagio -> (nivel, variaveis do modo)
+STAGES: Dict[str, Tuple[str, Dict[str, str]]] = {
+    "n1": ("n1", {}),
+    "n2": ("n2", {"N2_BATCH_SIZE": "1"}),
+    "n2-batch": ("n2", {"N2_BATCH_SIZE": "0"}),
+    "n3": ("n3", {"N3_MODE": "legacy"}),
+    "n3-combined": ("n3", {"N3_MODE": "combined"}),
+}
+# Entrada de cada nivel: saida de qual estagio.
+_INPUT_STAGE = {"n2": "n1", "n3": "n2"}
+_ENV_PREFIXES = ("GEN_", "N1_", "N2_", "N3_", "OLLAMA_")
+_META_KEYS = (
+    "calls", "parse", "retry", "dedup", "cache", "stream", "sizing", "cascade", "ollama",
+)
+# Metricas comparadas com --compare: (chave, maior e melhor).
+_COMPARED = (
+    ("texts_per_s", True),
+    ("calls_per_s", True),
+    ("latency_p50_s", False),
+    ("latency_p95_s", False),
+    ("overhead_s", False),
+    ("peak_rss_mb", False),
+)
+
+
+class _CallRecorder:
+    """Intervalos das requisicoes repassadas pelo proxy."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: List[Dict[str, Any]] = []
+
+    def add(self, call: Dict[str, Any]) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def take(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Proxy"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._proxy("GET")
+
+    def do_POST(self) -> None:
+        self._proxy("POST")
+
+    def do_DELETE(self) -> None:
+        self._proxy("DELETE")
+
+    def do_HEAD(self) -> None:
+        self._proxy("HEAD")
+
+    def _proxy(self, method: str) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        prompted = False
+        if self.path.startswith("/api/generate") and body:
+            try:
+                prompted = bool(json.loads(body).get("prompt"))
+            except (ValueError, AttributeError):
+                prompted = False
+        request = urllib.request.Request(
+            self.server.upstream + self.path,
+            data=body or None,
+            method=method,
+            headers={"Content-Type": self.headers.get("Content-Type") or "application/json"},
+        )
+        call: Dict[str, Any] = {"path": self.path, "prompted": prompted, "start": time.time()}
+        try:
+            try:
+                response = urllib.request.urlopen(request, timeout=self.server.timeout_s)
+            except urllib.error.HTTPError as exc:
+                response = exc
+            except (urllib.error.URLError, OSError) as exc:
+                call["status"] = 502
+                payload = json.dumps({"error": f"proxy: {exc}"}).encode("utf-8")
+                self.send_response(502)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+            with response:
+                call["status"] = response.status
+                self._relay(method, response)
+        except (BrokenPipeError, ConnectionResetError):
+            # Gerador fechou a conexao (parada antecipada, timeout).
+            call["cancelled"] = True
+            self.close_connection = True
+        except (http.client.HTTPException, OSError):
+            # Backend cortou o stream: o gerador tambem ve a conexao cair.
+            call["status"] = 599
+            self.close_connection = True
+        finally:
+            call["end"] = time.time()
+            self.server.recorder.add(call)
+
+    def _relay(self, method: str, response: Any) -> None:
+        content_type = response.headers.get("Content-Type") or "application/json"
+        chunked = (response.headers.get("Transfer-Encoding") or "").lower() == "chunked"
+        self.send_response(response.status)
+        self.send_header("Content-Type", content_type)
+        if method == "HEAD":
+            self.send_header("Content-Length", response.headers.get("Content-Length") or "0")
+            self.end_headers()
+            return
+        if not chunked:
+            data = response.read()
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # read1 (e nao readline) levanta IncompleteRead se o backend cortar o stream.
+        while True:
+            data = response.read1(65536)
+            if not data:
+                break
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class _Proxy(ThreadingHTTPServer):
+    daemon_threads = True
+    upstream: str
+    timeout_s: float
+    recorder: _CallRecorder
+
+    def __init__(self, upstream: str, timeout_s: float):
+        super().__init__(("127.0.0.1", 0), _ProxyHandler)
+        self.upstream = upstream.rstrip("/")
+        self.timeout_s = timeout_s
+        self.recorder = _CallRecorder()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def _percentile(values: List[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _busy_seconds(calls: List[Dict[str, Any]]) -> float:
+    """Uniao dos intervalos: chamadas simultaneas nao contam em dobro."""
+    busy = 0.0
+    current_start = current_end = None
+    for call in sorted(calls, key=lambda item: item["start"]):
+        if current_end is None or call["start"] > current_end:
+            if current_end is not None:
+                busy += current_end - current_start
+            current_start, current_end = call["start"], call["end"]
+        else:
+            current_end = max(current_end, call["end"])
+    if current_end is not None:
+        busy += current_end - current_start
+    return busy
+
+
+def _round(value: float | None, digits: int = 4) -> float | None:
+    return None if value is None else round(value, digits)
+
+
+def _git_info() -> Dict[str, Any]:
+    def _git(*args: str) -> str | None:
+        try:
+            done = subprocess.run(
+                ["git", *args], cwd=str(PROJECT_ROOT), capture_output=True, text=True, check=True
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return done.stdout.strip()
+
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "subject": _git("log", "-1", "--format=%s"),
+        "dirty": bool(status) if status is not None else None,
+    }
+
+
+def _run_process(cmd: List[str], env: Dict[str, str], output_log: Path) -> Tuple[int, float, float | None]:
+    """(returncode, inicio, pico de RSS em MB); o RSS vem do wait4 do proprio filho."""
+    with open(output_log, "w", encoding="utf-8") as out:
+        started = time.time()
+        process = subprocess.Popen(
+            cmd, env=env, cwd=str(PROJECT_ROOT), stdout=out, stderr=subprocess.STDOUT
+        )
+        if not hasattr(os, "wait4"):
+            return process.wait(), started, None
+        _pid, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss: KB no Linux, bytes no macOS.
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return process.returncode, started, usage.ru_maxrss / divisor
+
+
+def _stage_env(args: argparse.Namespace, proxy: _Proxy, stage: str) -> Dict[str, str]:
+    env = os.environ.copy()
+    env.pop("OLLAMA_HOSTS", None)
+    env["OLLAMA_HOST"] = proxy.url
+    # Prefixa: dependencias fora do site-packages continuam no PYTHONPATH do chamador.
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (str(PROJECT_ROOT), env.get("PYTHONPATH", "")) if path
+    )
+    env["GEN_RESUME"] = "0"
+    if not args.cache:
+        env["GEN_CACHE"] = "0"
+    if not args.thermal:
+        env["N2_TEMP_PAUSE"] = "0"
+        env["N3_TEMP_PAUSE"] = "0"
+    env.update(STAGES[stage][1])
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key.strip()] = value
+    return env
+
+
+def run_stage(
+    args: argparse.Namespace,
+    proxy: _Proxy,
+    fake: Any,
+    stage: str,
+    input_path: Path,
+    work_dir: Path,
+    label: str,
+    expected: int,
+) -> Dict[str, Any]:
+    """Uma execucao; `failed` se o gerador saiu com erro ou gravou menos de `expected` textos."""
+    level = STAGES[stage][0]
+    output_path = work_dir / f"{label}.json"
+    for stale in work_dir.glob(f"{label}.json*"):
+        stale.unlink()
+    cmd = [
+        sys.executable,
+        str(PROJECT_ROOT / "generates" / f"generate_{level}.py"),
+        "--model", args.model,
+        "--input", str(input_path),
+        "--output", str(output_path),
+        "--log", str(work_dir / f"{label}.log"),
+    ]
+    env = _stage_env(args, proxy, stage)
+    proxy.recorder.take()
+    if fake is not None:
+        fake.reset(unload=False)
+
+    returncode, started, peak_rss = _run_process(cmd, env, work_dir / f"{label}.stdout")
+    wall = time.time() - started
+    calls = proxy.recorder.take()
+
+    texts = 0
+    meta: Dict[str, Any] = {}
+    generator_time = None
+    if output_path.exists():
+        with open(output_path, "r", encoding="utf-8") as file:
+            result = json.load(file)
+        texts = len(result.get("datas", []))
+        generator_time = result.get("time")
+        meta = {key: value for key, value in result.get("meta", {}).items() if key in _META_KEYS}
+
+    prompted = [call for call in calls if call["prompted"]]
+    latencies = [call["end"] - call["start"] for call in prompted]
+    busy = _busy_seconds(calls)
+    first_request = min((call["start"] for call in calls), default=None)
+    run: Dict[str, Any] = {
+        "stage": stage,
+        "returncode": returncode,
+        "failed": returncode != 0 or texts < expected,
+        "output": str(output_path),
+        "wall_s": _round(wall),
+        "generator_time_s": _round(generator_time),
+        "texts": texts,
+        "texts_per_s": _round(texts / wall if wall else None),
+        "calls": len(prompted),
+        "calls_per_s": _round(len(prompted) / wall if wall else None),
+        "calls_failed": sum(1 for call in prompted if call.get("status", 0) >= 400),
+        "calls_cancelled": sum(1 for call in prompted if call.get("cancelled")),
+        "requests": len(calls),
+        "latency_mean_s": _round(statistics.fmean(latencies) if latencies else None),
+        "latency_p50_s": _round(_percentile(latencies, 0.50)),
+        "latency_p95_s": _round(_percentile(latencies, 0.95)),
+        "latency_p99_s": _round(_percentile(latencies, 0.99)),
+        "latency_max_s": _round(max(latencies) if latencies else None),
+        "backend_busy_s": _round(busy),
+        "overhead_s": _round(max(0.0, wall - busy)),
+        "overhead_per_text_s": _round(max(0.0, wall - busy) / texts if texts else None),
+        "startup_s": _round(first_request - started if first_request else None),
+        "peak_rss_mb": _round(peak_rss, 1),
+        "meta": meta,
+    }
+    if fake is not None:
+        run["backend_stats"] = fake.snapshot()
+    return run
+
+
+def _median_summary(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Mediana das execucoes validas; as que falharam so entram em `failed_runs`."""
+    valid = [run for run in runs if not run.get("failed")]
+    summary: Dict[str, Any] = {"valid_runs": len(valid), "failed_runs": len(runs) - len(valid)}
+    for key, value in (valid[0] if valid else {}).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and key != "returncode":
+            values = [run[key] for run in valid if run.get(key) is not None]
+            summary[key] = _round(statistics.median(values)) if values else None
+    return summary
+
+
+def _print_summary(stage: str, summary: Dict[str, Any]) -> None:
+    def _fmt(value: Any, unit: str = "") -> str:
+        return "-" if value is None else f"{value}{unit}"
+
+    if not summary.get("valid_runs"):
+        print(f"  {stage}: nenhuma execucao valida.", flush=True)
+        return
+    failed = ""
+    if summary.get("failed_runs"):
+        failed = f", {summary['failed_runs']} execucao(oes) com falha"
+    print(
+        f"  {stage}: {_fmt(summary.get('texts_per_s'))} textos/s, "
+        f"{_fmt(summary.get('calls_per_s'))} chamadas/s, "
+        f"p50 {_fmt(summary.get('latency_p50_s'), 's')} / "
+        f"p95 {_fmt(summary.get('latency_p95_s'), 's')} / "
+        f"p99 {_fmt(summary.get('latency_p99_s'), 's')}, "
+        f"overhead {_fmt(summary.get('overhead_s'), 's')}, "
+        f"RSS {_fmt(summary.get('peak_rss_mb'), ' MB')}{failed}",
+        flush=True,
+    )
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    base_commit = (baseline.get("git") or {}).get("commit") or "?"
+    print(f"Comparacao com {base_commit[:12]}:")
+    for stage, entry in current["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            print(f"  {stage}: sem referencia.")
+            continue
+        # JSONs anteriores a `valid_runs` so tinham execucoes validas.
+        if not all(item["summary"].get("valid_runs", 1) for item in (entry, previous)):
+            print(f"  {stage}: sem execucao valida para comparar.")
+            continue
+        parts = []
+        for key, higher_better in _COMPARED:
+            new, old = entry["summary"].get(key), previous["summary"].get(key)
+            if new is None or not old:
+                continue
+            delta = 100.0 * (new - old) / old
+            better = delta > 0 if higher_better else delta < 0
+            mark = "+" if better else ("-" if delta else "=")
+            parts.append(f"{key} {old} -> {new} ({delta:+.1f}% {mark})")
+        print(f"  {stage}: " + "; ".join(parts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de vazao da geracao N1/N2/N3.")
+    parser.add_argument("--model", choices=MODEL_NAMES, default="llama")
+    parser.add_argument("--dataset", default="dataset.json")
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=10, help="Textos da fatia (0 = todos).")
+    parser.add_argument(
+        "--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+        help="Estagios medidos (default: todos).",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--backend", default="fake",
+        help="`fake` (tools/fake_ollama.py numa thread) ou URL de um Ollama.",
+    )
+    parser.add_argument(
+        "--fake-args", default="--eval-ms 20 --prompt-ms 0.2 --load-s 1",
+        help="Opcoes do fake_ollama (latencias, --parallel, falhas).",
+    )
+    parser.add_argument("--timeout", type=float, default=900.0, help="Timeout (s) do proxy.")
+    parser.add_argument("--env", action="append", default=[], metavar="CHAVE=VALOR")
+    parser.add_argument("--cache", action="store_true", help="Mantem o cache do LLM.")
+    parser.add_argument("--thermal", action="store_true", help="Mantem as pausas termicas.")
+    parser.add_argument("--work-dir", default=None, help="Saidas dos geradores (default: temp).")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", default=None, help="JSON de um benchmark anterior.")
+    args = parser.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as file:
+        datas = json.load(file).get("datas", [])
+    end = args.offset + args.limit if args.limit > 0 else None
+    datas = datas[args.offset:end]
+    if not datas:
+        print("Fatia do dataset vazia.")
+        return
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="rase_bench_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    slice_path = work_dir / "dataset_slice.json"
+    with open(slice_path, "w", encoding="utf-8") as file:
+        json.dump({"counts": len(datas), "datas": datas}, file, ensure_ascii=False, indent=2)
+
+    fake = None
+    fake_server = None
+    upstream = args.backend
+    if args.backend == "fake":
+        fake_args = fake_ollama.build_parser().parse_args(
+            shlex.split(args.fake_args) + ["--host", "127.0.0.1", "--port", "0"]
+        )
+        fake_server, _thread = fake_ollama.start_server(fake_args)
+        fake = fake_server.fake
+        upstream = f"http://127.0.0.1:{fake_server.server_address[1]}"
+    proxy = _Proxy(upstream, args.timeout)
+    threading.Thread(target=proxy.serve_forever, name="bench-proxy", daemon=True).start()
+
+    git = _git_info()
+    env_flags = {
+        key: value
+        for key, value in sorted(_stage_env(args, proxy, "n1").items())
+        if key.startswith(_ENV_PREFIXES) and key != "OLLAMA_HOST"
+    }
+    report: Dict[str, Any] = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": git,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "backend": {
+            "kind": "fake" if fake is not None else "ollama",
+            "url": None if fake is not None else args.backend,
+            "fake_args": args.fake_args if fake is not None else None,
+        },
+        "model": args.model,
+        "model_id": MODELS[args.model],
+        "dataset": {
+            "path": args.dataset,
+            "offset": args.offset,
+            "limit": args.limit,
+            "texts": len(datas),
+        },
+        "repeat": args.repeat,
+        "env": env_flags,
+        "stages": {},
+    }
+    print(
+        f"Benchmark: {len(datas)} textos, modelo {args.model}, backend "
+        f"{report['backend']['kind']} ({upstream}), commit {(git['commit'] or '?')[:12]}"
+        + (" (com alteracoes)" if git["dirty"] else ""),
+        flush=True,
+    )
+
+    outputs: Dict[str, Path] = {}
+    failed_runs = 0
+
+    def _input_for(stage: str) -> Path:
+        level = STAGES[stage][0]
+        source_stage = _INPUT_STAGE.get(level)
+        if source_stage is None:
+            return slice_path
+        if source_stage not in outputs:
+            # Estagio anterior fora da lista: roda uma vez, sem medir.
+            print(f"Preparando entrada de {stage}: {source_stage} (nao medido)...", flush=True)
+            prep = run_stage(
+                args, proxy, fake, source_stage, _input_for(source_stage), work_dir,
+                f"prep_{source_stage}", len(datas),
+            )
+            if prep["failed"]:
+                raise RuntimeError(f"Falha ao preparar a entrada de {stage}.")
+            outputs[source_stage] = Path(prep["output"])
+        return outputs[source_stage]
+
+    try:
+        for stage in args.stages:
+            try:
+                input_path = _input_for(stage)
+            except RuntimeError as exc:
+                print(exc, flush=True)
+                failed_runs += 1
+                continue
+            runs = []
+            for repeat in range(1, args.repeat + 1):
+                print(f"{stage} ({repeat}/{args.repeat})...", flush=True)
+                run = run_stage(
+                    args, proxy, fake, stage, input_path, work_dir, f"{stage}_{repeat}",
+                    len(datas),
+                )
+                if run["failed"]:
+                    print(
+                        f"  {stage}: execucao invalida (codigo {run['returncode']}, "
+                        f"{run['texts']}/{len(datas)} textos; ver "
+                        f"{work_dir / f'{stage}_{repeat}.stdout'})",
+                        flush=True,
+                    )
+                    failed_runs += 1
+                runs.append(run)
+            valid = [run for run in runs if not run["failed"]]
+            if valid:
+                outputs.setdefault(stage, Path(valid[0]["output"]))
+            summary = _median_summary(runs)
+            report["stages"][stage] = {"summary": summary, "runs": runs}
+            _print_summary(stage, summary)
+    finally:
+        proxy.shutdown()
+        if fake_server is not None:
+            fake_server.shutdown()
+
+    short = (git["commit"] or "nogit")[:12]
+    out_path = Path(args.out or PROJECT_ROOT / "runs" / "benchmarks" / f"generation_{short}.json")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Resultado salvo em {out_path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            compare(report, json.load(file))
+    if failed_runs:
+        print(f"{failed_runs} execucao(oes) falharam e ficaram fora das medianas.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,797 @@
+"""Servidor local compativel com a API do Ollama, para testar e medir a geracao sem GPU.
+
+Uso:
+    python tools/fake_ollama.py --port 11434 --eval-ms 30 --prompt-ms 0.5 --load-s 2
+    OLLAMA_HOST=http://127.0.0.1:11434 python generates/generate_n2.py --model llama
+
+Endpoints: `/api/generate` (com e sem streaming; prompt vazio carrega o modelo ou,
+com `keep_alive=0`, descarrega), `/api/tags`, `/api/ps`, `/api/pull`, `/api/show`,
+`/api/version`. Extras do servidor: `GET /fake/stats` (contadores) e
+`POST /fake/reset` (zera contadores e descarrega os modelos).
+
+Respostas deterministicas:
+- padrao: resposta sintetica por nivel, reconhecida pelo prompt (N1, N2, N2 em
+  lote, N3 por operador, N3 combinado) e derivada do texto de entrada.
+  `--trailing-tokens N` acrescenta N tokens de explicacao depois da saida, como
+  fazem os modelos reais (exercita o streaming com parada antecipada).
+- `--replay <arquivo>`: respostas gravadas, buscadas por modelo + SHA-256 do
+  prompt. Aceita o JSONL de `--record` ou o cache SQLite dos geradores
+  (`.cache/llm_cache.sqlite`). Prompts sem gravacao caem na resposta sintetica
+  (ou HTTP 500 com `--replay-strict`).
+- `--record <arquivo> --upstream <url>`: repassa ao Ollama real e grava as respostas.
+
+Latencias: `--load-s` (carga do modelo), `--prompt-ms` (avaliacao do prompt por
+token) e `--eval-ms` (geracao por token). Cada uma aceita um valor fixo (`30`),
+normal `media:desvio` (`30:5`), uniforme `min-max` (`20-40`) ou exponencial
+`exp:media`. Os sorteios usam `--seed`, o modelo, o prompt e a ocorrencia do
+prompt, entao repetem entre execucoes independente da ordem das threads.
+
+Como o Ollama: `--parallel` slots por modelo (OLLAMA_NUM_PARALLEL), pedidos
+alem disso esperam; `--max-loaded` modelos carregados (OLLAMA_MAX_LOADED_MODELS);
+mudar o `num_ctx` recarrega o modelo; `keep_alive` expira o modelo ocioso; cada
+slot guarda os tokens da ultima chamada e so avalia o que nao for prefixo comum.
+`stop` e `num_predict` cortam a saida.
+
+Erros: `--error-rate` (HTTP 500), `--drop-rate` (stream cortado no meio),
+`--stall-rate`/`--stall-s` (demora antes do primeiro token) e `--missing-model`
+(HTTP 404 "model not found").
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from config.models import MODELS
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_CHUNK = re.compile(r"\s*(?:\w+|[^\w\s])|\s+\Z")
+_DEFAULT_NUM_CTX = 2048
+_DEFAULT_KEEP_ALIVE = 300.0
+_TRAILING = (
+    "Explicacao: a saida acima segue as regras pedidas, sem campos adicionais "
+    "e sem comentarios sobre o texto de entrada."
+)
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall(text)
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# --- Distribuicoes de latencia ---------------------------------------------
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """`30`, `30:5` (normal), `20-40` (uniforme) ou `exp:30` -> sorteador >= 0."""
+    spec = spec.strip()
+    if spec.startswith("exp:"):
+        mean = float(spec[4:])
+        return lambda rng: rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+    if ":" in spec:
+        mean, deviation = (float(part) for part in spec.split(":", 1))
+        return lambda rng: max(0.0, rng.gauss(mean, deviation))
+    if "-" in spec[1:]:
+        low, high = (float(part) for part in spec.split("-", 1))
+        return lambda rng: rng.uniform(low, high)
+    value = float(spec)
+    return lambda _rng: value
+
+
+def _keep_alive_seconds(raw: Any) -> float:
+    """Duracao do Ollama (`30s`, `5m`, `1h`, segundos); negativo = para sempre."""
+    if raw is None or raw == "":
+        return _DEFAULT_KEEP_ALIVE
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*", str(raw))
+    if not match:
+        return _DEFAULT_KEEP_ALIVE
+    value = float(match.group(1))
+    return value * {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+
+
+# --- Respostas sinteticas -----------------------------------------------------
+
+_MODAL = re.compile(
+    r"(?<!\w)(deve|devem|dever[aá]|dever[aã]o|pode|podem|precisa|precisam|necessita"
+    r"|necessitam|tem|t[eê]m|possui|possuem|é|s[aã]o|est[aá]|est[aã]o)(?!\w)",
+    re.IGNORECASE,
+)
+_EXCEPTION = re.compile(r",?\s*\b(exceto|salvo|com excecao de|a menos que)\b[^,.]*", re.IGNORECASE)
+_NUMBER = re.compile(r"(?<!\w)(\d+(?:[.,]\d+)?)\s*(%|mm|cm|m2|m²|m|km|kg|lux|dB|graus)?(?!\w)")
+_STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "em", "no", "na", "um", "uma",
+    "ser", "estar", "ter", "haver",
+}
+_N3_TYPES = ("aplicabilidade", "selecao", "excecao", "requisito")
+
+
+def _last_quoted(prompt: str, label: str) -> str | None:
+    # Os exemplos do prompt vem antes; a entrada real e o ultimo bloco.
+    matches = re.findall(re.escape(label) + r'\s*\n"(.*?)"[ \t]*(?:\n|$)', prompt, re.S)
+    return matches[-1] if matches else None
+
+
+def _split_sentences(text: str) -> List[str]:
+    parts = re.split(r"(?<=[.;])\s+|\n+", text)
+    return [part.strip().rstrip(".;") + "." for part in parts if part.strip(" .;")]
+
+
+def _n2_fields(sentence: str) -> Dict[str, str]:
+    sentence = sentence.strip().rstrip(".")
+    exception = _EXCEPTION.search(sentence)
+    execao = exception.group(0).strip(" ,") if exception else ""
+    if exception:
+        sentence = (sentence[: exception.start()] + sentence[exception.end():]).strip()
+    modal = _MODAL.search(sentence)
+    if modal is None:
+        return {"aplicabilidade": "", "selecao": "", "execao": execao, "requisito": sentence}
+    return {
+        "aplicabilidade": sentence[: modal.start()].strip(" ,"),
+        "selecao": "",
+        "execao": execao,
+        "requisito": sentence[modal.start():].strip(),
+    }
+
+
+def _n2_lines(fields: Dict[str, str]) -> str:
+    return "\n".join(f"{key}: {value or chr(34) * 2}" for key, value in fields.items())
+
+
+def _n3_properties(operator_type: str, span: str) -> Dict[str, str]:
+    properties = {
+        "type": operator_type, "object": "", "property": "",
+        "comparation": "", "target": "", "unit": "",
+    }
+    span = span.strip().strip('"').strip()
+    if not span:
+        return properties
+    lower = span.lower()
+    number = _NUMBER.search(span)
+    head = span[: number.start()] if number else span
+    words = [word for word in re.findall(r"\w+", head) if word.lower() not in _STOPWORDS]
+    modal = next((i for i, word in enumerate(words) if _MODAL.fullmatch(word)), None)
+    if modal is not None:
+        words = words[:modal] + words[modal + 1:]
+    properties["object"] = words[0].lower() if words else ""
+    properties["property"] = " ".join(words[1:4]).lower()
+    if re.search(r"m[aá]xim|(?<!\w)at[eé](?!\w)|inferior|menor", lower):
+        properties["comparation"] = "<="
+    elif re.search(r"m[ií]nim|pelo menos|superior|maior", lower):
+        properties["comparation"] = ">="
+    else:
+        properties["comparation"] = "="
+    properties["target"] = number.group(1) if number else "VERDADEIRO"
+    properties["unit"] = (number.group(2) or "") if number else ""
+    return properties
+
+
+def canned_response(prompt: str) -> str:
+    """Resposta sintetica para os prompts de `prompts/`, derivada do texto de entrada."""
+    if "Extrator RASE N3 (multi-operador)" in prompt:
+        spans = [
+            _last_quoted(prompt, f"Operador {label}:") or ""
+            for label in ("aplicabilidade", "selecao", "excecao", "requisito")
+        ]
+        return json.dumps(
+            {kind: _n3_properties(kind, span) for kind, span in zip(_N3_TYPES, spans)},
+            ensure_ascii=False,
+            indent=2,
+        )
+    if "Extrator RASE N3" in prompt:
+        match = re.search(r"Extrator RASE N3 \((\w+)\)", prompt)
+        label = match.group(1) if match else "requisito"
+        kind = "excecao" if label == "execao" else label
+        span = _last_quoted(prompt, f"Operador N2 ({label}):") or ""
+        return json.dumps(_n3_properties(kind, span), ensure_ascii=False, indent=2)
+    if "Extrator RASE N2 (lote" in prompt:
+        block = prompt.rsplit("Sentencas N1:", 1)[-1]
+        sentences = re.findall(r'^Sentenca (\d+):\s*\n"(.*?)"\s*$', block, re.M)
+        return "\n".join(
+            f"### {index}\n{_n2_lines(_n2_fields(sentence))}"
+            for index, sentence in sentences
+        )
+    if "Extrator RASE N2" in prompt:
+        return _n2_lines(_n2_fields(_last_quoted(prompt, "Texto N1:") or ""))
+    if "TEXTO_INICIO" in prompt:
+        text = prompt.rsplit("TEXTO_INICIO", 1)[-1].split("TEXTO_FIM", 1)[0]
+        return "\n".join(_split_sentences(text))
+    return "\n".join(_split_sentences(prompt)[-3:])
+
+
+# --- Respostas gravadas ----------------------------------------------------------
+
+
+def load_replay(path: str) -> Dict[Tuple[str, str], str]:
+    """(modelo, sha256 do prompt) -> resposta, de um JSONL de `--record` ou do cache SQLite."""
+    responses: Dict[Tuple[str, str], str] = {}
+    if path.endswith((".sqlite", ".db")):
+        conn = sqlite3.connect(path)
+        try:
+            for model, prompt_sha256, response in conn.execute(
+                "SELECT model_id, prompt_sha256, response FROM responses"
+            ):
+                responses[(model, prompt_sha256)] = response
+        finally:
+            conn.close()
+        return responses
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                responses[(entry["model"], entry["prompt_sha256"])] = entry["response"]
+    return responses
+
+
+# --- Modelos carregados e slots -------------------------------------------------
+
+
+class _Runner:
+    """Um modelo carregado: `parallel` slots, cada um com os tokens da ultima chamada."""
+
+    def __init__(self, model: str, num_ctx: int, parallel: int):
+        self.model = model
+        self.num_ctx = num_ctx
+        self.ready = False
+        self.slots: List[List[str]] = [[] for _ in range(parallel)]
+        self.busy: List[bool] = [False] * parallel
+        self.active = 0
+        self.loaded_at = time.time()
+        self.expires_at: float | None = None
+
+    def free_slot(self, prompt_tokens: List[str]) -> Tuple[int, int] | None:
+        """Slot livre com o maior prefixo em comum: (slot, tokens em cache)."""
+        best: Tuple[int, int] | None = None
+        for slot, cached in enumerate(self.slots):
+            if self.busy[slot]:
+                continue
+            common = 0
+            for left, right in zip(cached, prompt_tokens):
+                if left != right:
+                    break
+                common += 1
+            if best is None or common > best[1]:
+                best = (slot, common)
+        return best
+
+
+class FakeOllama:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.available: List[str] = list(args.models or MODELS.values())
+        self.missing = set(args.missing_model or [])
+        self.load_s = parse_distribution(args.load_s)
+        self.prompt_ms = parse_distribution(args.prompt_ms)
+        self.eval_ms = parse_distribution(args.eval_ms)
+        self.replay = load_replay(args.replay) if args.replay else {}
+        self.cond = threading.Condition()
+        self.runners: Dict[str, _Runner] = {}
+        self._log_lock = threading.Lock()
+        self._log = open(args.log, "a", encoding="utf-8") if args.log else None
+        self._record = open(args.record, "a", encoding="utf-8") if args.record else None
+        self.reset()
+
+    def reset(self, unload: bool = True) -> None:
+        with self.cond:
+            if unload:
+                self.runners.clear()
+            self.seen: Counter[Tuple[str, str]] = Counter()
+            self.stats: Dict[str, Any] = {
+                "requests": 0,
+                "generate": 0,
+                "by_model": {},
+                "loads": 0,
+                "unloads": 0,
+                "prompt_tokens": 0,
+                "prompt_tokens_cached": 0,
+                "eval_tokens": 0,
+                "truncated_prompts": 0,
+                "errors": {"injected": 0, "dropped": 0, "stalled": 0, "missing": 0},
+                "replay": {"hits": 0, "misses": 0},
+                "max_active": 0,
+            }
+            self.cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.cond:
+            return json.loads(json.dumps(self.stats))
+
+    def rng(self, model: str, prompt: str) -> random.Random:
+        key = (model, _sha256(prompt))
+        with self.cond:
+            occurrence = self.seen[key]
+            self.seen[key] += 1
+        return random.Random(f"{self.args.seed}:{model}:{key[1]}:{occurrence}")
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self.cond:
+            self.stats[key] += amount
+
+    def write_log(self, entry: Dict[str, Any]) -> None:
+        if self._log is None:
+            return
+        with self._log_lock:
+            self._log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._log.flush()
+
+    # Ciclo de vida dos modelos (sempre sob `self.cond`).
+
+    def _expire(self) -> None:
+        now = time.time()
+        for model, runner in list(self.runners.items()):
+            if runner.active == 0 and runner.expires_at is not None and now >= runner.expires_at:
+                del self.runners[model]
+                self.stats["unloads"] += 1
+
+    def _evict_idle(self) -> bool:
+        idle = [runner for runner in self.runners.values() if runner.ready and runner.active == 0]
+        if not idle:
+            return False
+        oldest = min(idle, key=lambda runner: runner.loaded_at)
+        del self.runners[oldest.model]
+        self.stats["unloads"] += 1
+        return True
+
+    def acquire(
+        self, model: str, num_ctx: int, prompt_tokens: List[str], rng: random.Random
+    ) -> Tuple[_Runner, int, int, float]:
+        """Espera um slot do modelo (carregando-o se preciso): (runner, slot, cache, carga)."""
+        load_seconds = 0.0
+        with self.cond:
+            while True:
+                self._expire()
+                runner = self.runners.get(model)
+                if runner is not None and runner.ready and runner.num_ctx != num_ctx:
+                    if runner.active == 0:
+                        # Como no Ollama: outro num_ctx exige recarregar o modelo.
+                        del self.runners[model]
+                        self.stats["unloads"] += 1
+                        runner = None
+                    else:
+                        self.cond.wait(0.5)
+                        continue
+                if runner is None:
+                    if len(self.runners) >= self.args.max_loaded and not self._evict_idle():
+                        self.cond.wait(0.5)
+                        continue
+                    runner = _Runner(model, num_ctx, self.args.parallel)
+                    self.runners[model] = runner
+                    seconds = self.load_s(rng)
+                    self.cond.release()
+                    try:
+                        time.sleep(seconds)
+                    finally:
+                        self.cond.acquire()
+                    runner.ready = True
+                    runner.loaded_at = time.time()
+                    self.stats["loads"] += 1
+                    load_seconds += seconds
+                    self.cond.notify_all()
+                    continue
+                choice = runner.free_slot(prompt_tokens) if runner.ready else None
+                if choice is None:
+                    self.cond.wait(0.5)
+                    continue
+                slot, cached = choice
+                runner.busy[slot] = True
+                runner.active += 1
+                active = sum(r.active for r in self.runners.values())
+                self.stats["max_active"] = max(self.stats["max_active"], active)
+                return runner, slot, cached, load_seconds
+
+    def release(
+        self, runner: _Runner, slot: int, tokens: List[str], keep_alive: float
+    ) -> None:
+        with self.cond:
+            runner.slots[slot] = tokens
+            runner.busy[slot] = False
+            runner.active -= 1
+            runner.expires_at = None if keep_alive < 0 else time.time() + keep_alive
+            self._expire()
+            self.cond.notify_all()
+
+    def preload_or_unload(self, model: str, keep_alive: float, num_ctx: int) -> str:
+        """Prompt vazio: `keep_alive=0` descarrega; senao carrega o modelo."""
+        if keep_alive == 0:
+            with self.cond:
+                runner = self.runners.get(model)
+                if runner is not None:
+                    runner.expires_at = time.time()
+                    self._expire()
+            return "unload"
+        runner, slot, _, _ = self.acquire(model, num_ctx, [], self.rng(model, ""))
+        self.release(runner, slot, runner.slots[slot], keep_alive)
+        return "load"
+
+    # Texto da resposta.
+
+    def response_text(self, model: str, prompt: str, body: Dict[str, Any]) -> str | None:
+        if self.args.upstream:
+            return self._forward(body)
+        if self.replay:
+            for candidate in (prompt, prompt[len("Human: "):] if prompt.startswith("Human: ") else None):
+                if candidate is None:
+                    continue
+                recorded = self.replay.get((model, _sha256(candidate)))
+                if recorded is not None:
+                    self.count_replay("hits")
+                    return recorded
+            self.count_replay("misses")
+            if self.args.replay_strict:
+                return None
+        text = canned_response(prompt)
+        if self.args.trailing_tokens > 0:
+            filler = (_TRAILING + " ") * (1 + self.args.trailing_tokens // len(_tokens(_TRAILING)))
+            text += "\n\n" + "".join(_CHUNK.findall(filler)[: self.args.trailing_tokens])
+        return text
+
+    def count_replay(self, key: str) -> None:
+        with self.cond:
+            self.stats["replay"][key] += 1
+
+    def _forward(self, body: Dict[str, Any]) -> str:
+        request = urllib.request.Request(
+            self.args.upstream.rstrip("/") + "/api/generate",
+            data=json.dumps({**body, "stream": False}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.args.upstream_timeout) as response:
+            text = json.loads(response.read()).get("response", "")
+        if self._record is not None:
+            entry = {
+                "model": body.get("model", ""),
+                "prompt_sha256": _sha256(body.get("prompt", "")),
+                "options": body.get("options") or {},
+                "response": text,
+            }
+            with self._log_lock:
+                self._record.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._record.flush()
+        return text
+
+
+def _cut(text: str, options: Dict[str, Any]) -> Tuple[List[str], str]:
+    """Aplica `stop` e `num_predict`: (chunks, done_reason)."""
+    reason = "stop"
+    stops = [stop for stop in options.get("stop") or [] if stop]
+    positions = [text.find(stop) for stop in stops if stop in text]
+    if positions:
+        text = text[: min(positions)]
+    chunks = _CHUNK.findall(text)
+    limit = options.get("num_predict")
+    if isinstance(limit, int) and limit >= 0 and len(chunks) > limit:
+        chunks = chunks[:limit]
+        reason = "length"
+    return chunks, reason
+
+
+# --- HTTP -------------------------------------------------------------------------
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.fake.args.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, payload: Dict[str, Any]) -> None:
+        line = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def _body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw or b"{}")
+
+    def do_HEAD(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        fake = self.server.fake
+        fake.count("requests")
+        if self.path == "/":
+            data = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif self.path.startswith("/api/tags"):
+            self._send_json({"models": [_model_entry(name) for name in fake.available]})
+        elif self.path.startswith("/api/ps"):
+            with fake.cond:
+                loaded = [
+                    {**_model_entry(runner.model), "context_length": runner.num_ctx}
+                    for runner in fake.runners.values()
+                    if runner.ready
+                ]
+            self._send_json({"models": loaded})
+        elif self.path.startswith("/api/version"):
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path.startswith("/fake/stats"):
+            self._send_json(fake.snapshot())
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        fake = self.server.fake
+        fake.count("requests")
+        try:
+            body = self._body()
+        except json.JSONDecodeError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+        if self.path == "/api/generate":
+            self._generate(body)
+        elif self.path == "/api/pull":
+            self._pull(body)
+        elif self.path == "/api/show":
+            name = body.get("model") or body.get("name", "")
+            if name not in fake.available:
+                self._send_json({"error": f"model '{name}' not found"}, 404)
+            else:
+                self._send_json({"details": _model_entry(name)["details"], "model_info": {}})
+        elif self.path == "/fake/reset":
+            fake.reset()
+            self._send_json({"status": "ok"})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _pull(self, body: Dict[str, Any]) -> None:
+        fake = self.server.fake
+        name = body.get("model") or body.get("name", "")
+        if name in fake.missing:
+            self._send_json({"error": "pull model manifest: file does not exist"}, 500)
+            return
+        if name not in fake.available:
+            fake.available.append(name)
+        if body.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for status in ("pulling manifest", "verifying sha256 digest", "success"):
+                self._send_chunk({"status": status})
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self._send_json({"status": "success"})
+
+    def _generate(self, body: Dict[str, Any]) -> None:
+        fake = self.server.fake
+        started = time.time()
+        model = body.get("model", "")
+        prompt = body.get("prompt", "") or ""
+        options: Dict[str, Any] = body.get("options") or {}
+        stream = body.get("stream", True)
+        keep_alive = _keep_alive_seconds(body.get("keep_alive"))
+        num_ctx = int(options.get("num_ctx") or fake.args.num_ctx)
+        fake.count("generate")
+        with fake.cond:
+            fake.stats["by_model"][model] = fake.stats["by_model"].get(model, 0) + 1
+        log_entry: Dict[str, Any] = {
+            "ts": started,
+            "model": model,
+            "prompt_sha256": _sha256(prompt),
+            "options": options,
+            "format": body.get("format"),
+            "keep_alive": body.get("keep_alive"),
+            "stream": stream,
+        }
+
+        if model in fake.missing or model not in fake.available:
+            with fake.cond:
+                fake.stats["errors"]["missing"] += 1
+            fake.write_log({**log_entry, "status": 404})
+            self._send_json({"error": f"model '{model}' not found"}, 404)
+            return
+        if not prompt:
+            reason = fake.preload_or_unload(model, keep_alive, num_ctx)
+            fake.write_log({**log_entry, "status": 200, "done_reason": reason})
+            self._send_json(
+                {"model": model, "created_at": _iso(), "response": "", "done": True,
+                 "done_reason": reason}
+            )
+            return
+
+        rng = fake.rng(model, prompt)
+        if rng.random() < fake.args.error_rate:
+            with fake.cond:
+                fake.stats["errors"]["injected"] += 1
+            fake.write_log({**log_entry, "status": 500})
+            self._send_json({"error": "fake_ollama: erro injetado"}, 500)
+            return
+        text = fake.response_text(model, prompt, body)
+        if text is None:
+            fake.write_log({**log_entry, "status": 500})
+            self._send_json({"error": "fake_ollama: prompt sem resposta gravada"}, 500)
+            return
+        drop = rng.random() < fake.args.drop_rate
+        stall = rng.random() < fake.args.stall_rate
+        simulate = not fake.args.upstream
+
+        prompt_tokens = _tokens(prompt)
+        runner, slot, cached, load_seconds = fake.acquire(model, num_ctx, prompt_tokens, rng)
+        chunks, done_reason = _cut(text, options)
+        output_tokens = _tokens("".join(chunks))
+        try:
+            if len(prompt_tokens) > num_ctx:
+                fake.count("truncated_prompts")
+            # O ultimo token do prompt e sempre reavaliado, como no Ollama.
+            cached = min(cached, max(0, len(prompt_tokens) - 1))
+            evaluated = min(len(prompt_tokens), num_ctx) - min(cached, num_ctx)
+            fake.count("prompt_tokens", len(prompt_tokens))
+            fake.count("prompt_tokens_cached", cached)
+            prompt_seconds = sum(fake.prompt_ms(rng) for _ in range(evaluated)) / 1000.0
+            if simulate:
+                time.sleep(prompt_seconds)
+            if stall:
+                with fake.cond:
+                    fake.stats["errors"]["stalled"] += 1
+                time.sleep(fake.args.stall_s)
+            eval_started = time.time()
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+            sent: List[str] = []
+            for index, chunk in enumerate(chunks):
+                if drop and index >= len(chunks) // 2:
+                    with fake.cond:
+                        fake.stats["errors"]["dropped"] += 1
+                    fake.write_log({**log_entry, "status": 200, "dropped": True})
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                if simulate:
+                    time.sleep(fake.eval_ms(rng) / 1000.0)
+                sent.append(chunk)
+                if stream:
+                    self._send_chunk(
+                        {"model": model, "created_at": _iso(), "response": chunk, "done": False}
+                    )
+            eval_seconds = time.time() - eval_started
+            fake.count("eval_tokens", len(sent))
+            final = {
+                "model": model,
+                "created_at": _iso(),
+                "response": "" if stream else "".join(sent),
+                "done": True,
+                "done_reason": done_reason,
+                "total_duration": int((time.time() - started) * 1e9),
+                "load_duration": int(load_seconds * 1e9),
+                "prompt_eval_count": evaluated,
+                "prompt_eval_duration": int(prompt_seconds * 1e9),
+                "eval_count": len(sent),
+                "eval_duration": int(eval_seconds * 1e9),
+            }
+            if stream:
+                self._send_chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            else:
+                self._send_json(final)
+            fake.write_log(
+                {**log_entry, "status": 200, "done_reason": done_reason,
+                 "prompt_eval_count": evaluated, "prompt_cached": cached,
+                 "eval_count": len(sent), "load_duration_s": round(load_seconds, 3),
+                 "total_duration_s": round(time.time() - started, 3)}
+            )
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente cancelou (timeout, parada antecipada do streaming).
+            fake.write_log({**log_entry, "status": 499})
+        finally:
+            fake.release(runner, slot, prompt_tokens + output_tokens, keep_alive)
+
+
+def _iso() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z", time.gmtime())
+
+
+def _model_entry(name: str) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "model": name,
+        "modified_at": "2024-01-01T00:00:00Z",
+        "size": 0,
+        "digest": _sha256(name),
+        "details": {"format": "gguf", "family": "fake", "parameter_size": "0B"},
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], fake: FakeOllama):
+        super().__init__(address, _Handler)
+        self.fake = fake
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Servidor fake compativel com o Ollama.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", nargs="*", default=None,
+                        help="Modelos disponiveis (default: config/models.py).")
+    parser.add_argument("--missing-model", action="append", default=None,
+                        help="Modelo que responde 404 (repetivel).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load-s", default="0", help="Carga do modelo (s).")
+    parser.add_argument("--prompt-ms", default="0", help="Avaliacao do prompt por token (ms).")
+    parser.add_argument("--eval-ms", default="0", help="Geracao por token (ms).")
+    parser.add_argument("--parallel", type=int, default=1, help="Slots por modelo.")
+    parser.add_argument("--max-loaded", type=int, default=1, help="Modelos carregados.")
+    parser.add_argument("--num-ctx", type=int, default=_DEFAULT_NUM_CTX)
+    parser.add_argument("--trailing-tokens", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-s", type=float, default=30.0)
+    parser.add_argument("--replay", default=None)
+    parser.add_argument("--replay-strict", action="store_true")
+    parser.add_argument("--record", default=None)
+    parser.add_argument("--upstream", default=None)
+    parser.add_argument("--upstream-timeout", type=float, default=600.0)
+    parser.add_argument("--log", default=None, help="JSONL com uma linha por /api/generate.")
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def start_server(args: argparse.Namespace) -> Tuple[_Server, threading.Thread]:
+    """Sobe o servidor numa thread (usado pelos benchmarks); `server.shutdown()` encerra."""
+    server = _Server((args.host, args.port), FakeOllama(args))
+    thread = threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True)
+    thread.start()
+    return server, thread
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    if args.record and not args.upstream:
+        print("--record exige --upstream.")
+        return
+    server = _Server((args.host, args.port), FakeOllama(args))
+    host, port = server.server_address[:2]
+    if isinstance(host, bytes):
+        host = host.decode("ascii")
+    print(f"fake_ollama em http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
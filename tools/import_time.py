@@ -0,0 +1,100 @@
+"""Relatorio do tempo de import dos pontos de entrada (python -X importtime).
+
+Uso:
+    python tools/import_time.py
+    python tools/import_time.py main validates.validate_n1 --top 15
+
+Cada modulo e importado num interpretador novo (`-X importtime`, sem cache de
+modulos ja carregados); o relatorio mostra o tempo total do import e os
+modulos mais lentos pelo tempo acumulado (o proprio modulo e o que ele
+importa) e pelo tempo proprio. Um modulo que falha no import (dependencia
+ausente) aparece com o erro, e o tempo ate a falha continua valendo.
+
+Sem argumentos mede os menus (`main`, `generates.menu_generate`,
+`validates.menu_validate`, `tools.menu_tables`), os geradores e os scripts de
+validacao, que o `tools/run_seed_sweep.py` roda como subprocessos.
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES: List[str] = [
+    "main",
+    "generates.menu_generate",
+    "validates.menu_validate",
+    "tools.menu_tables",
+    "generates.generate_n1",
+    "generates.generate_n2",
+    "generates.generate_n3",
+    "validates.validate_n1",
+    "validates.validate_n2",
+    "validates.validate_n3",
+]
+
+# (modulo, proprio us, acumulado us, profundidade)
+Entry = Tuple[str, int, int, int]
+
+
+def measure(module: str) -> Tuple[List[Entry], str]:
+    """Linhas do -X importtime ao importar `module` e o erro (ou "")."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(PROJECT_ROOT),
+        capture_output=True,
+        text=True,
+    )
+    entries: List[Entry] = []
+    error_lines: List[str] = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            error_lines.append(line)
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # cabecalho
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(parts[0]), int(parts[1]), depth))
+    error = error_lines[-1].strip() if completed.returncode != 0 and error_lines else ""
+    return entries, error
+
+
+def report(module: str, top: int) -> Dict[str, Any]:
+    entries, error = measure(module)
+    # Os imports de profundidade 0 somam o tempo total.
+    total_us = sum(entry[2] for entry in entries if entry[3] == 0)
+    by_cumulative = sorted(entries, key=lambda entry: entry[2], reverse=True)
+    by_own = sorted(entries, key=lambda entry: entry[1], reverse=True)
+    print(f"{module}: {total_us / 1e6:.3f}s em {len(entries)} modulos")
+    if error:
+        print(f"  falhou: {error}")
+    print(f"  {'acumulado s':>11} {'proprio s':>10}  modulo")
+    for name, own, cumulative, _depth in by_cumulative[:top]:
+        print(f"  {cumulative / 1e6:>11.3f} {own / 1e6:>10.3f}  {name}")
+    print("  mais lentos por tempo proprio: " + ", ".join(
+        f"{name} {own / 1e6:.3f}s" for name, own, _cumulative, _depth in by_own[:5]
+    ))
+    print()
+    return {"module": module, "total_s": total_us / 1e6, "error": error}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tempo de import dos pontos de entrada.")
+    parser.add_argument("modules", nargs="*", default=None, help="Modulos (default: menus e scripts).")
+    parser.add_argument("--top", type=int, default=10, help="Modulos listados por ponto de entrada.")
+    args = parser.parse_args()
+
+    results = [report(module, args.top) for module in args.modules or DEFAULT_MODULES]
+    print("Resumo:")
+    for result in sorted(results, key=lambda item: float(item["total_s"] or 0.0), reverse=True):
+        status = " (falhou)" if result["error"] else ""
+        print(f"  {result['total_s']:>7.3f}s  {result['module']}{status}")
+
+
+if __name__ == "__main__":
+    main()
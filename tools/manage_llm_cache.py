@@ -0,0 +1,56 @@
+"""Inspeciona e invalida o cache persistente de respostas do LLM.
+
+Uso:
+    python tools/manage_llm_cache.py --stats
+    python tools/manage_llm_cache.py --invalidate <sha256>
+    python tools/manage_llm_cache.py --clear
+
+`--invalidate` aceita o SHA-256 do prompt renderizado ou o `prompt_sha256`
+gravado no `meta` de um predict (remove todas as respostas daquele template).
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from utils.generates.llm_cache import DEFAULT_CACHE_PATH, LLMCache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gerencia o cache de respostas do LLM.")
+    parser.add_argument(
+        "--path",
+        default=os.environ.get("GEN_CACHE_PATH", "").strip() or DEFAULT_CACHE_PATH,
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--stats", action="store_true")
+    group.add_argument("--invalidate", metavar="SHA256")
+    group.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    if not Path(args.path).exists():
+        print(f"Cache nao encontrado em {args.path}.")
+        return
+
+    cache = LLMCache(args.path, max_entries=0)
+    try:
+        if args.stats:
+            print(f"Cache: {args.path}")
+            print(f"Entradas: {cache.entries()}")
+        elif args.invalidate:
+            removed = cache.invalidate(args.invalidate.strip())
+            print(f"Entradas removidas: {removed}")
+        elif args.clear:
+            removed = cache.clear()
+            print(f"Entradas removidas: {removed}")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 """Calcula metrica composta qualidade/tempo (F1 / segundos por sentenca) e gera CSV.
 
 Le os predicts (campo `time` e `counts`) e os metrics (F1 macro de classificacao).
+Quando o predict traz `time_compute`, as pausas termicas (`time_pause`) ficam
+fora do tempo por sentenca.
 """
 
 import argparse
@@ -42,18 +44,22 @@ def main() -> None:
         with open(predict_path, "r", encoding="utf-8") as f:
             predict = json.load(f)
         total_time = float(predict.get("time", 0.0))
+        pause_time = float(predict.get("time_pause", 0.0))
+        compute_time = float(predict.get("time_compute") or total_time)
         n_sentences = sum(
             len(item.get("texts_n1", []))
             for item in predict.get("datas", [])
         )
         if n_sentences == 0:
             continue
-        sec_per_sentence = total_time / n_sentences
+        sec_per_sentence = compute_time / n_sentences
         ratio = (f1 / sec_per_sentence) if (f1 and sec_per_sentence > 0) else None
         rows.append({
             "model": model,
             "f1": f1,
             "total_time_s": total_time,
+            "compute_time_s": compute_time,
+            "pause_time_s": pause_time,
             "sentences": n_sentences,
             "sec_per_sentence": sec_per_sentence,
             "f1_per_second": ratio,
@@ -0,0 +1,107 @@
+"""Resumo e conversao dos traces gravados com GEN_TRACE (`utils/logs/tracing.py`).
+
+Uso:
+    python tools/trace_report.py runs/traces/
+    python tools/trace_report.py runs/traces/trace_1234.jsonl --chrome trace.json --top 15
+
+Le um ou mais arquivos JSONL (ou diretorios com `*.jsonl`) e imprime, por nome
+de span, chamadas, tempo total, tempo proprio (sem os spans filhos da mesma
+thread), media e maximo. O tempo proprio separa o que e do modelo
+(`invoke_with_timeout`) do parse, do alinhamento (`align_lists`) e do
+checkpoint; em `compute_all_scores` ele e a carga dos modelos de embedding.
+
+Com `--chrome`, grava os eventos num JSON `{"traceEvents": [...]}` que o
+Perfetto (ui.perfetto.dev) e o chrome://tracing abrem.
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+def load_events(paths: List[str]) -> List[Dict[str, Any]]:
+    files: List[Path] = []
+    for raw in paths:
+        path = Path(raw)
+        files.extend(sorted(path.glob("*.jsonl")) if path.is_dir() else [path])
+    events: List[Dict[str, Any]] = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # Linha incompleta de um processo interrompido.
+                    continue
+    return events
+
+
+def summarize(events: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Por nome: count, total_s, self_s, max_s (spans aninhados por thread)."""
+    by_thread: Dict[tuple, List[Dict[str, Any]]] = {}
+    for event in events:
+        if event.get("ph") == "X":
+            by_thread.setdefault((event.get("pid"), event.get("tid")), []).append(event)
+
+    summary: Dict[str, Dict[str, float]] = {}
+    for spans in by_thread.values():
+        # Pai antes do filho: inicio crescente, duracao decrescente.
+        spans.sort(key=lambda event: (event["ts"], -event["dur"]))
+        stack: List[Dict[str, Any]] = []
+        own: Dict[int, float] = {}
+        for event in spans:
+            while stack and stack[-1]["ts"] + stack[-1]["dur"] <= event["ts"]:
+                stack.pop()
+            if stack:
+                own[id(stack[-1])] -= event["dur"]
+            own[id(event)] = event["dur"]
+            stack.append(event)
+        for event in spans:
+            stats = summary.setdefault(
+                event["name"], {"count": 0, "total_s": 0.0, "self_s": 0.0, "max_s": 0.0}
+            )
+            stats["count"] += 1
+            stats["total_s"] += event["dur"] / 1e6
+            stats["self_s"] += max(0.0, own[id(event)]) / 1e6
+            stats["max_s"] = max(stats["max_s"], event["dur"] / 1e6)
+    return summary
+
+
+def print_summary(summary: Dict[str, Dict[str, float]], top: int) -> None:
+    rows = sorted(summary.items(), key=lambda item: item[1]["self_s"], reverse=True)
+    total_self = sum(stats["self_s"] for stats in summary.values()) or 1.0
+    print(
+        f"{'span':<28} {'chamadas':>9} {'total s':>10} {'proprio s':>10} "
+        f"{'%':>6} {'media ms':>10} {'max ms':>10}"
+    )
+    for name, stats in rows[:top] if top > 0 else rows:
+        print(
+            f"{name:<28} {int(stats['count']):>9} {stats['total_s']:>10.3f} "
+            f"{stats['self_s']:>10.3f} {100 * stats['self_s'] / total_self:>6.1f} "
+            f"{1000 * stats['total_s'] / stats['count']:>10.2f} "
+            f"{1000 * stats['max_s']:>10.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resumo/conversao de traces GEN_TRACE.")
+    parser.add_argument("paths", nargs="+", help="Arquivos .jsonl ou diretorios.")
+    parser.add_argument("--chrome", default=None, help="Grava o trace no formato do Chrome.")
+    parser.add_argument("--top", type=int, default=0, help="Linhas do resumo (0 = todas).")
+    args = parser.parse_args()
+
+    events = load_events(args.paths)
+    if not events:
+        print("Nenhum evento encontrado.")
+        return
+    print_summary(summarize(events), args.top)
+    if args.chrome:
+        Path(args.chrome).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.chrome, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        print(f"Trace do Chrome salvo em {args.chrome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Motor assincrono para disparar chamadas ao Ollama com concorrencia limitada.
+
+Um unico event loop roda em thread dedicada; cada host Ollama recebe um
+`asyncio.Semaphore` proprio, de modo que threads diferentes (ex: os workers
+de `text_scheduler`) compartilham o mesmo limite por host. As chamadas sao
+bloqueantes (langchain/ollama), entao cada job roda via `asyncio.to_thread`.
+
+O limite vem de GEN_MAX_INFLIGHT; sem ele, usa OLLAMA_NUM_PARALLEL (que o
+`main.py` fixa em 1 por padrao). Com limite 1 os jobs rodam em sequencia, na
+thread chamadora, exatamente como antes.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def max_inflight() -> int:
+    """Maximo de chamadas simultaneas por host (minimo 1)."""
+    default = _env_int("OLLAMA_NUM_PARALLEL", 1)
+    return max(1, _env_int("GEN_MAX_INFLIGHT", default))
+
+
+def current_host() -> str:
+    return os.environ.get("OLLAMA_HOST", "http://localhost:11434").strip()
+
+
+class _Engine:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(
+                ThreadPoolExecutor(max_workers=64, thread_name_prefix="ollama-call")
+            )
+            thread = threading.Thread(
+                target=loop.run_forever, name="ollama-engine", daemon=True
+            )
+            thread.start()
+            self._loop = loop
+            return loop
+
+    def _semaphore(self, host: str, limit: int) -> asyncio.Semaphore:
+        # Executado sempre dentro do loop do motor (sem corrida entre threads).
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    async def _run_job(self, host: str, limit: int, job: Callable[[], Any]) -> Any:
+        async with self._semaphore(host, limit):
+            return await asyncio.to_thread(job)
+
+    def map(self, jobs: Sequence[Callable[[], T]], host: str, limit: int) -> List[T]:
+        loop = self._ensure_loop()
+        futures = [
+            asyncio.run_coroutine_threadsafe(self._run_job(host, limit, job), loop)
+            for job in jobs
+        ]
+        return [future.result() for future in futures]
+
+
+_ENGINE = _Engine()
+
+
+def run_bounded(
+    jobs: Sequence[Callable[[], T]],
+    host: str | None = None,
+    limit: int | None = None,
+) -> List[T]:
+    """Executa `jobs` com no maximo `limit` simultaneos no host e devolve na ordem original."""
+    limit = limit if limit is not None else max_inflight()
+    if limit <= 1 or len(jobs) <= 1:
+        return [job() for job in jobs]
+    return _ENGINE.map(jobs, host or current_host(), limit)
@@ -0,0 +1,96 @@
+"""Prazo total (GEN_TIMEOUT) da chamada em andamento, compartilhado com a chain.
+
+`invoke_with_timeout` abre um `CallDeadline` por chamada (`call_deadline`). A
+OllamaChain de `llm_chain.py` le o prazo restante para o timeout do httpx da
+requisicao e registra a resposta aberta; ao estourar o prazo, um timer derruba
+o socket dessa resposta (shutdown), o que interrompe a leitura bloqueada na
+thread da chamada, encerra a conexao e libera o slot do Ollama, mesmo com o
+stream parado no meio da resposta.
+"""
+
+import contextvars
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List
+
+import httpx
+
+_CURRENT: contextvars.ContextVar["CallDeadline | None"] = contextvars.ContextVar(
+    "call_deadline", default=None
+)
+
+
+def _shutdown(response: Any) -> None:
+    stream = response.extensions.get("network_stream")
+    sock = stream.get_extra_info("socket") if stream is not None else None
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class CallDeadline:
+    def __init__(self, seconds: float):
+        self.deadline = time.time() + seconds
+        self.expired = False
+        self._lock = threading.Lock()
+        self._responses: List[Any] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.time())
+
+    def timeout(self, base: httpx.Timeout) -> httpx.Timeout:
+        """`base` com cada fase limitada ao prazo restante."""
+        remaining = max(0.001, self.remaining())
+
+        def _cap(value: float | None) -> float:
+            return remaining if value is None else min(value, remaining)
+
+        return httpx.Timeout(
+            connect=_cap(base.connect),
+            read=_cap(base.read),
+            write=_cap(base.write),
+            pool=_cap(base.pool),
+        )
+
+    def attach(self, response: Any) -> None:
+        with self._lock:
+            if not self.expired:
+                self._responses.append(response)
+                return
+        _shutdown(response)
+
+    def detach(self, response: Any) -> None:
+        with self._lock:
+            if response in self._responses:
+                self._responses.remove(response)
+
+    def expire(self) -> None:
+        with self._lock:
+            self.expired = True
+            responses, self._responses = self._responses, []
+        for response in responses:
+            _shutdown(response)
+
+
+def current_deadline() -> CallDeadline | None:
+    return _CURRENT.get()
+
+
+@contextmanager
+def call_deadline(seconds: float) -> Iterator[CallDeadline]:
+    """Prazo de `seconds` para as requisicoes feitas no bloco (nesta thread)."""
+    deadline = CallDeadline(seconds)
+    timer = threading.Timer(seconds, deadline.expire)
+    timer.daemon = True
+    token = _CURRENT.set(deadline)
+    timer.start()
+    try:
+        yield deadline
+    finally:
+        timer.cancel()
+        _CURRENT.reset(token)
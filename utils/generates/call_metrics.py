@@ -0,0 +1,307 @@
+"""Tempos e contagens de tokens de cada chamada ao Ollama.
+
+No fim de cada resposta o Ollama devolve `prompt_eval_count`,
+`prompt_eval_duration`, `eval_count`, `eval_duration`, `load_duration` e
+`total_duration` (ns). A `OllamaChain` de `llm_chain.py` recolhe esses campos
+da resposta final; com o backend langchain, um callback no `OllamaLLM`.
+
+Cada chamada vira uma linha em `<saida>.calls.jsonl` com os rotulos do item
+(`text`, `sentence`, `operator`, `attempt`, definidos com `call_labels` nos
+geradores), host e modelo. Chamadas encerradas antes do fim (parada antecipada
+do streaming, timeout) entram como `cancelled` e erros como `error`, sem tempos.
+Respostas do cache do LLM e itens deduplicados nao chamam o Ollama e nao
+aparecem. Na retomada o arquivo continua; sem retomada, e recriado.
+
+Do lado do cliente cada linha tambem traz `first_token_s` (carga + prompt),
+`elapsed_s` e `chunks` (~tokens), que existem mesmo nas chamadas canceladas:
+com GEN_STREAM=1 a maioria das chamadas termina antes dos tempos do Ollama.
+
+O `meta.ollama` agrega por modelo: tokens/s do prompt e da geracao e a parcela
+do `total_duration` gasta em carga, prompt e geracao; pelo cliente, o tempo
+medio ate o primeiro token e os chunks/s depois dele. Um modelo lento na
+ingestao do prompt tem `prompt_share` (e `first_token_s_mean`) alto; um lento
+na decodificacao, `eval_tokens_per_s` (e `stream_tokens_per_s`) baixo.
+
+Com GEN_METRICS_PORT/GEN_METRICS_FILE, cada chamada tambem alimenta os
+contadores e histogramas de `utils/logs/metrics_exporter.py` (chamadas,
+latencia, tokens/s e chamadas em andamento por host).
+
+Variaveis:
+    GEN_CALL_METRICS=0   desliga (default ligado).
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import MappingProxyType
+from typing import IO, Any, Dict, Iterator, List, Mapping
+
+from utils.logs import metrics_exporter
+
+# Default imutavel: compartilhado por todo contexto que nunca chamou call_labels.
+_LABELS: contextvars.ContextVar[Mapping[str, Any]] = contextvars.ContextVar(
+    "call_labels", default=MappingProxyType({})
+)
+_DURATIONS = (
+    ("load_duration", "load_s"),
+    ("prompt_eval_duration", "prompt_s"),
+    ("eval_duration", "eval_s"),
+    ("total_duration", "total_s"),
+)
+_HANDLER_CLASS: Any = None
+
+
+def call_metrics_enabled() -> bool:
+    """Default ligado; setar GEN_CALL_METRICS=0 desativa."""
+    raw = os.environ.get("GEN_CALL_METRICS", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+@contextmanager
+def call_labels(**labels: Any) -> Iterator[None]:
+    """Rotulos das chamadas feitas neste bloco (somados aos do bloco externo).
+
+    Threads novas comecam sem rotulos: defina-os dentro do job que roda no pool.
+    """
+    token = _LABELS.set({**_LABELS.get(), **labels})
+    try:
+        yield
+    finally:
+        _LABELS.reset(token)
+
+
+def _handler_class() -> Any:
+    global _HANDLER_CLASS
+    if _HANDLER_CLASS is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class _Handler(BaseCallbackHandler):
+            def __init__(self, metrics: "CallMetrics", host: str, model: str):
+                self.metrics = metrics
+                self.host = host
+                self.model = model
+                self._clocks: Dict[Any, CallClock] = {}
+
+            def on_llm_start(self, serialized: Any, prompts: Any, **kwargs: Any) -> None:
+                self._clocks[kwargs.get("run_id")] = self.metrics.start(self.host)
+
+            def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+                clock = self._clocks.get(kwargs.get("run_id"))
+                if clock is not None:
+                    clock.chunk()
+
+            def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+                clock = self._clocks.pop(kwargs.get("run_id"), None)
+                self.metrics.record(
+                    self.host, self.model, generation_info(response), clock=clock
+                )
+
+            def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+                clock = self._clocks.pop(kwargs.get("run_id"), None)
+                info = generation_info(kwargs.get("response"))
+                if info.get("done"):
+                    # Stream fechado depois da resposta final: chamada completa.
+                    self.metrics.record(self.host, self.model, info, clock=clock)
+                    return
+                # Fechar o stream (parada antecipada, timeout) chega como GeneratorExit.
+                status = "cancelled" if isinstance(error, GeneratorExit) else "error"
+                self.metrics.record(self.host, self.model, None, status, error, clock)
+
+        _HANDLER_CLASS = _Handler
+    return _HANDLER_CLASS
+
+
+class CallClock:
+    """Tempos de uma chamada vistos pelo cliente."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.first: float | None = None
+        self.chunks = 0
+
+    def chunk(self) -> None:
+        if self.first is None:
+            self.first = time.time()
+        self.chunks += 1
+
+
+def generation_info(response: Any) -> Dict[str, Any]:
+    """Campos da resposta final do Ollama num LLMResult do langchain."""
+    info: Dict[str, Any] = {}
+    for generations in getattr(response, "generations", None) or []:
+        for generation in generations:
+            info.update(generation.generation_info or {})
+    return info
+
+
+def _ratio(part: float, whole: float, digits: int = 3) -> float | None:
+    return round(part / whole, digits) if whole else None
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "cancelled": 0,
+        "errors": 0,
+        "prompt_tokens": 0,
+        "eval_tokens": 0,
+        "load_s": 0.0,
+        "prompt_s": 0.0,
+        "eval_s": 0.0,
+        "total_s": 0.0,
+        "first_token_s": 0.0,
+        "stream_s": 0.0,
+        "first_tokens": 0,
+        "stream_chunks": 0,
+    }
+
+
+class CallMetrics:
+    """Compartilhado pelas chains de um gerador (todos os hosts e threads)."""
+
+    def __init__(self, output_path: str | Path, resume: bool = False, level: str = ""):
+        self.level = level
+        self.path = Path(f"{output_path}.calls.jsonl")
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, Any]] = {}
+        if resume and self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        self._add(json.loads(line))
+                    except (ValueError, TypeError, AttributeError):
+                        continue
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: IO[str] | None = open(
+            self.path, "a" if resume else "w", encoding="utf-8"
+        )
+
+    def callbacks(self, host: str, model: str) -> List[Any]:
+        """Para `OllamaLLM(callbacks=...)`."""
+        return [_handler_class()(self, host, model)]
+
+    def start(self, host: str) -> CallClock:
+        """Relogio de uma chamada que comeca; `record` com ele a encerra."""
+        metrics_exporter.add("llm_inflight", 1, level=self.level, host=host)
+        return CallClock()
+
+    def record(
+        self,
+        host: str,
+        model: str,
+        info: Dict[str, Any] | None,
+        status: str = "ok",
+        error: BaseException | None = None,
+        clock: CallClock | None = None,
+    ) -> None:
+        entry: Dict[str, Any] = {
+            "ts": round(time.time(), 3),
+            **_LABELS.get(),
+            "host": host,
+            "model": (info or {}).get("model") or model,
+            "status": status,
+        }
+        if info:
+            entry["done_reason"] = info.get("done_reason")
+            entry["prompt_eval_count"] = info.get("prompt_eval_count") or 0
+            entry["eval_count"] = info.get("eval_count") or 0
+            for source, target in _DURATIONS:
+                entry[target] = round((info.get(source) or 0) / 1e9, 4)
+        if clock is not None:
+            entry["elapsed_s"] = round(time.time() - clock.start, 4)
+            entry["chunks"] = clock.chunks
+            if clock.first is not None:
+                entry["first_token_s"] = round(clock.first - clock.start, 4)
+        if error is not None and status == "error":
+            entry["error"] = str(error)[:200]
+        self._export(entry, clock is not None)
+        with self._lock:
+            self._add(entry)
+            if self._file is not None:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def _export(self, entry: Dict[str, Any], started: bool) -> None:
+        labels = {"level": self.level, "model": entry["model"]}
+        if started:
+            metrics_exporter.add("llm_inflight", -1, level=self.level, host=entry["host"])
+        metrics_exporter.count("llm_calls", host=entry["host"], status=entry["status"], **labels)
+        if entry.get("elapsed_s") is not None:
+            metrics_exporter.observe("llm_call_seconds", entry["elapsed_s"], **labels)
+        if entry.get("first_token_s") is not None:
+            metrics_exporter.observe("llm_first_token_seconds", entry["first_token_s"], **labels)
+        if entry.get("prompt_eval_count"):
+            metrics_exporter.count("llm_prompt_tokens", entry["prompt_eval_count"], **labels)
+        if entry.get("eval_count"):
+            metrics_exporter.count("llm_eval_tokens", entry["eval_count"], **labels)
+            if entry.get("eval_s"):
+                rate = entry["eval_count"] / entry["eval_s"]
+                metrics_exporter.observe("llm_eval_tokens_per_second", rate, **labels)
+
+    def _add(self, entry: Dict[str, Any]) -> None:
+        totals = self._totals.setdefault(str(entry.get("model")), _empty_totals())
+        totals["calls"] += 1
+        if entry.get("status") == "cancelled":
+            totals["cancelled"] += 1
+        elif entry.get("status") == "error":
+            totals["errors"] += 1
+        totals["prompt_tokens"] += int(entry.get("prompt_eval_count") or 0)
+        totals["eval_tokens"] += int(entry.get("eval_count") or 0)
+        for _source, target in _DURATIONS:
+            totals[target] += float(entry.get(target) or 0.0)
+        if entry.get("first_token_s") is not None:
+            totals["first_tokens"] += 1
+            totals["first_token_s"] += float(entry["first_token_s"])
+            totals["stream_s"] += float(entry.get("elapsed_s") or 0.0) - float(
+                entry["first_token_s"]
+            )
+            totals["stream_chunks"] += max(0, int(entry.get("chunks") or 0) - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            result: Dict[str, Any] = {}
+            for model, totals in self._totals.items():
+                result[model] = {
+                    "calls": totals["calls"],
+                    "cancelled": totals["cancelled"],
+                    "errors": totals["errors"],
+                    "prompt_tokens": totals["prompt_tokens"],
+                    "eval_tokens": totals["eval_tokens"],
+                    **{target: round(totals[target], 3) for _source, target in _DURATIONS},
+                    "prompt_tokens_per_s": _ratio(totals["prompt_tokens"], totals["prompt_s"], 1),
+                    "eval_tokens_per_s": _ratio(totals["eval_tokens"], totals["eval_s"], 1),
+                    "load_share": _ratio(totals["load_s"], totals["total_s"]),
+                    "prompt_share": _ratio(totals["prompt_s"], totals["total_s"]),
+                    "eval_share": _ratio(totals["eval_s"], totals["total_s"]),
+                    "first_token_s_mean": _ratio(
+                        totals["first_token_s"], totals["first_tokens"]
+                    ),
+                    "stream_tokens_per_s": _ratio(
+                        totals["stream_chunks"], totals["stream_s"], 1
+                    ),
+                }
+            return result
+
+    def describe(self) -> List[str]:
+        lines = []
+        for model, stats in self.snapshot().items():
+            lines.append(
+                f"Ollama {model}: {stats['calls']} chamadas "
+                f"({stats['cancelled']} canceladas, {stats['errors']} com erro); "
+                f"prompt {stats['prompt_tokens_per_s']} tok/s, "
+                f"geracao {stats['eval_tokens_per_s']} tok/s; "
+                f"carga {stats['load_share']}, prompt {stats['prompt_share']}, "
+                f"geracao {stats['eval_share']} do tempo; cliente: primeiro token "
+                f"{stats['first_token_s_mean']}s, {stats['stream_tokens_per_s']} chunks/s."
+            )
+        return lines
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
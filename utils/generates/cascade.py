@@ -0,0 +1,147 @@
+"""Modo cascata: cada chamada N2/N3 vai primeiro para um modelo barato.
+
+A resposta do modelo barato e aceita quando passa nas checagens estruturais de
+`utils/n2/output_accepted.py` / `utils/n3/output_accepted.py`; so as que
+falham sao refeitas (escaladas) com o modelo do predict. O `meta.cascade`
+tem os contadores: `cheap` (aceitas do modelo barato), `escalated` (rejeitadas
+e refeitas) e `bypassed` (direto para o modelo principal porque a cascata foi
+desligada no host). Cada chamada da cascata leva o rotulo `cascade` (`cheap`,
+`escalated` ou `bypassed`) em `<saida>.calls.jsonl`, e as escaladas vao para o
+log com a chave `texto:sentenca[:operador]`.
+
+Cada texto do predict traz em `cascade` o nivel que respondeu cada item
+(`{"texto:sentenca[:operador]": "cheap" | "escalated" | "bypassed"}`), mesmo
+com GEN_CALL_METRICS=0. Fica na entrada do texto e nao no meta porque o meta
+vai inteiro em cada linha do journal. Itens deduplicados herdam o nivel da
+posicao que executou; chamadas retomadas do journal ficam de fora.
+
+Se o modelo barato nao responder (modelo ausente no host, circuito aberto),
+a cascata e desligada naquele host e tudo segue direto para o modelo principal;
+com GEN_CIRCUIT_COOLDOWN, ela volta a ser tentada quando o circuito do modelo
+barato fica meio-aberto.
+
+Variaveis:
+    GEN_CASCADE=<modelo>   nome (config/models.py) ou id do modelo barato, ex: qwen.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple, TypeVar
+
+from config.models import MODELS
+from utils.generates.call_metrics import call_labels
+from utils.generates.retry_policy import HostUnavailable
+
+T = TypeVar("T")
+
+
+def cascade_model(main_model_id: str) -> str | None:
+    """Id do modelo barato, ou None se a cascata estiver desligada."""
+    raw = os.environ.get("GEN_CASCADE", "").strip()
+    if not raw:
+        return None
+    cheap = MODELS.get(raw, raw)
+    return None if cheap == main_model_id else cheap
+
+
+class Cascade:
+    def __init__(
+        self,
+        model_id: str,
+        initial: Dict[str, Any] | None = None,
+        log: Callable[[str], None] | None = None,
+    ):
+        self.model_id = model_id
+        self.log = log or (lambda _message: None)
+        self._lock = threading.Lock()
+        self._disabled: Dict[str, str] = {}
+        self._retry_at: Dict[str, float] = {}
+        # Nivel que respondeu cada item dos textos em andamento.
+        self._tiers: Dict[str, str] = {}
+        self.cheap = 0
+        self.escalated = 0
+        self.bypassed = 0
+        if initial and initial.get("model") == model_id:
+            self.cheap = int(initial.get("cheap", 0))
+            self.escalated = int(initial.get("escalated", 0))
+            self.bypassed = int(initial.get("bypassed", 0))
+
+    def run(
+        self,
+        host: str,
+        key: str,
+        cheap_job: Callable[[], T],
+        main_job: Callable[[], T],
+        accepted: Callable[[T], bool],
+    ) -> Tuple[str, T]:
+        """Roda `cheap_job`; escala para `main_job` se a resposta nao for aceita.
+
+        Devolve (nivel, resultado); `record` guarda o nivel na posicao do item.
+        """
+        tier = "bypassed"
+        if self._enabled(host):
+            try:
+                with call_labels(cascade="cheap"):
+                    result = cheap_job()
+            except HostUnavailable as exc:
+                with self._lock:
+                    self._disabled[host] = str(exc)
+                    if exc.retry_after is not None:
+                        self._retry_at[host] = time.time() + exc.retry_after
+                self.log(f"Cascata desligada em {host}: {exc}")
+            else:
+                if accepted(result):
+                    with self._lock:
+                        self.cheap += 1
+                    return "cheap", result
+                tier = "escalated"
+                self.log(f"Cascata: {key} escalado para o modelo principal.")
+        with call_labels(cascade=tier):
+            result = main_job()
+        with self._lock:
+            if tier == "escalated":
+                self.escalated += 1
+            else:
+                self.bypassed += 1
+        return tier, result
+
+    def record(self, key: str, job: Callable[[], Tuple[str, T]]) -> T:
+        """Roda `job` (um `run`, talvez deduplicado) e guarda o nivel em `key`."""
+        tier, result = job()
+        with self._lock:
+            self._tiers[key] = tier
+        return result
+
+    def tiers(self, count: int) -> Dict[str, str]:
+        """Retira os niveis registrados para os itens do texto `count`."""
+        prefix = f"{count}:"
+        with self._lock:
+            keys = sorted(
+                (key for key in self._tiers if key.startswith(prefix)),
+                key=lambda key: [
+                    int(part) if part.isdigit() else part for part in key.split(":")
+                ],
+            )
+            return {key: self._tiers.pop(key) for key in keys}
+
+    def _enabled(self, host: str) -> bool:
+        with self._lock:
+            if host not in self._disabled:
+                return True
+            if time.time() < self._retry_at.get(host, float("inf")):
+                return False
+            del self._disabled[host]
+            del self._retry_at[host]
+        self.log(f"Cascata religada em {host}.")
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model_id,
+                "cheap": self.cheap,
+                "escalated": self.escalated,
+                "bypassed": self.bypassed,
+                "disabled_hosts": dict(self._disabled),
+            }
@@ -0,0 +1,25 @@
+import os
+
+import httpx
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return default
+
+
+def client_timeout() -> httpx.Timeout:
+    """Timeouts do cliente HTTP do Ollama (connect e primeiro token).
+
+    `read` limita o intervalo entre dois chunks do stream; o maior deles e a
+    espera pelo primeiro token (carga do modelo + prompt eval), por isso usa
+    GEN_FIRST_TOKEN_TIMEOUT. O prazo total e aplicado por `invoke_with_timeout`.
+    """
+    connect = _env_float("GEN_CONNECT_TIMEOUT", 10.0)
+    first_token = _env_float("GEN_FIRST_TOKEN_TIMEOUT", 300.0)
+    return httpx.Timeout(connect=connect, read=first_token, write=connect, pool=None)
@@ -0,0 +1,122 @@
+"""Deduplicacao global das chamadas ao LLM de uma execucao.
+
+Antes da primeira chamada, o gerador monta o plano: a chave (template,
+variaveis renderizadas) de cada item de trabalho dos textos pendentes. Itens
+com a mesma chave rodam uma unica vez e o resultado e copiado para todas as
+posicoes; o total planejado, os unicos e os duplicados vao para o log e para o
+`meta.dedup` ja no inicio. Chamadas ja registradas no journal de retomada nao
+voltam ao modelo e ficam fora do plano; do contrario o resultado de uma chave
+ficaria retido esperando posicoes que nunca chegam.
+
+A chave inclui todas as variaveis que o prompt renderiza (inclusive `{text}`,
+a norma inteira), entao so se juntam chamadas com prompt identico e a saida
+continua a mesma da execucao sem deduplicacao.
+
+Com entrada em fluxo (run_pipeline.py) nao ha plano previo: a deduplicacao
+acontece durante a execucao e o meta so conta os reaproveitamentos.
+
+Variaveis:
+    GEN_DEDUP=0    desliga (default ligado).
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+def dedup_enabled() -> bool:
+    """Default ligado; setar GEN_DEDUP=0 desativa."""
+    raw = os.environ.get("GEN_DEDUP", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def work_key(template: str, variables: Dict[str, Any]) -> str:
+    """Chave de um item de trabalho: nome do template + variaveis renderizadas."""
+    material = json.dumps(
+        {"template": template, "variables": variables},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class Dedup:
+    """Single-flight por chave: a primeira posicao executa, as demais esperam e
+    recebem uma copia do resultado. Com plano, o resultado so fica em memoria
+    enquanto houver posicoes pendentes da mesma chave."""
+
+    def __init__(self, planned: Iterable[str] | None = None):
+        self._lock = threading.Lock()
+        self._remaining: Counter[str] | None = (
+            Counter(planned) if planned is not None else None
+        )
+        self._results: Dict[str, Any] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self.reused = 0
+        self.plan: Dict[str, int] | None = None
+        if self._remaining is not None:
+            total = sum(self._remaining.values())
+            unique = len(self._remaining)
+            self.plan = {
+                "planned": total,
+                "unique": unique,
+                "duplicates": total - unique,
+            }
+
+    def run(self, key: str, job: Callable[[], T]) -> T:
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self.reused += 1
+                    result = copy.deepcopy(self._results[key])
+                    self._release(key)
+                    return result
+                event = self._inflight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._inflight[key] = event
+                    break
+            # Outra posicao esta executando a mesma chave; se ela falhar
+            # (ex: host indisponivel), esta posicao assume a execucao.
+            event.wait()
+
+        try:
+            result = job()
+        except BaseException:
+            with self._lock:
+                self._inflight.pop(key).set()
+            raise
+        with self._lock:
+            if self._remaining is None or self._remaining.get(key, 2) > 1:
+                self._results[key] = copy.deepcopy(result)
+            self._release(key)
+            self._inflight.pop(key).set()
+        return result
+
+    def _release(self, key: str) -> None:
+        if self._remaining is None or key not in self._remaining:
+            return
+        self._remaining[key] -= 1
+        if self._remaining[key] <= 0:
+            del self._remaining[key]
+            self._results.pop(key, None)
+
+    def describe(self) -> str:
+        if self.plan is None:
+            return "Deduplicacao: entrada em fluxo, sem plano previo."
+        planned, duplicates = self.plan["planned"], self.plan["duplicates"]
+        ratio = 100.0 * duplicates / planned if planned else 0.0
+        return (
+            f"Deduplicacao: {planned} chamadas planejadas, "
+            f"{self.plan['unique']} unicas, {duplicates} duplicadas ({ratio:.1f}%)."
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**(self.plan or {}), "reused": self.reused}
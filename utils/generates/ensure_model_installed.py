@@ -3,8 +3,8 @@ import os
 import ollama
 
 
-def ensure_model_installed(model: str, model_id: str) -> bool:
-    host = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+def ensure_model_installed(model: str, model_id: str, host: str | None = None) -> bool:
+    host = host or os.environ.get("OLLAMA_HOST", "http://localhost:11434")
     try:
         client = ollama.Client(host=host)
         listing = client.list()
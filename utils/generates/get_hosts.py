@@ -0,0 +1,28 @@
+import os
+from typing import List
+
+import ollama
+
+
+def get_hosts() -> List[str]:
+    """Hosts Ollama configurados: OLLAMA_HOSTS (separados por virgula) ou OLLAMA_HOST."""
+    raw = os.environ.get("OLLAMA_HOSTS", "").strip()
+    if raw:
+        return [h.strip() for h in raw.split(",") if h.strip()]
+    single = os.environ.get("OLLAMA_HOST", "http://localhost:11434").strip()
+    return [single]
+
+
+def hosts_with_model(model_id: str, hosts: List[str]) -> List[str]:
+    """Filtra os hosts que ja tem `model_id` instalado (hosts inacessiveis saem)."""
+    found: List[str] = []
+    for host in hosts:
+        try:
+            listing = ollama.Client(host=host).list()
+        except Exception as exc:
+            print(f"Erro ao consultar Ollama em {host}: {exc}")
+            continue
+        installed = {m.get("model") or m.get("name") for m in listing.get("models", [])}
+        if model_id in installed:
+            found.append(host)
+    return found
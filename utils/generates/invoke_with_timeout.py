@@ -1,7 +1,12 @@
 import os
 import threading
 import time
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, Iterator
+
+import httpx
+
+from utils.generates.call_deadline import call_deadline
+from utils.logs.tracing import traced
 
 
 def _env_float(name: str, default: float) -> float:
@@ -14,6 +19,7 @@ def _env_float(name: str, default: float) -> float:
         return default
 
 
+@traced("invoke_with_timeout")
 def invoke_with_timeout(
     chain: Any,
     payload: Dict[str, str],
@@ -21,6 +27,15 @@ def invoke_with_timeout(
     heartbeat_interval: float | None = None,
     log: Callable[[str], None] | None = None,
 ) -> tuple[str | None, bool]:
+    """Consome `chain.stream(payload)` na propria thread com prazo total.
+
+    Connect e primeiro token sao limitados no cliente HTTP (`client_timeout`),
+    e cada requisicao da OllamaChain usa no maximo o prazo restante. O prazo
+    total vale mesmo com o stream parado: um timer (`call_deadline`) derruba a
+    conexao ao estourar, o que interrompe a leitura, libera o slot do Ollama e
+    nao deixa thread orfa. Tambem e conferido a cada chunk (backend langchain).
+    Retorna (resposta, timed_out).
+    """
     timeout = timeout if timeout is not None else _env_float("GEN_TIMEOUT", 600.0)
     heartbeat_interval = (
         heartbeat_interval
@@ -28,29 +43,60 @@ def invoke_with_timeout(
         else _env_float("GEN_HEARTBEAT", 30.0)
     )
 
-    result_holder: Dict[str, str] = {}
-    error_holder: Dict[str, Exception] = {}
+    start: float = time.time()
+    deadline: float = start + timeout
+    parts: list[str] = []
+    chunks = 0
+    done = threading.Event()
+
+    def _heartbeat(emit: Callable[[str], None]) -> None:
+        while not done.wait(heartbeat_interval):
+            elapsed = int(time.time() - start)
+            if chunks == 0:
+                emit(f"Ainda aguardando o primeiro token do modelo ({elapsed}s)...")
+            else:
+                emit(f"Ainda recebendo resposta do modelo ({elapsed}s, {chunks} chunks)...")
+
+    heartbeat: threading.Thread | None = None
+    if log is not None and heartbeat_interval > 0:
+        heartbeat = threading.Thread(target=_heartbeat, args=(log,), daemon=True)
+        heartbeat.start()
 
-    def _run() -> None:
+    iterator: Iterator[str] | None = None
+    reason: str | None = None
+    with call_deadline(timeout) as call:
         try:
-            result_holder["result"] = chain.invoke(payload)
+            stream = getattr(chain, "stream", None)
+            iterator = stream(payload) if stream is not None else iter([chain.invoke(payload)])
+            for chunk in iterator:
+                chunks += 1
+                parts.append(chunk)
+                if time.time() > deadline:
+                    call.expire()
+                    break
         except Exception as exc:
-            error_holder["error"] = exc
-
-    thread: threading.Thread = threading.Thread(target=_run, daemon=True)
-    thread.start()
-    start: float = time.time()
+            # Com o prazo estourado, o erro e a conexao derrubada pelo timer.
+            if not call.expired and not isinstance(exc, httpx.TimeoutException):
+                raise
+            if not call.expired and time.time() < deadline:
+                phase = "conexao" if isinstance(exc, httpx.ConnectTimeout) else (
+                    "primeiro token" if chunks == 0 else "proximo token"
+                )
+                reason = f"Timeout aguardando {phase} ({int(time.time() - start)}s): {exc!r}"
+            else:
+                reason = f"Prazo total de {timeout:.0f}s excedido; requisicao cancelada."
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            done.set()
+            if heartbeat is not None:
+                heartbeat.join()
+        if reason is None and call.expired:
+            reason = f"Prazo total de {timeout:.0f}s excedido; requisicao cancelada."
 
-    while thread.is_alive():
-        elapsed = time.time() - start
-        remaining = timeout - elapsed
-        if remaining <= 0:
-            return None, True
-        wait = min(heartbeat_interval, remaining) if heartbeat_interval > 0 else remaining
-        thread.join(timeout=wait)
-        if thread.is_alive() and log is not None and heartbeat_interval > 0:
-            log(f"Ainda aguardando resposta do modelo ({int(time.time() - start)}s)...")
-
-    if "error" in error_holder:
-        raise error_holder["error"]
-    return result_holder.get("result"), False
+    if reason is not None:
+        if log is not None:
+            log(reason)
+        return None, True
+    return "".join(parts), False
@@ -0,0 +1,246 @@
+"""Cache persistente (SQLite) das respostas do LLM, compartilhado pelos geradores.
+
+A chave combina model_id, SHA-256 do prompt renderizado, opcoes de amostragem
+(temperature, top_p, repeat_penalty, num_predict, stop) e a seed de `env_seed()`.
+O valor e a resposta crua do modelo. Sem seed (GEN_SEED=none) o cache fica
+desligado, pois a saida deixa de ser reprodutivel. Consultas entram em
+`llm_cache_requests_total` de `utils/logs/metrics_exporter.py` quando ligado.
+
+Variaveis:
+    GEN_CACHE=0                 desliga o cache (default ligado).
+    GEN_CACHE_PATH=<arquivo>    default `.cache/llm_cache.sqlite`.
+    GEN_CACHE_MAX_ENTRIES=<n>   limite de entradas; excedentes saem por LRU (default 100000).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from utils.logs import metrics_exporter
+
+DEFAULT_CACHE_PATH: str = str(Path(".cache") / "llm_cache.sqlite")
+
+CACHE_OPTION_KEYS: Tuple[str, ...] = (
+    "temperature",
+    "top_p",
+    "repeat_penalty",
+    "num_predict",
+    "stop",
+)
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_options(llm_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Extrai dos kwargs do LLM apenas as opcoes que entram na chave."""
+    return {k: llm_kwargs[k] for k in CACHE_OPTION_KEYS if k in llm_kwargs}
+
+
+def cache_key(
+    model_id: str,
+    prompt: str,
+    options: Dict[str, Any],
+    seed: int | None,
+) -> Tuple[str, str]:
+    """Retorna (chave, sha256 do prompt renderizado)."""
+    prompt_sha256 = _sha256(prompt)
+    material = json.dumps(
+        {
+            "model_id": model_id,
+            "prompt_sha256": prompt_sha256,
+            "options": options,
+            "seed": seed,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return _sha256(material), prompt_sha256
+
+
+class LLMCache:
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH, max_entries: int = 100000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " prompt_sha256 TEXT NOT NULL,"
+            " template_sha256 TEXT,"
+            " model_id TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_prompt ON responses(prompt_sha256)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_template ON responses(template_sha256)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_access ON responses(last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(
+        self,
+        key: str,
+        prompt_sha256: str,
+        model_id: str,
+        response: str,
+        template_sha256: str | None = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, prompt_sha256, template_sha256, model_id, response, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, prompt_sha256, template_sha256, model_id, response, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.max_entries <= 0:
+            return
+        (total,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = total - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+            (excess,),
+        )
+        self.evictions += excess
+
+    def invalidate(self, prompt_sha256: str) -> int:
+        """Remove entradas pelo hash do prompt renderizado ou do template (meta.prompt_sha256)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE prompt_sha256 = ? OR template_sha256 = ?",
+                (prompt_sha256, prompt_sha256),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            return cursor.rowcount
+
+    def entries(self) -> int:
+        with self._lock:
+            (total,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            return int(total)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _cache_enabled() -> bool:
+    """Default ligado; setar GEN_CACHE=0 desativa."""
+    raw = os.environ.get("GEN_CACHE", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def open_cache(seed: int | None) -> LLMCache | None:
+    if not _cache_enabled() or seed is None:
+        return None
+    path = os.environ.get("GEN_CACHE_PATH", "").strip() or DEFAULT_CACHE_PATH
+    raw_max = os.environ.get("GEN_CACHE_MAX_ENTRIES", "").strip()
+    try:
+        max_entries = int(raw_max) if raw_max else 100000
+    except ValueError:
+        max_entries = 100000
+    try:
+        return LLMCache(path, max_entries=max_entries)
+    except sqlite3.Error as exc:
+        print(f"Cache LLM indisponivel ({path}): {exc}")
+        return None
+
+
+class CachedChain:
+    """Envolve uma chain (`.stream`/`.invoke`) consultando o cache antes do Ollama."""
+
+    def __init__(
+        self,
+        chain: Any,
+        cache: LLMCache,
+        model_id: str,
+        template: str,
+        options: Dict[str, Any],
+        seed: int | None,
+        group_template: str | None = None,
+    ):
+        # `group_template` agrupa varios templates sob o mesmo hash do meta (ex: N3).
+        self.chain = chain
+        self.cache = cache
+        self.model_id = model_id
+        self.template = template
+        self.template_sha256 = _sha256(group_template or template)
+        self.options = options
+        self.seed = seed
+
+    def stream(self, payload: Dict[str, str]) -> Iterator[str]:
+        prompt = self.template.format(**payload)
+        key, prompt_sha256 = cache_key(self.model_id, prompt, self.options, self.seed)
+        cached = self.cache.get(key)
+        result = "hit" if cached is not None else "miss"
+        metrics_exporter.count("llm_cache_requests", model=self.model_id, result=result)
+        if cached is not None:
+            yield cached
+            return
+        parts: List[str] = []
+        for chunk in self.chain.stream(payload):
+            parts.append(chunk)
+            yield chunk
+        # So grava respostas consumidas ate o fim (stream cancelado nao chega aqui).
+        result = "".join(parts)
+        if result:
+            self.cache.put(
+                key, prompt_sha256, self.model_id, result, self.template_sha256
+            )
+
+    def invoke(self, payload: Dict[str, str]) -> str:
+        return "".join(self.stream(payload))
@@ -1,89 +1,375 @@
-"""Wrapper compatível com chain.invoke() do langchain, porém usando ollama direto.
+"""Camada comum de chamadas ao Ollama dos geradores (N1, N2 e N3).
 
-Quando `USE_OLLAMA_DIRECT=1`, dispensa langchain/langchain_ollama. Caso contrario,
-mantem o caminho atual via langchain_ollama.
+`build_chain(template, llm_kwargs, host, ...)` monta a chain completa de um
+prompt num host, com `.stream(payload)` e `.invoke(payload)`: o backend
+(OllamaChain ou LangchainChain, que tambem tem `.resized(num_ctx, num_predict)`)
+envolvido, de dentro para fora, pelas camadas ligadas no gerador:
+dimensionamento (SizedChain), pausas do host (PauseController), corte do
+streaming (StreamingChain) e cache (CachedChain). Todos os niveis montam as
+chains por aqui, entao a ordem das camadas e a mesma em todos.
+
+Por padrao a chamada vai direto para o `/api/generate` do Ollama:
+- o template e compilado uma vez (`PromptTemplate`, com as chaves literais ja
+  escapadas por `escape_braces` quando o prompt traz JSON);
+- um `httpx.Client` por host, compartilhado por modelos, prompts e threads;
+  cada requisicao usa o timeout do prazo restante da chamada e fica registrada
+  no `CallDeadline` (`call_deadline.py`), que a derruba ao estourar GEN_TIMEOUT;
+- `llm_kwargs` usa os nomes do OllamaLLM (model, temperature, top_p,
+  repeat_penalty, num_predict, num_ctx, stop, seed, keep_alive) e `llm_format`
+  o `format` (JSON schema) do N3.
+
+O prompt enviado leva o prefixo "Human: " que o ChatPromptTemplate do langchain
+produz, entao as respostas (e os predicts ja gerados) nao mudam com o backend.
+Os tempos e tokens de cada chamada vao para o CallMetrics (`metrics`). O
+`on_done` da chain, se definido, recebe a resposta final do Ollama
+(`done_reason`, `eval_count`...) de cada chamada concluida, com qualquer backend.
+
+Variaveis:
+    GEN_LANGCHAIN=1   usa langchain_ollama (ChatPromptTemplate | OllamaLLM) como backend.
 """
 
+import copy
+import json
 import os
 import string
-from typing import Any, Dict
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, Generator, Iterator, List, Tuple
+
+import httpx
+
+from utils.generates.call_deadline import current_deadline
+from utils.generates.call_metrics import CallClock, CallMetrics, generation_info
+from utils.generates.client_timeout import client_timeout
+from utils.generates.llm_cache import CachedChain, LLMCache, cache_options
+from utils.generates.pause_controller import PauseController
+from utils.generates.request_sizing import RequestSizer, SizedChain
+from utils.generates.streaming_chain import StreamingChain, StreamStats
+
+OPTION_KEYS: Tuple[str, ...] = (
+    "temperature",
+    "top_p",
+    "repeat_penalty",
+    "num_predict",
+    "num_ctx",
+    "stop",
+    "seed",
+)
+# Prefixo do ChatPromptValue.to_string() (mensagem unica do usuario).
+_PROMPT_PREFIX = "Human: "
+
+_DEFAULT_PORT = 11434
+
+_CLIENTS: Dict[str, httpx.Client] = {}
+_CLIENTS_LOCK = threading.Lock()
+_DONE_HANDLER_CLASS: Any = None
+
+DoneCallback = Callable[[Dict[str, Any]], None]
+
+
+def langchain_enabled() -> bool:
+    """Default desligado; setar GEN_LANGCHAIN=1 volta ao langchain_ollama."""
+    raw = os.environ.get("GEN_LANGCHAIN", "").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def escape_braces(template: str, variables: List[str]) -> str:
+    """Escapa as chaves do template, menos as das `variables` (ex: JSON de exemplo)."""
+    escaped = template.replace("{", "{{").replace("}", "}}")
+    for var in variables:
+        escaped = escaped.replace("{{" + var + "}}", "{" + var + "}")
+    return escaped
+
 
+class PromptTemplate:
+    """Template no formato do `str.format`, analisado uma unica vez."""
 
-class _OllamaChain:
+    def __init__(self, text: str):
+        self.text = text
+        self._parts: List[Tuple[str, str | None]] = []
+        self._simple = True
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                self._simple = False
+            self._parts.append((literal, field))
+
+    def render(self, payload: Dict[str, str]) -> str:
+        if not self._simple:
+            return self.text.format(**payload)
+        return "".join(
+            literal if field is None else literal + str(payload[field])
+            for literal, field in self._parts
+        )
+
+
+@lru_cache(maxsize=64)
+def compile_template(text: str) -> PromptTemplate:
+    return PromptTemplate(text)
+
+
+def _base_url(host: str) -> str:
+    """URL do host como o `ollama.Client` aceita (`localhost`, `host:porta`, URL)."""
+    url = host.strip().rstrip("/")
+    if "://" not in url:
+        url = f"http://{url}"
+    parsed = httpx.URL(url)
+    return url if parsed.port is not None else f"{url}:{_DEFAULT_PORT}"
+
+
+def ollama_client(host: str) -> httpx.Client:
+    """Cliente do host, criado na primeira chamada e reaproveitado (httpx e thread-safe)."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(host)
+        if client is None:
+            client = _CLIENTS[host] = httpx.Client(
+                base_url=_base_url(host), timeout=client_timeout()
+            )
+        return client
+
+
+def _raise_for_status(response: httpx.Response) -> None:
+    if response.is_success:
+        return
+    from ollama import ResponseError
+
+    response.read()
+    try:
+        error = response.json().get("error") or response.text
+    except ValueError:
+        error = response.text
+    raise ResponseError(error, response.status_code)
+
+
+class OllamaChain:
     def __init__(
         self,
         template: str,
-        model: str,
-        temperature: float = 0.1,
-        top_p: float = 0.9,
-        repeat_penalty: float = 1.1,
-        seed: int | None = None,
-        host: str | None = None,
-        timeout: int = 600,
+        llm_kwargs: Dict[str, Any],
+        host: str,
+        metrics: CallMetrics | None = None,
+        llm_format: Dict[str, Any] | None = None,
     ):
-        import ollama
-
-        self.template = template
-        self.model = model
+        self.prompt = compile_template(template)
+        self.model = llm_kwargs["model"]
+        self.host = host
+        self.metrics = metrics
         self.options: Dict[str, Any] = {
-            "temperature": temperature,
-            "top_p": top_p,
-            "repeat_penalty": repeat_penalty,
+            key: llm_kwargs[key] for key in OPTION_KEYS if llm_kwargs.get(key) is not None
         }
-        if seed is not None:
-            self.options["seed"] = seed
-        self.client = ollama.Client(host=host or os.environ.get("OLLAMA_HOST", "http://localhost:11434"))
-        self.timeout = timeout
+        self.keep_alive = llm_kwargs.get("keep_alive") or None
+        self.format = (llm_format or {}).get("format")
+        self.client = ollama_client(host)
+        self.timeout = client_timeout()
+        self.on_done: DoneCallback | None = None
 
-    def _format(self, payload: Dict[str, str]) -> str:
-        formatter = string.Formatter()
-        # Apenas substitui chaves presentes; valores faltantes viram "".
-        return formatter.vformat(self.template, (), _SafeDict(payload))
+    def resized(self, num_ctx: int, num_predict: int) -> "OllamaChain":
+        """Mesma chain (cliente, template) com outro num_ctx/num_predict."""
+        chain = copy.copy(self)
+        chain.options = {**self.options, "num_ctx": num_ctx, "num_predict": num_predict}
+        return chain
+
+    def _generate(
+        self, payload: Dict[str, str], stream: bool
+    ) -> Generator[Dict[str, Any], None, None]:
+        """Partes da resposta (uma so sem `stream`), dentro do prazo da chamada."""
+        body: Dict[str, Any] = {
+            "model": self.model,
+            "prompt": _PROMPT_PREFIX + self.prompt.render(payload),
+            "stream": stream,
+            "options": self.options,
+        }
+        if self.format is not None:
+            body["format"] = self.format
+        if self.keep_alive is not None:
+            body["keep_alive"] = self.keep_alive
+        deadline = current_deadline()
+        timeout = deadline.timeout(self.timeout) if deadline is not None else self.timeout
+        with self.client.stream("POST", "/api/generate", json=body, timeout=timeout) as response:
+            if deadline is not None:
+                deadline.attach(response)
+            try:
+                _raise_for_status(response)
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    part = json.loads(line)
+                    if part.get("error"):
+                        from ollama import ResponseError
+
+                        raise ResponseError(part["error"])
+                    yield part
+            finally:
+                if deadline is not None:
+                    deadline.detach(response)
+
+    def _start(self) -> CallClock:
+        return self.metrics.start(self.host) if self.metrics else CallClock()
 
     def invoke(self, payload: Dict[str, str]) -> str:
-        prompt = self._format(payload)
-        resp = self.client.generate(
-            model=self.model,
-            prompt=prompt,
-            options=self.options,
+        clock = self._start()
+        try:
+            resp: Dict[str, Any] = {}
+            for part in self._generate(payload, stream=False):
+                resp = part
+        except Exception as exc:
+            self._record(None, "error", exc, clock)
+            raise
+        self._record(resp, clock=clock)
+        if self.on_done is not None:
+            self.on_done(resp)
+        return resp.get("response") or ""
+
+    def stream(self, payload: Dict[str, str]) -> Iterator[str]:
+        clock = self._start()
+        parts: Generator[Dict[str, Any], None, None] | None = None
+        finished = False
+        try:
+            parts = self._generate(payload, stream=True)
+            for part in parts:
+                clock.chunk()
+                if part.get("done"):
+                    finished = True
+                    self._record(part, clock=clock)
+                    if self.on_done is not None:
+                        self.on_done(part)
+                yield part.get("response") or ""
+        except GeneratorExit:
+            if not finished:
+                self._record(None, "cancelled", clock=clock)
+            raise
+        except Exception as exc:
+            if not finished:
+                self._record(None, "error", exc, clock)
+            raise
+        finally:
+            if parts is not None:
+                parts.close()
+        if not finished:
+            self._record(None, "error", RuntimeError("stream sem resposta final"), clock)
+
+    def _record(
+        self,
+        resp: Dict[str, Any] | None,
+        status: str = "ok",
+        error: BaseException | None = None,
+        clock: CallClock | None = None,
+    ) -> None:
+        if self.metrics is None:
+            return
+        self.metrics.record(self.host, self.model, resp, status, error, clock)
+
+
+def _done_handler(on_done: DoneCallback) -> Any:
+    """Callback do langchain que repassa a resposta final para `on_done`."""
+    global _DONE_HANDLER_CLASS
+    if _DONE_HANDLER_CLASS is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class _DoneHandler(BaseCallbackHandler):
+            def __init__(self, on_done: DoneCallback):
+                self.on_done = on_done
+
+            def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+                self.on_done(generation_info(response))
+
+            def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+                # Stream fechado depois da resposta final: chamada completa.
+                info = generation_info(kwargs.get("response"))
+                if info.get("done"):
+                    self.on_done(info)
+
+        _DONE_HANDLER_CLASS = _DoneHandler
+    return _DONE_HANDLER_CLASS(on_done)
+
+
+class LangchainChain:
+    """`ChatPromptTemplate | OllamaLLM` com a mesma interface da OllamaChain."""
+
+    def __init__(
+        self,
+        template: str,
+        llm_kwargs: Dict[str, Any],
+        host: str,
+        metrics: CallMetrics | None = None,
+        llm_format: Dict[str, Any] | None = None,
+    ):
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_ollama import OllamaLLM
+
+        self.llm_format = llm_format or {}
+        self.prompt = ChatPromptTemplate.from_template(template)
+        self.llm = OllamaLLM(
+            **llm_kwargs,
+            base_url=host,
+            client_kwargs={"timeout": client_timeout()},
+            callbacks=metrics.callbacks(host, llm_kwargs["model"]) if metrics else None,
         )
-        return resp.get("response", "") if isinstance(resp, dict) else getattr(resp, "response", "")
+        self.runnable = self._compose()
+        self.on_done: DoneCallback | None = None
 
+    def _compose(self) -> Any:
+        llm = self.llm.bind(**self.llm_format) if self.llm_format else self.llm
+        return self.prompt | llm
 
-class _SafeDict(dict):
-    def __missing__(self, key: str) -> str:
-        return ""
+    def resized(self, num_ctx: int, num_predict: int) -> "LangchainChain":
+        # Copia rasa do OllamaLLM: mesmos clientes HTTP e callbacks.
+        chain = copy.copy(self)
+        chain.llm = self.llm.model_copy(update={"num_ctx": num_ctx, "num_predict": num_predict})
+        chain.runnable = chain._compose()
+        return chain
+
+    def _config(self) -> Dict[str, Any] | None:
+        if self.on_done is None:
+            return None
+        return {"callbacks": [_done_handler(self.on_done)]}
+
+    def stream(self, payload: Dict[str, str]) -> Iterator[str]:
+        return self.runnable.stream(payload, config=self._config())
+
+    def invoke(self, payload: Dict[str, str]) -> str:
+        return self.runnable.invoke(payload, config=self._config())
 
 
 def build_chain(
     template: str,
-    model_id: str,
-    seed: int | None = None,
-):
-    """Retorna objeto com `.invoke(payload)`.
+    llm_kwargs: Dict[str, Any],
+    host: str,
+    *,
+    metrics: CallMetrics | None = None,
+    llm_format: Dict[str, Any] | None = None,
+    sizer: RequestSizer | None = None,
+    pauser: PauseController | None = None,
+    stream_stats: StreamStats | None = None,
+    stream_check: Callable[[str], int | None] | None = None,
+    cache: LLMCache | None = None,
+    group_template: str | None = None,
+    log: Callable[[str], None] | None = None,
+) -> Any:
+    """Chain do `template` no `host` com as camadas passadas (None = desligada).
 
-    Se USE_OLLAMA_DIRECT=1, usa cliente ollama puro; senao, langchain_ollama.
+    Modelo, num_predict e seed vem de `llm_kwargs`: o num_predict e o piso do
+    `sizer` e o teto estimado do streaming; `llm_format` tambem entra na chave
+    do cache. `stream_check` e o detector de fim estrutural da resposta.
     """
-    use_direct = os.environ.get("USE_OLLAMA_DIRECT", "").strip().lower() in {"1", "true", "yes", "on"}
-    if use_direct:
-        return _OllamaChain(
-            template=template,
-            model=model_id,
-            seed=seed,
+    chain_class = LangchainChain if langchain_enabled() else OllamaChain
+    chain: Any = chain_class(template, llm_kwargs, host, metrics, llm_format)
+    model = llm_kwargs["model"]
+    num_predict = llm_kwargs.get("num_predict")
+    options = cache_options(llm_kwargs)
+    if sizer is not None:
+        # O num_ctx acompanha o modelo carregado no host; cada modelo tem o seu.
+        chain = SizedChain(
+            template, chain.resized, sizer, f"{host} [{model}]", num_predict or 0
         )
-
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_ollama import OllamaLLM
-
-    llm_kwargs: Dict[str, Any] = {
-        "model": model_id,
-        "temperature": 0.1,
-        "top_p": 0.9,
-        "repeat_penalty": 1.1,
-        "client_kwargs": {"timeout": 600},
-    }
-    if seed is not None:
-        llm_kwargs["seed"] = seed
-    llm = OllamaLLM(**llm_kwargs)
-    prompt = ChatPromptTemplate.from_template(template)
-    return prompt | llm
+        # num_predict passa a variar por chamada.
+        options["num_predict"] = "auto"
+    if pauser is not None:
+        chain = pauser.wrap(chain)
+    if stream_stats is not None and stream_check is not None:
+        chain = StreamingChain(chain, stream_check, num_predict, log, stream_stats)
+    if cache is not None:
+        chain = CachedChain(
+            chain, cache, model, template, {**options, **(llm_format or {})},
+            llm_kwargs.get("seed"), group_template=group_template,
+        )
+    return chain
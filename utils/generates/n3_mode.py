@@ -0,0 +1,18 @@
+import os
+
+N3_MODES = ("legacy", "combined")
+
+
+def n3_mode(requested: str | None = None) -> str:
+    """Modo do N3: `legacy` (4 chamadas por sentenca) ou `combined` (1 chamada).
+
+    Prioridade: argumento (CLI/menu) > N3_MODE > N3_LEGACY=1 > `legacy`.
+    """
+    for candidate in (requested, os.environ.get("N3_MODE")):
+        value = (candidate or "").strip().lower()
+        if value in N3_MODES:
+            return value
+    legacy = os.environ.get("N3_LEGACY", "").strip().lower()
+    if legacy in {"0", "false", "no", "off"}:
+        return "combined"
+    return "legacy"
@@ -0,0 +1,163 @@
+"""Pausas termicas adaptativas, guiadas pela vazao medida das chamadas ao Ollama.
+
+Cada chamada nao cacheada mede a vazao de decodificacao (chunks/s ~ tokens/s).
+O controlador guarda a mediana movel das ultimas chamadas e a melhor mediana ja
+vista (linha de base, maquina fria). So pausa quando a vazao cai abaixo de
+`linha_de_base / GEN_PAUSE_THRESHOLD`, ou quando a temperatura lida em
+`/sys/class/thermal` passa de GEN_THERMAL_LIMIT. A leitura termica e da
+maquina do cliente, entao so vale quando o host e local (localhost,
+127.0.0.1); hosts remotos pausam apenas pela vazao.
+
+Variaveis:
+    GEN_PAUSE_THRESHOLD=1.25   queda de vazao tolerada antes de pausar.
+    GEN_PAUSE_WINDOW=12        chamadas na janela movel.
+    GEN_PAUSE_MAX=60           teto (s) de cada pausa.
+    GEN_THERMAL_LIMIT=85       temperatura (C) que forca pausa; 0 desliga a leitura.
+    N2_TEMP_PAUSE / N3_TEMP_PAUSE   unidade (s) da pausa; 0 desliga as pausas.
+"""
+
+import glob
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List
+from urllib.parse import urlparse
+
+_THERMAL_GLOB = "/sys/class/thermal/thermal_zone*/temp"
+_MIN_CHUNKS = 8
+_LOCAL_HOSTNAMES = {"localhost", "127.0.0.1", "::1"}
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def thermal_celsius() -> float | None:
+    """Maior temperatura das thermal zones do Linux, ou None se indisponivel."""
+    readings = []
+    for path in glob.glob(_THERMAL_GLOB):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                readings.append(int(file.read().strip()) / 1000.0)
+        except (OSError, ValueError):
+            continue
+    return max(readings) if readings else None
+
+
+def is_local_host(host: str) -> bool:
+    """True se o host Ollama roda nesta maquina (localhost / 127.0.0.1)."""
+    parsed = urlparse(host if "://" in host else f"http://{host}")
+    return (parsed.hostname or "") in _LOCAL_HOSTNAMES
+
+
+def wait_for_thermal(
+    hosts: List[str], max_wait: float, log: Callable[[str], None] | None = None
+) -> float:
+    """Espera a maquina esfriar abaixo de GEN_THERMAL_LIMIT (ate `max_wait`s).
+
+    So le a temperatura se algum dos `hosts` for local.
+    """
+    limit = _env_float("GEN_THERMAL_LIMIT", 85.0)
+    if limit <= 0 or not any(is_local_host(host) for host in hosts):
+        return 0.0
+    temperature = thermal_celsius()
+    if temperature is None or temperature < limit:
+        return 0.0
+    start = time.time()
+    while (
+        temperature is not None
+        and temperature >= limit
+        and time.time() - start < max_wait
+    ):
+        if log is not None:
+            log(f"Temperatura {temperature:.0f}C >= {limit:.0f}C; aguardando.")
+        time.sleep(min(5.0, max_wait))
+        temperature = thermal_celsius()
+    return time.time() - start
+
+
+class PauseController:
+    def __init__(self, unit: float, host: str):
+        self.unit = unit
+        self.host = host
+        self.threshold = max(1.0, _env_float("GEN_PAUSE_THRESHOLD", 1.25))
+        self.max_pause = _env_float("GEN_PAUSE_MAX", 60.0)
+        window = max(3, int(_env_float("GEN_PAUSE_WINDOW", 12)))
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.baseline: float | None = None
+        self.paused = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, chunks: int, seconds: float) -> None:
+        """Registra a vazao de uma chamada (chunks gerados em `seconds`)."""
+        if chunks < _MIN_CHUNKS or seconds <= 0:
+            return
+        with self._lock:
+            self.samples.append(chunks / seconds)
+            if len(self.samples) == self.samples.maxlen:
+                median = statistics.median(self.samples)
+                self.baseline = max(self.baseline or 0.0, median)
+
+    def wrap(self, chain: Any) -> "_TimedChain":
+        return _TimedChain(chain, self)
+
+    def maybe_pause(self, log: Callable[[str], None] | None = None) -> float:
+        """Pausa se a vazao degradou ou a maquina esta quente; retorna segundos pausados."""
+        if self.unit <= 0:
+            return 0.0
+        with self._lock:
+            ratio = 0.0
+            if self.baseline and len(self.samples) == self.samples.maxlen:
+                ratio = self.baseline / statistics.median(self.samples)
+        pause = 0.0
+        if ratio >= self.threshold:
+            pause = min(self.max_pause, self.unit * ratio)
+            if log is not None:
+                log(
+                    f"Vazao {ratio:.2f}x abaixo da linha de base; "
+                    f"pausa termica de {pause:.1f}s."
+                )
+            time.sleep(pause)
+            with self._lock:
+                # Janela nova: as proximas medidas refletem a maquina apos a pausa.
+                self.samples.clear()
+        pause += wait_for_thermal([self.host], self.max_pause, log)
+        with self._lock:
+            self.paused += pause
+        return pause
+
+
+class _TimedChain:
+    """Mede a vazao de decodificacao da chain e informa o controlador."""
+
+    def __init__(self, chain: Any, controller: PauseController):
+        self.chain = chain
+        self.controller = controller
+
+    def stream(self, payload: Dict[str, str]) -> Iterator[str]:
+        first: float | None = None
+        chunks = 0
+        inner = self.chain.stream(payload)
+        try:
+            for chunk in inner:
+                if first is None:
+                    first = time.time()
+                chunks += 1
+                yield chunk
+        finally:
+            close = getattr(inner, "close", None)
+            if close is not None:
+                close()
+            if first is not None:
+                self.controller.observe(chunks - 1, time.time() - first)
+
+    def invoke(self, payload: Dict[str, str]) -> str:
+        return "".join(self.stream(payload))
@@ -0,0 +1,179 @@
+"""Armazenamento do predict com journal append-only (`<saida>.checkpoint.jsonl`).
+
+Durante a execucao, cada texto concluido vira uma linha no journal
+(`{"count", "entry", "time", "meta"}`) com flush + fsync; o JSON indentado do
+predict so e reescrito (compactado) no inicio, no fim e, opcionalmente, a cada
+GEN_COMPACT_EVERY textos. Na retomada, o estado e reconstruido a partir do
+ultimo JSON compactado mais a reexecucao (replay) do journal.
+
+Chamadas individuais (N2 por sentenca, N3 por sentenca e operador) tambem vao
+para o journal (`{"call": [count, sentenca, operador], "result"}`), de modo que
+um texto interrompido retoma na primeira chamada ainda nao concluida.
+
+Variaveis:
+    GEN_COMPACT_EVERY=<n>   compacta o JSON a cada n textos (default 0 = so no fim).
+    GEN_RESUME=0            ignora predict/journal existentes (ver resume.py).
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Tuple, TypeVar
+
+from utils.generates.resume import (
+    checkpoint_path,
+    clear_checkpoint,
+    consume_checkpoint,
+    load_existing_output,
+    resume_enabled,
+)
+from utils.logs.tracing import span, traced
+
+T = TypeVar("T")
+CallKey = Tuple[int, int, str]
+
+
+def _compact_every() -> int:
+    raw = os.environ.get("GEN_COMPACT_EVERY", "").strip()
+    try:
+        return max(0, int(raw)) if raw else 0
+    except ValueError:
+        return 0
+
+
+class PredictStore:
+    def __init__(self, output_path: str | Path):
+        self.output_path = Path(output_path)
+        self.compact_every = _compact_every()
+        self.data: Dict[str, Any] = {}
+        self._journal: IO[str] | None = None
+        self._since_compact = 0
+        # Resultados de chamadas dos textos ainda nao confirmados.
+        self._calls: Dict[CallKey, Any] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Any] | None:
+        """Ultimo estado salvo: JSON compactado + replay do journal (None sem retomada)."""
+        existing = load_existing_output(self.output_path)
+        records = consume_checkpoint(self.output_path)
+        if existing is None:
+            if not records or not resume_enabled():
+                return None
+            existing = {"meta": {}, "counts": 0, "datas": [], "time": 0.0}
+        datas = list(existing.get("datas", []))
+        calls: Dict[CallKey, Any] = {}
+        for line_number, record in enumerate(records, start=1):
+            if "call" in record:
+                count, sentence, operator = record["call"]
+                calls[(int(count), int(sentence), str(operator))] = record.get("result")
+                continue
+            # Linhas antigas guardavam so a entrada; a posicao no arquivo e o count.
+            if "entry" not in record:
+                record = {"count": line_number, "entry": record}
+            count = int(record.get("count", 0))
+            if count != len(datas) + 1:
+                continue
+            datas.append(record["entry"])
+            existing["counts"] = count
+            if "time" in record:
+                existing["time"] = record["time"]
+            if record.get("meta"):
+                existing["meta"] = record["meta"]
+        existing["datas"] = datas
+        self._calls = {key: value for key, value in calls.items() if key[0] > len(datas)}
+        return existing
+
+    def recovered_calls(self) -> int:
+        return len(self._calls)
+
+    def call_result(self, count: int, sentence: int, operator: str = "") -> Any:
+        """Resultado ja registrado para a chamada, ou None."""
+        with self._lock:
+            return self._calls.get((count, sentence, operator))
+
+    @traced("checkpoint.call")
+    def record_call(
+        self, count: int, sentence: int, operator: str, result: Any
+    ) -> None:
+        with self._lock:
+            self._calls[(count, sentence, operator)] = result
+            if self._journal is not None:
+                self._write({"call": [count, sentence, operator], "result": result})
+
+    def resumable(
+        self, count: int, sentence: int, operator: str, job: Callable[[], T]
+    ) -> T:
+        """Executa `job` so se a chamada ainda nao estiver no journal."""
+        cached = self.call_result(count, sentence, operator)
+        if cached is not None:
+            return cached
+        with span("sentence", text=count, sentence=sentence, operator=operator):
+            result = job()
+        self.record_call(count, sentence, operator, result)
+        return result
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        assert self._journal is not None
+        self._journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def begin(self, data: Dict[str, Any]) -> None:
+        """Assume `data` como estado corrente e abre o journal para novas entradas."""
+        self.data = data
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._journal = open(checkpoint_path(self.output_path), "a", encoding="utf-8")
+        if not data.get("datas"):
+            self.compact()
+
+    @traced("checkpoint.commit")
+    def commit(self, count: int, entry: Dict[str, Any]) -> None:
+        """Registra no journal um texto ja incorporado a `data`."""
+        if self._journal is None:
+            raise RuntimeError("PredictStore.begin() nao foi chamado.")
+        record = {
+            "count": count,
+            "entry": entry,
+            "time": self.data.get("time", 0.0),
+            "meta": self.data.get("meta", {}),
+        }
+        with self._lock:
+            self._write(record)
+            for key in [key for key in self._calls if key[0] == count]:
+                del self._calls[key]
+        self._since_compact += 1
+        if self.compact_every and self._since_compact >= self.compact_every:
+            self.compact()
+
+    @traced("checkpoint.compact")
+    def compact(self) -> None:
+        """Reescreve o JSON indentado (tmp + fsync + replace) e zera o journal."""
+        tmp_path = str(self.output_path) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.data, file, ensure_ascii=False, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.output_path)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.truncate(0)
+                self._journal.seek(0)
+                # Chamadas de textos em andamento continuam no journal.
+                for (count, sentence, operator), result in self._calls.items():
+                    self._write({"call": [count, sentence, operator], "result": result})
+            else:
+                clear_checkpoint(self.output_path)
+        self._since_compact = 0
+
+    def close(self) -> None:
+        if self._journal is None:
+            return
+        if self._since_compact:
+            self.compact()
+        self._journal.close()
+        self._journal = None
+        # Interrompido no meio de um texto: mantem as chamadas para a retomada.
+        if not self._calls:
+            clear_checkpoint(self.output_path)
+
@@ -0,0 +1,267 @@
+"""Dimensiona `num_ctx` e `num_predict` de cada chamada pelo tamanho da entrada.
+
+Sem isso o `num_predict` e fixo (N2_NUM_PREDICT/N3_NUM_PREDICT) e o `num_ctx`
+fica no default do modelo: sentencas curtas alocam KV cache de sobra e normas
+longas podem ser truncadas sem aviso.
+
+Com GEN_SIZING=1, cada chamada estima os tokens do prompt renderizado e da
+saida esperada (`utils/nX/expected_output_tokens.py`). A contagem usa o
+tokenizer do Hugging Face em GEN_TOKENIZER quando disponivel; senao, uma razao
+caracteres/token recalibrada pelas respostas em streaming (cada chunk do Ollama
+e um token). A saida esperada ganha folga de 50% (a estimativa erra para os
+dois lados e cortar a resposta custa a chamada) e nunca fica abaixo do
+num_predict configurado (N2_NUM_PREDICT/N3_NUM_PREDICT). Os dois valores sao
+arredondados para potencias de 2 e o `num_ctx` de um modelo num host so
+cresce: o Ollama recarrega o modelo quando o `num_ctx` muda, entao alternar
+tamanhos custaria uma recarga por chamada.
+
+Prompts que nao cabem em GEN_NUM_CTX_MAX sao logados como truncamento e
+contados no `meta.sizing` (`truncated_input`); saidas esperadas acima do
+num_predict vao para o log. Respostas que o Ollama encerrou por limite
+(`done_reason == "length"`, visto pelo `on_done` da chain) contam como
+`truncated_output`.
+
+Variaveis:
+    GEN_SIZING=1                 liga (default desligado).
+    GEN_TOKENIZER=<repo HF>      tokenizer (transformers) para contar tokens.
+    GEN_CHARS_PER_TOKEN=3.2      razao inicial caracteres/token.
+    GEN_NUM_CTX_MIN=2048         menor num_ctx.
+    GEN_NUM_CTX_MAX=32768        maior num_ctx.
+    GEN_NUM_PREDICT_MAX=4096     maior num_predict.
+"""
+
+import math
+import os
+import threading
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+_PREDICT_MIN = 64
+# Folga sobre a saida esperada antes de arredondar o num_predict.
+_PREDICT_HEADROOM = 1.5
+# Respostas curtas demais nao recalibram a razao.
+_MIN_OBSERVED_TOKENS = 16
+
+ExpectedOutput = Callable[[Dict[str, str], Callable[[str], int]], int]
+
+
+def sizing_enabled() -> bool:
+    """Default desligado; setar GEN_SIZING=1 ativa."""
+    raw = os.environ.get("GEN_SIZING", "").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def _load_tokenizer(name: str) -> Any:
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        print("transformers nao instalado; GEN_TOKENIZER ignorado.")
+        return None
+    try:
+        return AutoTokenizer.from_pretrained(name)
+    except (OSError, ValueError) as exc:
+        print(f"Tokenizer {name} indisponivel ({exc}); usando razao caracteres/token.")
+        return None
+
+
+def _power_of_two(value: int, low: int, high: int) -> int:
+    size = low
+    while size < value and size < high:
+        size *= 2
+    return min(size, high)
+
+
+class TokenEstimator:
+    def __init__(self):
+        self.ratio = max(1.0, _env_float("GEN_CHARS_PER_TOKEN", 3.2))
+        self.name: str | None = os.environ.get("GEN_TOKENIZER", "").strip() or None
+        self._tokenizer = _load_tokenizer(self.name) if self.name else None
+        if self._tokenizer is None:
+            self.name = None
+        self._lock = threading.Lock()
+        self._chars = 0
+        self._tokens = 0
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False))
+        with self._lock:
+            ratio = self.ratio
+        return math.ceil(len(text) / ratio)
+
+    def observe(self, chars: int, tokens: int) -> None:
+        """Recalibra a razao com uma resposta em streaming (chunks ~ tokens)."""
+        if self._tokenizer is not None or tokens < _MIN_OBSERVED_TOKENS:
+            return
+        with self._lock:
+            self._chars += chars
+            self._tokens += tokens
+            # Limites: respostas atipicas (JSON curto, listas) nao distorcem a razao.
+            self.ratio = min(4.5, max(2.0, self._chars / self._tokens))
+
+
+class RequestSizer:
+    """Compartilhado pelas chains de um gerador (todos os hosts e threads).
+
+    `expected_output` estima a saida do nivel (`utils/nX/expected_output_tokens.py`).
+    """
+
+    def __init__(
+        self,
+        expected_output: ExpectedOutput,
+        log: Callable[[str], None] | None = None,
+    ):
+        self.expected_output = expected_output
+        self.estimator = TokenEstimator()
+        self.ctx_min = max(256, _env_int("GEN_NUM_CTX_MIN", 2048))
+        self.ctx_max = max(self.ctx_min, _env_int("GEN_NUM_CTX_MAX", 32768))
+        self.predict_max = max(_PREDICT_MIN, _env_int("GEN_NUM_PREDICT_MAX", 4096))
+        self.log = log or (lambda _message: None)
+        self._lock = threading.Lock()
+        self._runner_ctx: Dict[str, int] = {}
+        self.stats: Dict[str, Any] = {
+            "calls": 0,
+            "truncated_input": 0,
+            "truncated_output": 0,
+            "num_ctx": {},
+            "num_predict": {},
+        }
+
+    def size(
+        self,
+        runner: str,
+        prompt: str,
+        payload: Dict[str, str],
+        predict_floor: int = 0,
+    ) -> Tuple[int, int]:
+        """(num_ctx, num_predict) da chamada; `runner` identifica host e modelo.
+
+        `predict_floor` e o num_predict configurado do nivel: o dimensionado
+        nunca fica abaixo dele.
+        """
+        prompt_tokens = self.estimator.count(prompt)
+        wanted = self.expected_output(payload, self.estimator.count)
+        num_predict = max(
+            predict_floor,
+            _power_of_two(
+                math.ceil(wanted * _PREDICT_HEADROOM), _PREDICT_MIN, self.predict_max
+            ),
+        )
+        needed = prompt_tokens + num_predict
+        with self._lock:
+            previous = self._runner_ctx.get(runner, 0)
+            num_ctx = max(_power_of_two(needed, self.ctx_min, self.ctx_max), previous)
+            self._runner_ctx[runner] = num_ctx
+            self.stats["calls"] += 1
+            for key, value in (("num_ctx", num_ctx), ("num_predict", num_predict)):
+                self.stats[key][str(value)] = self.stats[key].get(str(value), 0) + 1
+            if needed > num_ctx:
+                self.stats["truncated_input"] += 1
+        if wanted > num_predict:
+            self.log(
+                f"Truncamento: saida esperada ~{wanted} tokens > "
+                f"num_predict {num_predict}."
+            )
+        if needed > num_ctx:
+            self.log(
+                f"Truncamento: prompt ~{prompt_tokens} + saida {num_predict} tokens > "
+                f"num_ctx maximo {num_ctx}; o Ollama descarta o inicio do prompt."
+            )
+        if previous and num_ctx > previous:
+            self.log(f"num_ctx de {runner}: {previous} -> {num_ctx} (recarga do modelo).")
+        return num_ctx, num_predict
+
+    def done(self, runner: str, num_predict: int, response: Dict[str, Any]) -> None:
+        """Resposta final de uma chamada dimensionada (`on_done` da chain)."""
+        if response.get("done_reason") != "length":
+            return
+        with self._lock:
+            self.stats["truncated_output"] += 1
+        self.log(
+            f"Truncamento: resposta de {runner} cortada em num_predict={num_predict} "
+            f"({response.get('eval_count') or '?'} tokens gerados)."
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tokenizer": self.estimator.name,
+                "chars_per_token": round(self.estimator.ratio, 3),
+                "calls": self.stats["calls"],
+                "truncated_input": self.stats["truncated_input"],
+                "truncated_output": self.stats["truncated_output"],
+                "num_ctx": dict(self.stats["num_ctx"]),
+                "num_predict": dict(self.stats["num_predict"]),
+            }
+
+
+class SizedChain:
+    """Escolhe `num_ctx`/`num_predict` por chamada e delega para a chain daquele tamanho.
+
+    `build(num_ctx, num_predict)` monta a chain do tamanho pedido (o `.resized` da
+    chain do backend, ver `llm_chain.build_chain`); as chains ficam guardadas por tamanho.
+    `predict_floor` e o num_predict configurado da chain (ver `RequestSizer.size`).
+    """
+
+    def __init__(
+        self,
+        template: str,
+        build: Callable[[int, int], Any],
+        sizer: RequestSizer,
+        runner: str,
+        predict_floor: int = 0,
+    ):
+        self.template = template
+        self.build = build
+        self.sizer = sizer
+        self.runner = runner
+        self.predict_floor = predict_floor
+        self._lock = threading.Lock()
+        self._chains: Dict[Tuple[int, int], Any] = {}
+
+    def stream(self, payload: Dict[str, str]) -> Iterator[str]:
+        prompt = self.template.format(**payload)
+        size = self.sizer.size(self.runner, prompt, payload, self.predict_floor)
+        with self._lock:
+            chain = self._chains.get(size)
+            if chain is None:
+                chain = self._chains[size] = self.build(*size)
+                chain.on_done = partial(self.sizer.done, self.runner, size[1])
+        chars = 0
+        tokens = 0
+        inner = chain.stream(payload)
+        try:
+            for chunk in inner:
+                chars += len(chunk)
+                tokens += 1
+                yield chunk
+        finally:
+            close = getattr(inner, "close", None)
+            if close is not None:
+                close()
+            self.sizer.estimator.observe(chars, tokens)
+
+    def invoke(self, payload: Dict[str, str]) -> str:
+        return "".join(self.stream(payload))
@@ -4,14 +4,14 @@ from pathlib import Path
 from typing import Any, Dict, List
 
 
-def _resume_enabled() -> bool:
+def resume_enabled() -> bool:
     """Default ligado; setar GEN_RESUME=0 desativa (forca refazer do zero)."""
     raw = os.environ.get("GEN_RESUME", "1").strip().lower()
     return raw in {"1", "true", "yes", "on"}
 
 
 def load_existing_output(output_path: str | Path) -> Dict[str, Any] | None:
-    if not _resume_enabled():
+    if not resume_enabled():
         return None
     path = Path(output_path)
     if not path.exists():
@@ -0,0 +1,222 @@
+"""Retentativas com backoff exponencial e circuit breaker por host Ollama.
+
+Cada gerador cria uma `RetryPolicy` por execucao e a compartilha entre hosts e
+threads. Os erros sao classificados:
+
+- `transient` (timeout, conexao recusada/caida, HTTP 5xx): nova tentativa apos
+  backoff exponencial com jitter; conta para o circuit breaker do host.
+- `model_missing` (HTTP 404 / "model not found"): o host nao serve o modelo;
+  o circuito abre na hora.
+- `fatal` (demais erros, ex: HTTP 4xx): nao adianta repetir a mesma chamada.
+- falha de parse: o host respondeu, entao repete sem backoff e zera as falhas
+  consecutivas do host.
+
+Com o circuito aberto, `HostUnavailable` sobe ate o `text_scheduler`, que
+devolve o texto para a fila e pausa o host; os hosts saudaveis assumem o
+trabalho. Passados GEN_CIRCUIT_COOLDOWN segundos o circuito fica meio-aberto:
+a proxima chamada ao host passa como teste (as demais do host esperam o
+resultado). Se o host responder, o circuito fecha e ele volta a receber
+textos; se falhar, reabre por mais um periodo. Com um unico host, ou com todos
+os hosts abertos ao mesmo tempo, a execucao termina (o journal permite retomar).
+
+Variaveis:
+    GEN_RETRY_ATTEMPTS=3          tentativas por chamada.
+    GEN_RETRY_BACKOFF=1           espera (s) antes da 2a tentativa; dobra a cada nova.
+    GEN_RETRY_BACKOFF_MAX=30      teto (s) do backoff.
+    GEN_RETRY_JITTER=0.5          fracao aleatoria descontada do backoff (0 a 1).
+    GEN_RETRY_BUDGET=<n>          maximo de retentativas na execucao (default sem limite).
+    GEN_BREAKER_THRESHOLD=3       falhas consecutivas que abrem o circuito do host.
+    GEN_CIRCUIT_COOLDOWN=60       segundos ate testar de novo um host aberto (0 = nunca).
+
+Com GEN_METRICS_PORT/GEN_METRICS_FILE, erros, timeouts, retentativas e
+circuitos abertos tambem vao para `utils/logs/metrics_exporter.py`.
+
+Com o limiar <= tentativas, uma chamada nunca desiste por falhas transitorias
+sem abrir o circuito: o texto vai para outro host em vez de sair vazio.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator
+
+import httpx
+
+from utils.logs import metrics_exporter
+
+
+class HostUnavailable(RuntimeError):
+    """Circuito aberto: o host nao recebe chamadas por `retry_after` s (None = nunca mais)."""
+
+    def __init__(self, host: str, reason: str, retry_after: float | None = None):
+        super().__init__(f"Host {host} indisponivel: {reason}")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def classify_error(exc: BaseException) -> str:
+    """`transient`, `model_missing` ou `fatal`."""
+    if isinstance(exc, (TimeoutError, httpx.TimeoutException, httpx.NetworkError)):
+        return "transient"
+    if isinstance(exc, (ConnectionError, httpx.RemoteProtocolError)):
+        return "transient"
+    status = getattr(exc, "status_code", None)
+    message = str(exc).lower()
+    if status == 404 or ("model" in message and "not found" in message):
+        return "model_missing"
+    if isinstance(status, int):
+        return "transient" if status >= 500 else "fatal"
+    if isinstance(exc, OSError):
+        return "transient"
+    return "fatal"
+
+
+class RetryPolicy:
+    def __init__(self, log: Callable[[str], None] | None = None, level: str = ""):
+        self.level = level
+        self.max_attempts = max(1, _env_int("GEN_RETRY_ATTEMPTS", 3))
+        self.backoff = max(0.0, _env_float("GEN_RETRY_BACKOFF", 1.0))
+        self.backoff_max = max(0.0, _env_float("GEN_RETRY_BACKOFF_MAX", 30.0))
+        self.jitter = min(1.0, max(0.0, _env_float("GEN_RETRY_JITTER", 0.5)))
+        budget = _env_int("GEN_RETRY_BUDGET", -1)
+        self.budget: int | None = budget if budget >= 0 else None
+        self.threshold = max(1, _env_int("GEN_BREAKER_THRESHOLD", 3))
+        self.cooldown = max(0.0, _env_float("GEN_CIRCUIT_COOLDOWN", 60.0))
+        self.log = log or (lambda _message: None)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._consecutive: Dict[str, int] = {}
+        self._open: Dict[str, str] = {}
+        self._opened_at: Dict[str, float] = {}
+        # Hosts meio-abertos com a chamada de teste em andamento.
+        self._probing: set[str] = set()
+        self.stats: Dict[str, Any] = {
+            "retries": 0,
+            "backoff_s": 0.0,
+            "budget_exhausted": 0,
+            "errors": {"transient": 0, "model_missing": 0, "fatal": 0},
+        }
+
+    def attempts(self, host: str) -> Iterator[int]:
+        """Numera as tentativas de uma chamada; para quando o orcamento acaba."""
+        for attempt in range(1, self.max_attempts + 1):
+            self._check(host)
+            if attempt > 1 and not self._spend(host):
+                self.log("Orcamento de retentativas esgotado; desistindo da chamada.")
+                return
+            yield attempt
+
+    def success(self, host: str) -> None:
+        with self._lock:
+            self._consecutive[host] = 0
+            closed = self._close(host)
+        if closed:
+            self.log(f"Circuito de {host} fechado: o host voltou a responder.")
+
+    def _close(self, host: str) -> bool:
+        """Fecha o circuito do host (com o lock); True se estava aberto."""
+        if host not in self._open:
+            return False
+        del self._open[host]
+        self._opened_at.pop(host, None)
+        self._probing.discard(host)
+        self._changed.notify_all()
+        metrics_exporter.set_gauge("host_circuit_open", 0, level=self.level, host=host)
+        return True
+
+    def _trip(self, host: str, reason: str) -> None:
+        """Abre (ou reabre) o circuito do host (com o lock)."""
+        self._open[host] = reason
+        self._opened_at[host] = time.time()
+        self._probing.discard(host)
+        self._changed.notify_all()
+
+    def failure(self, host: str, exc: BaseException, attempt: int) -> bool:
+        """Registra a falha; retorna True se vale tentar de novo (ja apos o backoff)."""
+        kind = classify_error(exc)
+        metrics_exporter.count("llm_errors", level=self.level, host=host, kind=kind)
+        if isinstance(exc, (TimeoutError, httpx.TimeoutException)):
+            metrics_exporter.count("llm_timeouts", level=self.level, host=host)
+        with self._lock:
+            self.stats["errors"][kind] += 1
+            probe = host in self._probing
+            if kind == "fatal":
+                # O host respondeu (erro da chamada, nao do host).
+                self._close(host)
+                return False
+            if kind == "model_missing":
+                self._trip(host, "modelo nao encontrado")
+            else:
+                self._consecutive[host] = self._consecutive.get(host, 0) + 1
+                if probe or self._consecutive[host] >= self.threshold:
+                    self._trip(host, f"{self._consecutive[host]} falhas seguidas")
+        if probe:
+            self.log(f"Teste de {host} falhou; circuito reaberto por {self.cooldown:.0f}s.")
+        self._check(host)
+        if attempt >= self.max_attempts:
+            return False
+        delay = min(self.backoff_max, self.backoff * 2 ** (attempt - 1))
+        delay *= 1.0 - self.jitter * random.random()
+        if delay > 0:
+            with self._lock:
+                self.stats["backoff_s"] += delay
+            time.sleep(delay)
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "backoff_s": round(self.stats["backoff_s"], 3),
+                "errors": dict(self.stats["errors"]),
+                "open_hosts": dict(self._open),
+            }
+
+    def _check(self, host: str) -> None:
+        """Levanta HostUnavailable com o circuito aberto; meio-aberto, deixa passar um teste."""
+        with self._changed:
+            while host in self._probing:
+                # Outra chamada esta testando o host: espera o resultado.
+                self._changed.wait()
+            reason = self._open.get(host)
+            if reason is None:
+                return
+            retry_after = self._opened_at[host] + self.cooldown - time.time()
+            probe = self.cooldown > 0 and retry_after <= 0
+            if probe:
+                self._probing.add(host)
+        if probe:
+            self.log(f"Circuito de {host} meio-aberto; chamada de teste.")
+            return
+        metrics_exporter.set_gauge("host_circuit_open", 1, level=self.level, host=host)
+        raise HostUnavailable(host, reason, retry_after if self.cooldown > 0 else None)
+
+    def _spend(self, host: str) -> bool:
+        with self._lock:
+            if self.budget is not None and self.stats["retries"] >= self.budget:
+                self.stats["budget_exhausted"] += 1
+                return False
+            self.stats["retries"] += 1
+        metrics_exporter.count("llm_retries", level=self.level, host=host)
+        return True
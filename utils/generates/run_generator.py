@@ -1,9 +1,10 @@
 import os
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Callable, Dict, List
 
 
+# Espera maxima entre modelos enquanto a maquina estiver acima de GEN_THERMAL_LIMIT.
 _DEFAULT_COOLDOWN_BY_LEVEL: Dict[str, float] = {
     "n1": 30.0,
     "n2": 60.0,
@@ -13,19 +14,24 @@ _DEFAULT_COOLDOWN_BY_LEVEL: Dict[str, float] = {
 }
 
 
-def _cooldown_seconds(n_key: str) -> float:
+def _fixed_cooldown() -> float | None:
+    """GEN_MODEL_COOLDOWN explicito forca uma pausa fixa entre modelos."""
     raw = os.environ.get("GEN_MODEL_COOLDOWN", "").strip()
     if raw:
         try:
             return max(0.0, float(raw))
         except ValueError:
             pass
-    return _DEFAULT_COOLDOWN_BY_LEVEL.get(n_key, 30.0)
+    return None
 
 from config.models import MODELS, predict_path
 from utils.generates.check_ollama_installed import check_ollama_installed
 from utils.generates.ensure_model_installed import ensure_model_installed
+from utils.generates.get_hosts import get_hosts, hosts_with_model
+from utils.generates.pause_controller import wait_for_thermal
+from utils.generates.run_pipeline import pipeline_enabled, run_pipeline
 from utils.generates.unload_model import unload_model
+from utils.logs.tracing import span
 
 
 _INPUT_BY_LEVEL: Dict[str, str] = {
@@ -50,12 +56,37 @@ def _resolve_generator(n_key: str) -> Callable[..., None] | None:
     return None
 
 
-def _hosts() -> List[str]:
-    raw = os.environ.get("OLLAMA_HOSTS", "").strip()
-    if raw:
-        return [h.strip() for h in raw.split(",") if h.strip()]
-    single = os.environ.get("OLLAMA_HOST", "http://localhost:11434").strip()
-    return [single]
+def _generator(n_key: str) -> Callable[..., None]:
+    """Gerador do nivel; `run_generators` ja descartou os niveis desconhecidos."""
+    generator = _resolve_generator(n_key)
+    if generator is None:
+        raise ValueError(f"Nivel desconhecido: {n_key}")
+    return generator
+
+
+# Niveis na ordem de execucao; cada um depende do predict do nivel indicado.
+_LEVEL_ORDER: List[str] = ["n1", "n2", "n1n2", "n3", "n1n2n3"]
+_DEPENDS_ON: Dict[str, str] = {"n2": "n1", "n1n2": "n1", "n3": "n2", "n1n2n3": "n1n2"}
+# Niveis que podem rodar encadeados por norma (GEN_PIPELINE=1).
+_CHAIN_LEVELS: List[str] = ["n1", "n1n2", "n1n2n3"]
+
+
+def _input_path(n_key: str, model: str) -> str:
+    input_template = _INPUT_BY_LEVEL[n_key]
+    if input_template == "dataset.json":
+        return input_template
+    return input_template.format(model=model)
+
+
+def _chained(levels: List[str]) -> List[str]:
+    """Maior sequencia consecutiva de _CHAIN_LEVELS selecionada (ou [])."""
+    chain: List[str] = []
+    for n_key in _CHAIN_LEVELS:
+        if n_key in levels:
+            chain.append(n_key)
+        elif chain:
+            break
+    return chain if len(chain) > 1 else []
 
 
 def _run_one(
@@ -63,50 +94,92 @@ def _run_one(
     n_key: str,
     model: str,
     model_id: str,
-    input_template: str,
-    host: str,
-) -> None:
-    if not ensure_model_installed(model, model_id):
-        return
-    input_path = (
-        "dataset.json" if input_template == "dataset.json"
-        else input_template.format(model=model)
-    )
+    model_hosts: List[str],
+) -> bool:
+    input_path = _input_path(n_key, model)
     output_path = predict_path(n_key, model)
-    print(f"[{host}] Gerando {n_key.upper()} com {model}...")
-    # Para isolar geracoes por host, ajusta OLLAMA_HOST localmente.
-    prev_host = os.environ.get("OLLAMA_HOST")
-    os.environ["OLLAMA_HOST"] = host
+    print(f"Gerando {n_key.upper()} com {model} em {len(model_hosts)} host(s)...")
     try:
-        generator(input_path=input_path, output_path=output_path, model_id=model_id)
+        with span("run_generator", level=n_key, model=model):
+            generator(
+                input_path=input_path,
+                output_path=output_path,
+                model_id=model_id,
+                hosts=model_hosts,
+            )
     except Exception as exc:
-        print(f"[{host}] Erro durante {n_key} com {model}: {exc}")
+        print(f"Erro durante {n_key} com {model}: {exc}")
+        return False
+    return True
+
+
+def _cooldown(n_keys: List[str], cooldown: float | None, hosts: List[str]) -> None:
+    if cooldown is None:
+        # Sem valor fixo, so espera se a leitura termica local pedir (hosts locais).
+        max_wait = max(_DEFAULT_COOLDOWN_BY_LEVEL.get(n_key, 30.0) for n_key in n_keys)
+        wait_for_thermal(hosts, max_wait, print)
+    elif cooldown > 0:
+        print(f"Cooldown de {cooldown:.0f}s antes do proximo modelo...")
+        time.sleep(cooldown)
+
+
+def _run_model(model: str, model_id: str, model_hosts: List[str], levels: List[str]) -> None:
+    """Todos os `levels` de um modelo nos `model_hosts`, descarregando no fim."""
+    failed: List[str] = []
+    chain = _chained(levels) if pipeline_enabled() else []
+    try:
+        if chain:
+            print(
+                f"Gerando {' -> '.join(n_key.upper() for n_key in chain)} "
+                f"encadeados com {model} em {len(model_hosts)} host(s)..."
+            )
+            stages = [
+                (
+                    n_key,
+                    _generator(n_key),
+                    _input_path(n_key, model),
+                    predict_path(n_key, model),
+                )
+                for n_key in chain
+            ]
+            failed.extend(run_pipeline(stages, model_id, model_hosts))
+        for n_key in [n_key for n_key in levels if n_key not in chain]:
+            dependency = _DEPENDS_ON.get(n_key)
+            if dependency in failed:
+                print(f"Pulando {n_key} com {model}: {dependency} falhou.")
+                failed.append(n_key)
+                continue
+            if not _run_one(_generator(n_key), n_key, model, model_id, model_hosts):
+                failed.append(n_key)
     finally:
-        try:
-            unload_model(model_id)
-        except Exception:
-            pass
-        if prev_host is None:
-            os.environ.pop("OLLAMA_HOST", None)
-        else:
-            os.environ["OLLAMA_HOST"] = prev_host
+        for host in model_hosts:
+            try:
+                unload_model(model_id, host=host)
+            except Exception:
+                pass
 
 
-def run_generator(n_key: str, models: List[str]) -> None:
-    if not check_ollama_installed():
-        return
+def run_generators(n_keys: List[str], models: List[str]) -> None:
+    """Roda a matriz (nivel, modelo) agrupada por modelo.
 
-    generator = _resolve_generator(n_key)
-    if generator is None:
-        print(f"N{n_key[1:]} nao esta disponivel neste menu.")
+    Todos os niveis de um modelo rodam enquanto ele esta carregado, na ordem de
+    dependencia n1 -> n2 -> n1n2 -> n3 -> n1n2n3; o modelo so e descarregado na
+    troca para o proximo. Com varios hosts, cada modelo ocupa os hosts livres
+    que ja o tem (os textos sao repartidos entre eles dentro do gerador) e
+    modelos com hosts disjuntos rodam ao mesmo tempo; um modelo que nao esta
+    em nenhum host e instalado no primeiro host livre.
+    """
+    if not check_ollama_installed():
         return
 
-    input_template = _INPUT_BY_LEVEL.get(n_key)
-    if input_template is None:
-        print(f"Nivel desconhecido: {n_key}")
-        return
+    levels: List[str] = []
+    for n_key in n_keys:
+        if _resolve_generator(n_key) is None or n_key not in _INPUT_BY_LEVEL:
+            print(f"Nivel desconhecido: {n_key}")
+            continue
+        levels.append(n_key)
+    levels.sort(key=_LEVEL_ORDER.index)
 
-    hosts = _hosts()
     tasks: List[tuple[str, str]] = []
     for model in models:
         model_id = MODELS.get(model)
@@ -115,33 +188,60 @@ def run_generator(n_key: str, models: List[str]) -> None:
             continue
         tasks.append((model, model_id))
 
-    if not tasks:
-        return
-
-    if len(hosts) == 1:
-        # Sequencial (Ollama serializa GPU local).
-        cooldown = _cooldown_seconds(n_key)
-        for i, (model, model_id) in enumerate(tasks):
-            _run_one(generator, n_key, model, model_id, input_template, hosts[0])
-            if cooldown > 0 and i < len(tasks) - 1:
-                print(f"Cooldown de {cooldown:.0f}s antes do proximo modelo...")
-                time.sleep(cooldown)
+    if not levels or not tasks:
         return
 
-    # Distribui (model, model_id) entre hosts via round-robin com workers paralelos.
-    max_workers = min(len(hosts), len(tasks))
-    print(f"Distribuindo {len(tasks)} modelos em {len(hosts)} hosts Ollama...")
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-        for i, (model, model_id) in enumerate(tasks):
-            host = hosts[i % len(hosts)]
-            futures.append(
-                executor.submit(
-                    _run_one, generator, n_key, model, model_id, input_template, host
+    hosts = get_hosts()
+    if len(hosts) > 1:
+        print(f"Distribuindo {len(tasks)} modelos e seus textos em {len(hosts)} hosts Ollama...")
+    cooldown = _fixed_cooldown()
+    # (modelo, id, hosts que ja tem o modelo; vazio = instalar no primeiro livre)
+    pending: List[tuple[str, str, List[str]]] = [
+        (model, model_id, hosts_with_model(model_id, hosts)) for model, model_id in tasks
+    ]
+    free = set(hosts)
+    running: List[threading.Thread] = []
+    changed = threading.Condition()
+
+    def _worker(model: str, model_id: str, claimed: List[str], install: bool) -> None:
+        try:
+            if not install or ensure_model_installed(model, model_id, claimed[0]):
+                _run_model(model, model_id, claimed, levels)
+        except Exception as exc:
+            print(f"Erro com {model}: {exc}")
+        finally:
+            with changed:
+                more = bool(pending)
+            if more:
+                _cooldown(levels, cooldown, claimed)
+            with changed:
+                free.update(claimed)
+                running.remove(threading.current_thread())
+                changed.notify_all()
+
+    with changed:
+        while pending or running:
+            for task in list(pending):
+                model, model_id, model_hosts = task
+                install = not model_hosts
+                candidates = hosts if install else model_hosts
+                claimed = [host for host in candidates if host in free]
+                if not claimed:
+                    continue
+                if install:
+                    claimed = claimed[:1]
+                pending.remove(task)
+                free.difference_update(claimed)
+                thread = threading.Thread(
+                    target=_worker,
+                    args=(model, model_id, claimed, install),
+                    name=f"model-{model}",
                 )
-            )
-        for f in as_completed(futures):
-            try:
-                f.result()
-            except Exception as exc:
-                print(f"Worker falhou: {exc}")
+                running.append(thread)
+                thread.start()
+            if pending or running:
+                changed.wait()
+
+
+def run_generator(n_key: str, models: List[str]) -> None:
+    run_generators([n_key], models)
@@ -0,0 +1,68 @@
+"""Meta e encerramento das camadas opcionais de uma execucao dos geradores.
+
+Retentativas, deduplicacao, dimensionamento, cascata, cache do LLM, streaming e
+metricas por chamada sao ligados por variaveis de ambiente e ficam `None`
+quando desligados. `layers_meta` grava o snapshot das camadas ligadas no
+`meta` do predict (a cada texto confirmado) e `close_layers` loga os resumos e
+fecha o que precisa ser fechado no fim da execucao, do mesmo jeito em N1, N2 e N3.
+"""
+
+from typing import Any, Callable, Dict
+
+from utils.generates.call_metrics import CallMetrics
+from utils.generates.cascade import Cascade
+from utils.generates.dedup import Dedup
+from utils.generates.llm_cache import LLMCache
+from utils.generates.request_sizing import RequestSizer
+from utils.generates.retry_policy import RetryPolicy
+from utils.generates.streaming_chain import StreamStats
+
+
+def layers_meta(
+    meta: Dict[str, Any],
+    retry: RetryPolicy,
+    dedup: Dedup | None = None,
+    sizer: RequestSizer | None = None,
+    cascade: Cascade | None = None,
+    cache: LLMCache | None = None,
+    stream_stats: StreamStats | None = None,
+    call_metrics: CallMetrics | None = None,
+) -> None:
+    """Atualiza `meta` com o estado atual das camadas ligadas."""
+    meta["retry"] = retry.snapshot()
+    if dedup is not None:
+        meta["dedup"] = dedup.snapshot()
+    if sizer is not None:
+        meta["sizing"] = sizer.snapshot()
+    if cascade is not None:
+        meta["cascade"] = cascade.snapshot()
+    if cache is not None:
+        meta["cache"] = cache.stats()
+    if stream_stats is not None:
+        meta["stream"] = stream_stats.snapshot()
+    if call_metrics is not None:
+        meta["ollama"] = call_metrics.snapshot()
+
+
+def close_layers(
+    log: Callable[[str], None],
+    cache: LLMCache | None = None,
+    stream_stats: StreamStats | None = None,
+    call_metrics: CallMetrics | None = None,
+) -> None:
+    """Loga os resumos do streaming, do cache e das chamadas e fecha cache e metricas."""
+    if stream_stats is not None:
+        summary = stream_stats.snapshot()
+        log(
+            f"Streaming: {summary['early_stops']}/{summary['calls']} chamadas "
+            f"encerradas cedo; ~{summary['tokens_avoided_est']} tokens evitados "
+            f"(~{summary['seconds_saved_est']:.1f}s)."
+        )
+    if cache is not None:
+        stats = cache.stats()
+        log(f"Cache LLM: {stats['hits']} hits, {stats['misses']} misses.")
+        cache.close()
+    if call_metrics is not None:
+        for line in call_metrics.describe():
+            log(line)
+        call_metrics.close()
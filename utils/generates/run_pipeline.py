@@ -0,0 +1,161 @@
+"""Pipeline encadeado N1 -> N2 -> N3 por norma, em um so processo.
+
+Cada estagio e um gerador (generate_n1/n2/n3) rodando na sua propria thread.
+Assim que um estagio confirma um texto, o texto segue por uma fila limitada
+para o estagio seguinte, que ja pode processa-lo enquanto o anterior gera o
+proximo. Cada estagio continua gravando o seu predict (e journal) como na
+execucao isolada, entao os arquivos gerados sao os mesmos.
+
+Um estagio encadeado que nao consegue comecar (prompt ou entrada ausente)
+levanta `StageConfigError` em vez de so imprimir o erro; um estagio que
+termina sem consumir a fila inteira tambem conta como falha. Nos dois casos os
+demais estagios sao interrompidos em vez de esperarem por uma fila parada.
+
+Variaveis:
+    GEN_PIPELINE=1            o menu encadeia n1 -> n1n2 -> n1n2n3 (default desligado).
+    GEN_PIPELINE_QUEUE=4      textos em espera entre dois estagios.
+"""
+
+import copy
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from utils.logs.tracing import span
+
+_END = object()
+_POLL_SECONDS = 1.0
+
+# (nome, gerador, entrada, saida)
+Stage = Tuple[str, Callable[..., None], str, str]
+
+
+class StageConfigError(RuntimeError):
+    """Configuracao invalida de um estagio encadeado (prompt, entrada, parametros)."""
+
+
+def config_error(message: str, chained: bool) -> None:
+    """Erro de configuracao do gerador: levanta no pipeline, so imprime isolado."""
+    if chained:
+        raise StageConfigError(message.removeprefix("Erro: "))
+    print(message)
+
+
+def pipeline_enabled() -> bool:
+    """Default desligado; setar GEN_PIPELINE=1 ativa."""
+    raw = os.environ.get("GEN_PIPELINE", "").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def _queue_size() -> int:
+    raw = os.environ.get("GEN_PIPELINE_QUEUE", "").strip()
+    try:
+        return max(1, int(raw)) if raw else 4
+    except ValueError:
+        return 4
+
+
+def _drain(inp: "queue.Queue[Any]") -> None:
+    """Esvazia a fila de um estagio que parou antes do fim (ate o _END, se ja chegou)."""
+    while True:
+        try:
+            if inp.get_nowait() is _END:
+                return
+        except queue.Empty:
+            return
+
+
+def _sink(
+    out: "queue.Queue[Any]", abort: threading.Event
+) -> Callable[[int, Dict[str, Any]], None]:
+    def _put(_count: int, entry: Dict[str, Any]) -> None:
+        # Copia: o estagio seguinte nao pode alterar a entrada ja gravada.
+        item = copy.deepcopy(entry)
+        while True:
+            if abort.is_set():
+                raise RuntimeError("Pipeline interrompido por falha em outro estagio.")
+            try:
+                out.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    return _put
+
+
+def _source(
+    inp: "queue.Queue[Any]", abort: threading.Event, finished: threading.Event
+) -> Iterator[Dict[str, Any]]:
+    while True:
+        try:
+            item = inp.get(timeout=_POLL_SECONDS)
+        except queue.Empty as exc:
+            if abort.is_set():
+                raise RuntimeError("Pipeline interrompido por falha em outro estagio.") from exc
+            continue
+        if item is _END:
+            finished.set()
+            if abort.is_set():
+                raise RuntimeError("Pipeline interrompido por falha em outro estagio.")
+            return
+        yield item
+
+
+def run_pipeline(
+    stages: List[Stage],
+    model_id: str,
+    hosts: List[str],
+) -> List[str]:
+    """Roda `stages` encadeados; retorna os nomes dos estagios que falharam."""
+    abort = threading.Event()
+    failed: List[str] = []
+    queues: List["queue.Queue[Any]"] = [
+        queue.Queue(maxsize=_queue_size()) for _ in stages[1:]
+    ]
+
+    def _run(index: int) -> None:
+        name, generator, input_path, output_path = stages[index]
+        kwargs: Dict[str, Any] = {
+            "input_path": input_path,
+            "output_path": output_path,
+            "model_id": model_id,
+            "hosts": hosts,
+        }
+        finished = threading.Event()
+        if index > 0:
+            kwargs["source"] = _source(queues[index - 1], abort, finished)
+        if index < len(queues):
+            kwargs["sink"] = _sink(queues[index], abort)
+        try:
+            with span("run_generator", level=name, model=model_id):
+                generator(**kwargs)
+            if index > 0 and not finished.is_set():
+                raise RuntimeError("estagio terminou antes de consumir a entrada.")
+        except Exception as exc:
+            print(f"Erro durante {name}: {exc}")
+            failed.append(name)
+            abort.set()
+        finally:
+            if index > 0 and not finished.is_set():
+                # Libera o _sink do estagio anterior, que pode estar com a fila cheia.
+                _drain(queues[index - 1])
+            if index < len(queues):
+                # Fim do estagio (inclusive por erro): libera o seguinte.
+                while True:
+                    try:
+                        queues[index].put(_END, timeout=_POLL_SECONDS)
+                        break
+                    except queue.Full:
+                        if abort.is_set():
+                            break
+
+    threads = [
+        threading.Thread(target=_run, args=(index,), name=f"pipeline-{name}")
+        for index, (name, _, _, _) in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return failed
@@ -0,0 +1,126 @@
+"""Geracao em streaming com parada antecipada quando a saida ja esta completa.
+
+Cada nivel tem um detector `output_complete(text) -> corte | None` (utils/nX):
+N1 = fim da lista de sentencas, N2 = os 4 campos escritos, N3 = primeiro objeto
+JSON balanceado. Assim que o detector aceita o texto parcial, o stream e fechado
+(o que encerra a requisicao HTTP e libera o slot do Ollama) em vez de esperar o
+modelo divagar ate o `stop` ou o `num_predict`.
+
+Variaveis:
+    GEN_STREAM=1   liga o streaming com parada antecipada (default desligado).
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator
+
+
+def streaming_enabled() -> bool:
+    """Default desligado; setar GEN_STREAM=1 ativa."""
+    raw = os.environ.get("GEN_STREAM", "").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+class StreamStats:
+    """Contadores compartilhados entre as chains em streaming de um gerador."""
+
+    def __init__(self):
+        self.calls = 0
+        self.early_stops = 0
+        self.tokens_avoided = 0
+        self.chars_discarded = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        early: bool,
+        tokens_avoided: int = 0,
+        chars_discarded: int = 0,
+        seconds_saved: float = 0.0,
+    ) -> None:
+        with self._lock:
+            self.calls += 1
+            if early:
+                self.early_stops += 1
+                self.tokens_avoided += tokens_avoided
+                self.chars_discarded += chars_discarded
+                self.seconds_saved += seconds_saved
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "early_stops": self.early_stops,
+                "tokens_avoided_est": self.tokens_avoided,
+                "chars_discarded": self.chars_discarded,
+                "seconds_saved_est": round(self.seconds_saved, 3),
+            }
+
+
+class StreamingChain:
+    """Envolve uma chain com `.stream(payload)` e corta a geracao no fim estrutural.
+
+    Emite apenas linhas completas (e "" a cada chunk retido), de modo que o corte
+    do detector nunca cai em texto ja emitido.
+    """
+
+    def __init__(
+        self,
+        chain: Any,
+        is_complete: Callable[[str], int | None],
+        num_predict: int | None = None,
+        log: Callable[[str], None] | None = None,
+        stats: StreamStats | None = None,
+    ):
+        self.chain = chain
+        self.is_complete = is_complete
+        self.num_predict = num_predict
+        self.log = log or (lambda _message: None)
+        self.stats = stats or StreamStats()
+
+    def stream(self, payload: Dict[str, str]) -> Iterator[str]:
+        text = ""
+        emitted = 0
+        chunks = 0
+        start = time.time()
+        inner = self.chain.stream(payload)
+        try:
+            for chunk in inner:
+                chunks += 1
+                text += chunk
+                cut = self.is_complete(text)
+                if cut is not None:
+                    cut = max(cut, emitted)
+                    self._record_stop(text, cut, chunks, time.time() - start)
+                    yield text[emitted:cut]
+                    return
+                last_newline = text.rfind("\n") + 1
+                if last_newline > emitted:
+                    yield text[emitted:last_newline]
+                    emitted = last_newline
+                else:
+                    yield ""
+            self.stats.record(early=False)
+            if len(text) > emitted:
+                yield text[emitted:]
+        finally:
+            close = getattr(inner, "close", None)
+            if close is not None:
+                close()
+
+    def invoke(self, payload: Dict[str, str]) -> str:
+        return "".join(self.stream(payload))
+
+    def _record_stop(self, text: str, cut: int, chunks: int, elapsed: float) -> None:
+        # Estimativa: cada chunk do Ollama ~ 1 token; o teto e o num_predict.
+        avoided = max(0, (self.num_predict or chunks) - chunks)
+        saved = (elapsed / chunks) * avoided if chunks else 0.0
+        discarded = len(text) - cut
+        self.stats.record(True, avoided, discarded, saved)
+        self.log(
+            f"Streaming: saida completa apos {chunks} tokens ({elapsed:.2f}s); "
+            f"descartados {discarded} caracteres; "
+            f"evitados ate {avoided} tokens (~{saved:.2f}s)"
+        )
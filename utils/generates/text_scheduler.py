@@ -0,0 +1,131 @@
+"""Distribui os textos de um dataset entre varios hosts Ollama (work stealing).
+
+Um worker por host puxa o proximo texto de uma fila unica, de modo que hosts
+mais rapidos processam mais textos. Os resultados voltam para a thread
+chamadora, que os confirma (`commit`) na ordem original do dataset; assim o
+predict e o checkpoint continuam sendo escritos por uma unica thread e em ordem.
+
+Se um worker levantar excecao, o texto volta para a fila e aquele host e
+descartado; os demais continuam. Se a excecao trouxer `retry_after` (circuito
+aberto em retry_policy.py), o host so fica pausado por esse tempo e depois
+volta a puxar textos. Com um unico host tudo roda em sequencia na thread
+chamadora, como antes.
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, List, Tuple, TypeVar
+
+from utils.logs.tracing import span
+
+T = TypeVar("T")
+
+# Marcadores enviados pela thread alimentadora para a thread chamadora.
+_QUEUED = object()
+_FED = object()
+# Marcador enviado por um worker que volta de uma pausa.
+_RESUMED = object()
+
+
+def run_texts(
+    items: Iterable[Tuple[int, Any]],
+    hosts: List[str],
+    process: Callable[[str, int, Any], T],
+    commit: Callable[[int, T], None],
+    log: Callable[[str], None] | None = None,
+) -> None:
+    """Processa `items` ((count, item)) nos `hosts` e chama `commit` em ordem.
+
+    `items` e consumido sob demanda, entao pode ser um gerador alimentado por
+    outro estagio (ver run_pipeline.py).
+    """
+    if len(hosts) <= 1:
+        for count, item in items:
+            with span("text", text=count, host=hosts[0]):
+                result = process(hosts[0], count, item)
+            commit(count, result)
+        return
+
+    pending: "queue.Queue[Tuple[int, Any] | None]" = queue.Queue()
+    finished: "queue.Queue[Tuple[str, int, Any]]" = queue.Queue()
+    stop = threading.Event()
+
+    def _feed() -> None:
+        try:
+            for count, item in items:
+                finished.put(("", count, _QUEUED))
+                pending.put((count, item))
+        except Exception as exc:
+            finished.put(("", -1, exc))
+            return
+        finished.put(("", 0, _FED))
+
+    def _worker(host: str) -> None:
+        while True:
+            entry = pending.get()
+            if entry is None:
+                return
+            count, item = entry
+            try:
+                with span("text", text=count, host=host):
+                    result = process(host, count, item)
+            except Exception as exc:
+                pending.put(entry)
+                finished.put((host, -1, exc))
+                retry_after = getattr(exc, "retry_after", None)
+                if retry_after is None or stop.wait(max(0.0, retry_after)):
+                    return
+                finished.put((host, 0, _RESUMED))
+                continue
+            finished.put((host, count, result))
+
+    workers = [
+        threading.Thread(
+            target=_worker, args=(host,), name=f"text-worker-{index}", daemon=True
+        )
+        for index, host in enumerate(hosts)
+    ]
+    for worker in workers:
+        worker.start()
+    threading.Thread(target=_feed, name="text-feeder", daemon=True).start()
+
+    order: List[int] = []
+    results: dict[int, Any] = {}
+    position = 0
+    alive = len(workers)
+    fed = False
+    try:
+        while not fed or position < len(order):
+            host, count, result = finished.get()
+            if result is _QUEUED:
+                order.append(count)
+                continue
+            if result is _FED:
+                fed = True
+                continue
+            if result is _RESUMED:
+                alive += 1
+                if log is not None:
+                    log(f"Host {host} retomado apos a pausa.")
+                continue
+            if count < 0:
+                if not host:
+                    raise result
+                alive -= 1
+                retry_after = getattr(result, "retry_after", None)
+                if log is not None:
+                    if retry_after is None:
+                        log(f"Host {host} descartado apos erro: {result}")
+                    else:
+                        log(f"Host {host} pausado por {retry_after:.0f}s: {result}")
+                if alive == 0:
+                    raise RuntimeError("Nenhum host Ollama disponivel.") from result
+                continue
+            results[count] = result
+            while position < len(order) and order[position] in results:
+                commit(order[position], results.pop(order[position]))
+                position += 1
+    finally:
+        stop.set()
+        for _ in workers:
+            pending.put(None)
@@ -4,8 +4,12 @@ from typing import Callable
 import ollama
 
 
-def unload_model(model_id: str, log: Callable[[str], None] | None = None) -> None:
-    host = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+def unload_model(
+    model_id: str,
+    log: Callable[[str], None] | None = None,
+    host: str | None = None,
+) -> None:
+    host = host or os.environ.get("OLLAMA_HOST", "http://localhost:11434")
     try:
         client = ollama.Client(host=host)
         client.generate(model=model_id, prompt="", keep_alive=0)
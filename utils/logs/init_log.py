@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 import time
 from pathlib import Path
 from typing import Callable, IO, Tuple
@@ -17,6 +18,8 @@ def init_log(
     log_file: IO[str] | None = None
     log_enabled: bool = False
     json_mode = _json_mode()
+    # Chamadas concorrentes (async_engine) escrevem no mesmo arquivo.
+    lock = threading.Lock()
 
     if log_path is None:
         # Default ligado; setar GENERATE_DEBUG=0 desativa logs em arquivo.
@@ -45,9 +48,10 @@ def init_log(
         else:
             timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
             line = f"[{timestamp}] {message}"
-        print(line)
-        log_file.write(line + "\n")
-        log_file.flush()
+        with lock:
+            print(line)
+            log_file.write(line + "\n")
+            log_file.flush()
 
     def close() -> None:
         nonlocal log_file
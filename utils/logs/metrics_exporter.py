@@ -0,0 +1,311 @@
+"""Metricas OpenMetrics do andamento da geracao e da validacao.
+
+Alternativa a acompanhar `logs/*.log`: contadores, histogramas e gauges em
+memoria, expostos por HTTP em localhost e/ou num arquivo `.prom` reescrito
+periodicamente (coletor textfile do node_exporter). Sem dependencias: o
+registro e o formato de texto sao implementados aqui.
+
+Desligado por padrao; sem GEN_METRICS_PORT nem GEN_METRICS_FILE, `count`,
+`add`, `set_gauge` e `observe` retornam na primeira linha. Ligado, cada
+atualizacao e uma soma num dicionario sob um lock, entao pode ficar ativo em
+execucoes de varios dias.
+
+Metricas (prefixo `rase_`):
+    llm_calls_total{level,model,host,status}         chamadas (ok/cancelled/error)
+    llm_call_seconds{level,model}                    latencia da chamada (histograma)
+    llm_first_token_seconds{level,model}             ate o primeiro token (histograma)
+    llm_eval_tokens_per_second{level,model}          geracao do Ollama (histograma)
+    llm_prompt_tokens_total / llm_eval_tokens_total  tokens {level,model}
+    llm_inflight{level,host}                         chamadas em andamento
+    llm_retries_total{level,host}                    retentativas
+    llm_errors_total{level,host,kind}                transient/model_missing/fatal
+    llm_timeouts_total{level,host}                   timeouts
+    host_circuit_open{level,host}                    circuito aberto (1)
+    parse_failures_total{level}                      respostas sem saida aproveitavel
+    llm_cache_requests_total{model,result}           hit/miss do cache do LLM
+    text_index{level,model} / texts{level,model}     texto atual e total
+    validation_stages_done{level} / validation_stages{level}
+    validation_stage_seconds{level,stage}            duracao de cada metrica
+
+Variaveis:
+    GEN_METRICS_PORT=<porta>     HTTP em http://127.0.0.1:<porta>/metrics.
+    GEN_METRICS_ADDR=127.0.0.1   interface do servidor HTTP.
+    GEN_METRICS_FILE=<arquivo>   arquivo .prom (formato de texto do Prometheus).
+    GEN_METRICS_INTERVAL=15      intervalo (s) de reescrita do arquivo.
+"""
+
+import atexit
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+_PREFIX = "rase_"
+_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+_RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+_INF_BUCKET = 'le="+Inf"'
+
+# nome -> (tipo, ajuda, labels, buckets)
+_DEFINITIONS: Dict[str, Tuple[str, str, Tuple[str, ...], Tuple[float, ...]]] = {
+    "llm_calls": ("counter", "Chamadas ao Ollama.", ("level", "model", "host", "status"), ()),
+    "llm_call_seconds": (
+        "histogram", "Latencia das chamadas ao Ollama (s).", ("level", "model"),
+        _LATENCY_BUCKETS,
+    ),
+    "llm_first_token_seconds": (
+        "histogram", "Tempo ate o primeiro token (s).", ("level", "model"),
+        _LATENCY_BUCKETS,
+    ),
+    "llm_eval_tokens_per_second": (
+        "histogram", "Tokens gerados por segundo (eval_count/eval_duration).",
+        ("level", "model"), _RATE_BUCKETS,
+    ),
+    "llm_prompt_tokens": ("counter", "Tokens de prompt avaliados.", ("level", "model"), ()),
+    "llm_eval_tokens": ("counter", "Tokens gerados.", ("level", "model"), ()),
+    "llm_inflight": ("gauge", "Chamadas em andamento por host.", ("level", "host"), ()),
+    "llm_retries": ("counter", "Retentativas de chamadas.", ("level", "host"), ()),
+    "llm_errors": ("counter", "Erros de chamadas por tipo.", ("level", "host", "kind"), ()),
+    "llm_timeouts": ("counter", "Chamadas encerradas por timeout.", ("level", "host"), ()),
+    "host_circuit_open": ("gauge", "Circuito do host aberto (1).", ("level", "host"), ()),
+    "parse_failures": (
+        "counter", "Respostas sem saida aproveitavel.", ("level",), (),
+    ),
+    "llm_cache_requests": (
+        "counter", "Consultas ao cache do LLM.", ("model", "result"), (),
+    ),
+    "text_index": ("gauge", "Ultimo texto concluido.", ("level", "model"), ()),
+    "texts": ("gauge", "Textos da entrada.", ("level", "model"), ()),
+    "validation_stages_done": ("gauge", "Metricas de validacao concluidas.", ("level",), ()),
+    "validation_stages": ("gauge", "Metricas de validacao previstas.", ("level",), ()),
+    "validation_stage_seconds": (
+        "gauge", "Duracao de cada metrica da validacao (s).", ("level", "stage"), (),
+    ),
+}
+
+LabelKey = Tuple[str, ...]
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # nome -> labels -> valor (counter/gauge) ou [contagens por bucket, soma, total]
+        self._values: Dict[str, Dict[LabelKey, Any]] = {name: {} for name in _DEFINITIONS}
+
+    def _key(self, name: str, labels: Dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(label, "")) for label in _DEFINITIONS[name][2])
+
+    def add(self, name: str, amount: float, labels: Dict[str, Any]) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[name][key] = float(value)
+
+    def observe(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        key = self._key(name, labels)
+        buckets = _DEFINITIONS[name][3]
+        with self._lock:
+            series = self._values[name]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self, openmetrics: bool = True) -> str:
+        """Formato OpenMetrics 1.0 ou, com `openmetrics=False`, texto do Prometheus 0.0.4."""
+        with self._lock:
+            snapshot = {
+                name: {
+                    key: (
+                        [list(value[0]), value[1], value[2]] if isinstance(value, list) else value
+                    )
+                    for key, value in series.items()
+                }
+                for name, series in self._values.items()
+            }
+        lines: List[str] = []
+        for name, (kind, help_text, label_names, buckets) in _DEFINITIONS.items():
+            series = snapshot[name]
+            if not series:
+                continue
+            family = _PREFIX + name
+            suffix = "_total" if kind == "counter" else ""
+            typed = family if openmetrics else family + suffix
+            lines.append(f"# HELP {typed} {help_text}")
+            lines.append(f"# TYPE {typed} {kind}")
+            for key, value in sorted(series.items()):
+                labels = [f'{label}="{_escape(part)}"' for label, part in zip(label_names, key)]
+                if kind != "histogram":
+                    if isinstance(value, (int, float)):
+                        lines.append(f"{family}{suffix}{_labels(labels)} {_number(value)}")
+                    continue
+                counts, total, count = value
+                for bound, bucket_count in zip(buckets, counts):
+                    le = f'le="{_number(float(bound))}"'
+                    lines.append(f"{family}_bucket{_labels(labels + [le])} {bucket_count}")
+                lines.append(f"{family}_bucket{_labels(labels + [_INF_BUCKET])} {count}")
+                lines.append(f"{family}_count{_labels(labels)} {count}")
+                lines.append(f"{family}_sum{_labels(labels)} {_number(total)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(parts: Sequence[str]) -> str:
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _serve(address: Tuple[str, int], registry: Registry) -> Any:
+    """Servidor HTTP do /metrics (http.server so e importado com GEN_METRICS_PORT)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] not in {"/", "/metrics"}:
+                self.send_error(404)
+                return
+            openmetrics = "application/openmetrics-text" in (self.headers.get("Accept") or "")
+            body = registry.render(openmetrics).encode("utf-8")
+            content_type = (
+                "application/openmetrics-text; version=1.0.0; charset=utf-8"
+                if openmetrics else "text/plain; version=0.0.4; charset=utf-8"
+            )
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(address, _Handler)
+    server.daemon_threads = True
+    return server
+
+
+def _write_file(registry: Registry, path: Path) -> None:
+    # Troca atomica: o coletor nunca le um arquivo pela metade.
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(registry.render(openmetrics=False), encoding="utf-8")
+    os.replace(temporary, path)
+
+
+_REGISTRY: Registry | None = None
+_STARTED = False
+_START_LOCK = threading.Lock()
+
+
+def _registry() -> Registry | None:
+    """Registro do processo; na primeira chamada sobe o HTTP e o escritor do arquivo."""
+    global _REGISTRY, _STARTED
+    if _STARTED:
+        return _REGISTRY
+    with _START_LOCK:
+        if _STARTED:
+            return _REGISTRY
+        port = os.environ.get("GEN_METRICS_PORT", "").strip()
+        file_path = os.environ.get("GEN_METRICS_FILE", "").strip()
+        if port or file_path:
+            _REGISTRY = Registry()
+            if port:
+                _start_http(_REGISTRY, port)
+            if file_path:
+                _start_file_writer(_REGISTRY, Path(file_path))
+        _STARTED = True
+        return _REGISTRY
+
+
+def _start_http(registry: Registry, port: str) -> None:
+    address = os.environ.get("GEN_METRICS_ADDR", "127.0.0.1").strip() or "127.0.0.1"
+    try:
+        server = _serve((address, int(port)), registry)
+    except (OSError, ValueError) as exc:
+        # Outro processo (ex: varios geradores) ja usa a porta.
+        print(f"Metricas: servidor HTTP indisponivel em {address}:{port} ({exc}).")
+        return
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metricas em http://{address}:{server.server_address[1]}/metrics")
+
+
+def _start_file_writer(registry: Registry, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    interval = max(1.0, _env_float("GEN_METRICS_INTERVAL", 15.0))
+    stop = threading.Event()
+
+    def _loop() -> None:
+        while not stop.wait(interval):
+            try:
+                _write_file(registry, path)
+            except OSError:
+                continue
+
+    def _final() -> None:
+        stop.set()
+        try:
+            _write_file(registry, path)
+        except OSError:
+            pass
+
+    threading.Thread(target=_loop, name="metrics-file", daemon=True).start()
+    atexit.register(_final)
+
+
+def metrics_enabled() -> bool:
+    return _registry() is not None
+
+
+def count(name: str, amount: float = 1.0, **labels: Any) -> None:
+    registry = _registry()
+    if registry is not None:
+        registry.add(name, amount, labels)
+
+
+def add(name: str, amount: float, **labels: Any) -> None:
+    """Soma em gauge (ex: +1/-1 das chamadas em andamento)."""
+    registry = _registry()
+    if registry is not None:
+        registry.add(name, amount, labels)
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    registry = _registry()
+    if registry is not None:
+        registry.set(name, value, labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    registry = _registry()
+    if registry is not None:
+        registry.observe(name, value, labels)
@@ -0,0 +1,150 @@
+"""Spans aninhados da geracao e da validacao em JSONL (trace events do Chrome).
+
+Cada span concluido vira uma linha `{"name", "cat", "ph": "X", "ts", "dur",
+"pid", "tid", "args"}` (microssegundos), o evento "complete" do formato de trace
+do Chrome; spans da mesma thread se aninham pelo tempo. `tools/trace_report.py`
+junta os arquivos em um JSON que o Perfetto (ui.perfetto.dev) ou o
+chrome://tracing abrem, e resume o tempo proprio de cada span (ex: modelo vs
+alinhamento Hungarian vs escrita do checkpoint).
+
+Pontos instrumentados: `run_generator` -> texto (`text_scheduler`) -> sentenca
+(`PredictStore.resumable`) -> `invoke_with_timeout` -> `process_text` /
+`parse_properties` -> checkpoint; na validacao, `prepare_model_data` ->
+`align_lists` -> cada metrica de `compute_all_scores` -> `write_metrics`.
+
+Desligado, `span` devolve um contexto nulo compartilhado e `traced` chama a
+funcao direto: o custo e uma consulta a uma global.
+
+Variaveis:
+    GEN_TRACE=1          grava em `runs/traces/trace_<pid>.jsonl`.
+    GEN_TRACE=<arquivo>  grava (acrescenta) no arquivo indicado.
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import IO, Any, Callable, ContextManager, Iterator, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_NULL = nullcontext()
+_DEFAULT_DIR = Path("runs") / "traces"
+
+
+class _Writer:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._threads: set[int] = set()
+        self._file: IO[str] | None = open(path, "a", encoding="utf-8")
+        self._emit({
+            "name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+            "args": {"name": f"rase {self.pid}"},
+        })
+
+    def _emit(self, event: dict) -> None:
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def event(self, name: str, start: float, end: float, args: dict) -> None:
+        thread = threading.current_thread()
+        tid = threading.get_native_id()
+        if tid not in self._threads:
+            # Nome da thread (text-worker-N, pipeline-nX, ...) na trilha do Perfetto.
+            self._threads.add(tid)
+            self._emit({
+                "name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                "args": {"name": thread.name},
+            })
+        self._emit({
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": round(start * 1e6),
+            "dur": round((end - start) * 1e6),
+            "pid": self.pid,
+            "tid": tid,
+            "args": args,
+        })
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_WRITER: _Writer | None = None
+_RESOLVED = False
+_RESOLVE_LOCK = threading.Lock()
+
+
+def _writer() -> _Writer | None:
+    global _WRITER, _RESOLVED
+    if _RESOLVED:
+        return _WRITER
+    with _RESOLVE_LOCK:
+        if not _RESOLVED:
+            raw = os.environ.get("GEN_TRACE", "").strip()
+            if raw.lower() in {"1", "true", "yes", "on"}:
+                path = _DEFAULT_DIR / f"trace_{os.getpid()}.jsonl"
+            elif raw and raw.lower() not in {"0", "false", "no", "off"}:
+                path = Path(raw)
+            else:
+                path = None
+            if path is not None:
+                _WRITER = _Writer(path)
+                atexit.register(_WRITER.close)
+                print(f"Trace em {path}")
+            _RESOLVED = True
+    return _WRITER
+
+
+def tracing_enabled() -> bool:
+    return _writer() is not None
+
+
+@contextmanager
+def _span(writer: _Writer, name: str, args: dict) -> Iterator[None]:
+    start = time.time()
+    try:
+        yield
+    except BaseException as exc:
+        args["error"] = type(exc).__name__
+        raise
+    finally:
+        writer.event(name, start, time.time(), args)
+
+
+def span(name: str, **args: Any) -> ContextManager[None]:
+    """Span `name` com `args` (valores simples) em volta do bloco."""
+    writer = _writer()
+    if writer is None:
+        return _NULL
+    return _span(writer, name, args)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator: cada chamada da funcao vira um span `name`."""
+
+    def decorate(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            writer = _writer()
+            if writer is None:
+                return fn(*args, **kwargs)
+            with _span(writer, name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
@@ -0,0 +1,8 @@
+from typing import Callable, Dict
+
+
+def expected_output_tokens(
+    payload: Dict[str, str], count_tokens: Callable[[str], int]
+) -> int:
+    """Tokens esperados na saida N1: o texto reescrito como lista de sentencas."""
+    return int(count_tokens(payload.get("text", "")) * 1.3) + 32
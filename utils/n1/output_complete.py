@@ -0,0 +1,24 @@
+import re
+
+_HEADER = re.compile(r"^(nota|obs|observa|explica|coment|resumo)", re.IGNORECASE)
+
+
+def output_complete(text: str) -> int | None:
+    """Posicao de corte quando a lista de sentencas N1 terminou, senao None.
+
+    A lista termina quando, depois de ao menos uma sentenca, aparece uma linha
+    completa que nao e sentenca (ex: "Observacoes:" ou "Nota ...").
+    """
+    offset = 0
+    has_sentence = False
+    for line in text.splitlines(keepends=True):
+        if not line.endswith("\n"):
+            break
+        stripped = line.strip()
+        if stripped:
+            if has_sentence and (stripped.endswith(":") or _HEADER.match(stripped)):
+                return offset
+            if stripped.endswith("."):
+                has_sentence = True
+        offset += len(line)
+    return None
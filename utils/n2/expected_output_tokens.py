@@ -0,0 +1,18 @@
+import re
+from typing import Callable, Dict
+
+_SENTENCE_HEADER = re.compile(r"^Sentenca \d+:", re.MULTILINE)
+# Rotulos dos 4 campos e aspas de cada bloco.
+_FIELDS_TOKENS = 64
+
+
+def expected_output_tokens(
+    payload: Dict[str, str], count_tokens: Callable[[str], int]
+) -> int:
+    """Tokens esperados na saida N2: os 4 campos com trechos da sentenca (ou de
+    cada sentenca do lote)."""
+    if "texts_n1" in payload:
+        texts_n1 = payload["texts_n1"]
+        blocks = max(1, len(_SENTENCE_HEADER.findall(texts_n1)))
+        return 2 * count_tokens(texts_n1) + _FIELDS_TOKENS * blocks
+    return 2 * count_tokens(payload.get("text_n1", "")) + _FIELDS_TOKENS
@@ -0,0 +1,27 @@
+import re
+from typing import Dict
+
+_FIELDS = ("aplicabilidade", "selecao", "execao", "requisito")
+
+
+def _normalize(value: str) -> str:
+    value = value.strip().strip('"').strip("'").strip()
+    return re.sub(r"\s+", " ", value).lower()
+
+
+def output_accepted(result: Dict[str, str], text_n1: str) -> bool:
+    """Checagem barata do N2 para o modo cascata.
+
+    Aceita quando os 4 campos foram lidos, o requisito nao esta vazio e todo
+    trecho preenchido aparece literalmente na sentenca N1.
+    """
+    if not result or any(field not in result for field in _FIELDS):
+        return False
+    if not _normalize(result["requisito"]):
+        return False
+    sentence = _normalize(text_n1)
+    for field in _FIELDS:
+        span = _normalize(result[field])
+        if span and span not in sentence:
+            return False
+    return True
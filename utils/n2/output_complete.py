@@ -0,0 +1,43 @@
+import re
+from typing import Callable
+
+from utils.n2.clean_output import clean_output
+from utils.n2.normalize_field_name import normalize_field_name
+from utils.n2.process_text import parse_batch_text, parse_text
+
+_CAMPOS = {"aplicabilidade", "selecao", "execao", "requisito"}
+_PADRAO_CAMPO = re.compile(r"^(.+?):")
+
+
+def output_complete(text: str) -> int | None:
+    """Posicao de corte quando os 4 campos N2 ja foram escritos, senao None.
+
+    So considera linhas terminadas (ate o ultimo "\\n") e exige requisito preenchido.
+    """
+    end = text.rfind("\n")
+    if end == -1:
+        return None
+    head = text[:end]
+    vistos = set()
+    for linha in clean_output(head).splitlines():
+        match = _PADRAO_CAMPO.match(linha.strip())
+        if match:
+            vistos.add(normalize_field_name(match.group(1).strip()))
+    if _CAMPOS <= vistos and parse_text(head)["requisito"]:
+        return end
+    return None
+
+
+def batch_output_complete(expected: int) -> Callable[[str], int | None]:
+    """Versao em lote: todos os `expected` blocos lidos e o ultimo com requisito."""
+
+    def _complete(text: str) -> int | None:
+        end = text.rfind("\n")
+        if end == -1:
+            return None
+        blocos = parse_batch_text(text[:end], expected)
+        if all(bloco is not None and bloco["requisito"] for bloco in blocos):
+            return end
+        return None
+
+    return _complete
@@ -1,11 +1,12 @@
 import re
-from typing import Dict
+from typing import Dict, List
 
 from utils.n2.clean_output import clean_output
+from utils.logs.tracing import traced
 from utils.n2.normalize_field_name import normalize_field_name
 
 
-def process_text(text: str) -> Dict[str, str]:
+def parse_text(text: str) -> Dict[str, str]:
     campos = ["aplicabilidade", "selecao", "execao", "requisito"]
     resultado: Dict[str, str] = {campo: "" for campo in campos}
 
@@ -42,3 +43,45 @@ def process_text(text: str) -> Dict[str, str]:
                     resultado[campo_atual] = trecho
 
     return {k: v.strip() for k, v in resultado.items()}
+
+
+_BLOCK_HEADER = re.compile(
+    r"^\s*(?:#+\s*(?:senten[cç]a\s*)?|senten[cç]a\s+)(\d+)\s*[:.)-]?\s*$",
+    re.IGNORECASE,
+)
+
+
+def parse_batch_text(text: str, expected: int) -> List[Dict[str, str] | None]:
+    """Separa a resposta do lote (blocos `### <n>`) em um dict por sentenca.
+
+    Blocos ausentes, repetidos ou sem nenhum campo preenchido viram None, para
+    que a sentenca seja refeita individualmente.
+    """
+    blocks: Dict[int, List[str]] = {}
+    bloco_atual: int | None = None
+    for linha in clean_output(text).splitlines():
+        match = _BLOCK_HEADER.match(linha)
+        if match:
+            numero = int(match.group(1))
+            bloco_atual = None if numero in blocks else numero
+            if bloco_atual is not None:
+                blocks[bloco_atual] = []
+        elif bloco_atual is not None:
+            blocks[bloco_atual].append(linha)
+
+    resultados: List[Dict[str, str] | None] = []
+    for numero in range(1, expected + 1):
+        linhas = blocks.get(numero)
+        if linhas is None:
+            resultados.append(None)
+            continue
+        campos = parse_text("\n".join(linhas))
+        resultados.append(campos if any(campos.values()) else None)
+    return resultados
+
+
+# Versoes com span (GEN_TRACE) para o parse final nos geradores; o detector de
+# fim do streaming (output_complete.py) usa parse_text/parse_batch_text, que
+# rodam a cada chunk e encheriam o trace.
+process_text = traced("n2.process_text")(parse_text)
+process_batch_text = traced("n2.process_batch_text")(parse_batch_text)
@@ -0,0 +1,17 @@
+from typing import Callable, Dict
+
+_OPERATOR_KEYS = ("aplicabilidade", "selecao", "execao", "requisito")
+# Os 6 campos JSON de um operador, com chaves, aspas e pontuacao.
+_FIELDS_TOKENS = 96
+
+
+def expected_output_tokens(
+    payload: Dict[str, str], count_tokens: Callable[[str], int]
+) -> int:
+    """Tokens esperados na saida N3: um objeto por operador do payload (1 no
+    modo por operador, 4 no combinado), com trechos do span N2."""
+    return sum(
+        _FIELDS_TOKENS + 2 * count_tokens(payload[key])
+        for key in _OPERATOR_KEYS
+        if key in payload
+    )
@@ -0,0 +1,17 @@
+from typing import Dict
+
+
+def output_accepted(properties: Dict[str, str] | None) -> bool:
+    """Checagem barata do N3 para o modo cascata.
+
+    Aceita quando a resposta virou propriedades (JSON valido) com `object`
+    preenchido; comparacao sem `property`/`target` tambem e rejeitada.
+    """
+    if not properties or not properties.get("object", "").strip():
+        return False
+    if properties.get("comparation", "").strip():
+        return bool(
+            properties.get("property", "").strip()
+            and properties.get("target", "").strip()
+        )
+    return True
@@ -1,6 +1,7 @@
 import json
 from typing import Dict
 
+from utils.logs.tracing import traced
 from utils.n2.clean_output import clean_output
 from utils.n2.empty_properties import empty_properties
 
@@ -29,6 +30,7 @@ def _extract_sub(data: dict, key: str) -> Dict[str, str]:
     return result
 
 
+@traced("n3.parse_combined_properties")
 def parse_combined_properties(text: str) -> Dict[str, Dict[str, str]]:
     cleaned = clean_output(text)
     start = cleaned.find("{")
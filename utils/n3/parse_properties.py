@@ -1,10 +1,12 @@
 import json
 from typing import Dict
 
+from utils.logs.tracing import traced
 from utils.n2.clean_output import clean_output
 from utils.n2.empty_properties import empty_properties
 
 
+@traced("n3.parse_properties")
 def parse_properties(text: str) -> Dict[str, str]:
     cleaned: str = clean_output(text)
     start = cleaned.find("{")
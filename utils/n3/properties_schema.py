@@ -0,0 +1,31 @@
+import os
+from typing import Any, Dict
+
+from utils.n2.empty_properties import empty_properties
+
+_COMBINED_KEYS = ("aplicabilidade", "selecao", "excecao", "requisito")
+
+
+def schema_enabled() -> bool:
+    """Default desligado; setar N3_SCHEMA=1 restringe a saida ao JSON schema."""
+    raw = os.environ.get("N3_SCHEMA", "").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def properties_schema() -> Dict[str, Any]:
+    """JSON schema de um operador N3 (campo `format` do Ollama)."""
+    fields = list(empty_properties())
+    return {
+        "type": "object",
+        "properties": {field: {"type": "string"} for field in fields},
+        "required": fields,
+    }
+
+
+def combined_properties_schema() -> Dict[str, Any]:
+    """JSON schema do N3 combinado: os 4 operadores, cada um com os 6 campos."""
+    return {
+        "type": "object",
+        "properties": {key: properties_schema() for key in _COMBINED_KEYS},
+        "required": list(_COMBINED_KEYS),
+    }
@@ -9,6 +9,8 @@ import os
 from functools import lru_cache
 from typing import Iterable, List, Tuple
 
+from utils.logs.tracing import traced
+
 
 def _enabled() -> bool:
     """Default ligado; setar VALIDATE_HUNGARIAN=0 reverte para alinhamento por indice."""
@@ -24,6 +26,7 @@ def _aligner_model():
     )
 
 
+@traced("align_lists")
 def align_lists(
     targets: List[str],
     predicted: List[str],
@@ -2,15 +2,13 @@ import gc
 import json
 import math
 import os
+import time
 from pathlib import Path
-from typing import Any, Callable, Dict, List
-
-import torch
-from fuzzywuzzy import fuzz
-from gensim.models import KeyedVectors
-from sentence_transformers import SentenceTransformer
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
 
 from config.models import MODEL_NAMES
+from utils.logs import metrics_exporter
+from utils.logs.tracing import span, traced
 from utils.validates.compute_bertscore import compute_bertscore
 from utils.validates.compute_classification_scores import (
     THRESHOLD_DEFAULT,
@@ -19,12 +17,10 @@ from utils.validates.compute_classification_scores import (
     macro_average,
     metrics_from_confusion,
 )
-from utils.validates.compute_multilingual_scores import compute_multilingual_scores
 from utils.validates.compute_rouge import compute_rouge_l
-from utils.validates.compute_sbert_scores import compute_sbert_scores
-from utils.validates.compute_tfidf_scores import compute_tfidf_scores, fit_tfidf_vectorizer
-from utils.validates.compute_wmd_scores import compute_wmd_scores
-from utils.validates.load_nilc_model import load_nilc_model, load_pt_fasttext
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
 
 
 METRIC_NAMES: List[str] = [
@@ -56,6 +52,7 @@ def _rouge_enabled() -> bool:
     return raw in {"1", "true", "yes", "on"}
 
 
+@traced("prepare_model_data")
 def prepare_model_data(
     dataset: Dict[str, Any],
     predicts_dir: str,
@@ -89,26 +86,59 @@ def prepare_model_data(
     return model_data
 
 
+class _StageProgress:
+    """Etapas (metricas) concluidas de `compute_all_scores`, para o metrics_exporter.
+
+    A duracao de uma etapa conta desde o fim da anterior, incluindo a carga do modelo.
+    """
+
+    def __init__(self, level: str):
+        self.level = level
+        self.done = 0
+        self.started = time.time()
+        metrics_exporter.set_gauge("validation_stages", len(METRIC_NAMES), level=level)
+        metrics_exporter.set_gauge("validation_stages_done", 0, level=level)
+
+    def finish(self, metric_name: str) -> None:
+        now = time.time()
+        self.done += 1
+        metrics_exporter.set_gauge(
+            "validation_stage_seconds", now - self.started, level=self.level, stage=metric_name
+        )
+        metrics_exporter.set_gauge("validation_stages_done", self.done, level=self.level)
+        self.started = now
+
+
 def _apply_to_datasets(
     datasets: List[Dict[str, Dict[str, Any]]],
     metric_name: str,
     score_fn: Callable[[Dict[str, Any]], List[float | None]],
+    progress: _StageProgress,
 ) -> None:
     for dataset in datasets:
         for model, data in dataset.items():
-            scores = score_fn(data)
+            with span("metric", metric=metric_name, model=model):
+                scores = score_fn(data)
             data["scores"][metric_name] = scores
             print(f"Modelo {model}: {metric_name} validado.", flush=True)
+    progress.finish(metric_name)
 
 
-def _fill_missing(datasets: List[Dict[str, Dict[str, Any]]], metric_name: str) -> None:
+def _fill_missing(
+    datasets: List[Dict[str, Dict[str, Any]]],
+    metric_name: str,
+    progress: _StageProgress,
+) -> None:
     for dataset in datasets:
         for model, data in dataset.items():
             data["scores"][metric_name] = [None] * len(data["targets"])
             print(f"Modelo {model}: {metric_name} indisponivel.", flush=True)
+    progress.finish(metric_name)
 
 
 def _release_gpu() -> None:
+    import torch
+
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
 
@@ -127,8 +157,21 @@ def _collect_vocab(datasets: List[Dict[str, Dict[str, Any]]]) -> set:
     return vocab
 
 
-def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
+@traced("compute_all_scores")
+def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]], level: str = "") -> None:
+    # torch, sentence_transformers, gensim e sklearn so carregam aqui: importar
+    # o modulo (menus, prepare_model_data, write_metrics) continua leve.
+    from fuzzywuzzy import fuzz
+    from sentence_transformers import SentenceTransformer
+
+    from utils.validates.compute_multilingual_scores import compute_multilingual_scores
+    from utils.validates.compute_sbert_scores import compute_sbert_scores
+    from utils.validates.compute_tfidf_scores import compute_tfidf_scores, fit_tfidf_vectorizer
+    from utils.validates.compute_wmd_scores import compute_wmd_scores
+    from utils.validates.load_nilc_model import load_nilc_model, load_pt_fasttext
+
     debug = _debug_enabled()
+    progress = _StageProgress(level)
 
     _apply_to_datasets(
         datasets,
@@ -137,6 +180,7 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
             fuzz.partial_ratio(t, p) / 100.0
             for t, p in zip(d["targets"], d["predicted"])
         ],
+        progress,
     )
 
     corpus: List[str] = []
@@ -148,6 +192,7 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
         datasets,
         "tfidf",
         lambda d: compute_tfidf_scores(d["targets"], d["predicted"], vectorizer=tfidf_vec),
+        progress,
     )
 
     sbert_repo = os.environ.get(
@@ -160,6 +205,7 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
         datasets,
         "sbert",
         lambda d: compute_sbert_scores(sbert_model, d["targets"], d["predicted"]),
+        progress,
     )
     del sbert_model
     gc.collect()
@@ -174,6 +220,7 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
         datasets,
         "bertimbau",
         lambda d: compute_sbert_scores(bertimbau_model, d["targets"], d["predicted"]),
+        progress,
     )
     del bertimbau_model
     gc.collect()
@@ -190,6 +237,7 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
         lambda d: compute_multilingual_scores(
             multilingual_model, d["targets"], d["predicted"]
         ),
+        progress,
     )
     del multilingual_model
     gc.collect()
@@ -204,11 +252,12 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
             datasets,
             "wmd_ft",
             lambda d: compute_wmd_scores(word_vectors_ft, d["targets"], d["predicted"]),
+            progress,
         )
         del word_vectors_ft
         gc.collect()
     else:
-        _fill_missing(datasets, "wmd_ft")
+        _fill_missing(datasets, "wmd_ft", progress)
 
     word_vectors_nilc: KeyedVectors | None = load_nilc_model(vocab_whitelist=vocab)
     if word_vectors_nilc is not None:
@@ -218,6 +267,7 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
             lambda d: compute_wmd_scores(
                 word_vectors_nilc, d["targets"], d["predicted"]
             ),
+            progress,
         )
         del word_vectors_nilc
         gc.collect()
@@ -226,7 +276,7 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
             "Modelo NILC nao encontrado em models/cbow_s300.txt ou src/models/cbow_s300.txt.",
             flush=True,
         )
-        _fill_missing(datasets, "wmd_nilc")
+        _fill_missing(datasets, "wmd_nilc", progress)
 
     if _bertscore_enabled():
         if debug:
@@ -235,10 +285,11 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
             datasets,
             "bertscore",
             lambda d: compute_bertscore(d["targets"], d["predicted"], lang="pt"),
+            progress,
         )
         _release_gpu()
     else:
-        _fill_missing(datasets, "bertscore")
+        _fill_missing(datasets, "bertscore", progress)
 
     if _rouge_enabled():
         if debug:
@@ -247,9 +298,10 @@ def compute_all_scores(datasets: List[Dict[str, Dict[str, Any]]]) -> None:
             datasets,
             "rouge_l",
             lambda d: compute_rouge_l(d["targets"], d["predicted"]),
+            progress,
         )
     else:
-        _fill_missing(datasets, "rouge_l")
+        _fill_missing(datasets, "rouge_l", progress)
 
 
 def _get_score(scores: List[Any], i: int) -> Any:
@@ -360,6 +412,7 @@ def _split_items_enabled() -> bool:
     return raw in {"1", "true", "yes", "on"}
 
 
+@traced("write_metrics")
 def write_metrics(output_path: str | None, metrics: Dict[str, Any]) -> None:
     if not output_path:
         return
@@ -412,7 +465,7 @@ def run_validation(
         dataset: Dict[str, Any] = json.load(file)
 
     model_data = prepare_model_data(dataset, predicts_dir, build_pairs_fn, prefix)
-    compute_all_scores([model_data])
+    compute_all_scores([model_data], level)
     metrics = build_metrics(model_data, level=level)
     write_metrics(output_path, metrics)
 
@@ -1,10 +1,5 @@
 from typing import List, Tuple
 
-from validates.validate_n1 import validate_n1
-from validates.validate_n2 import validate_n2
-from validates.validate_n3 import validate_n3
-from validates.validate_n1n2 import validate_n1n2
-from validates.validate_n1n2n3 import validate_n1n2n3
 from utils.screens.clear_screen import clear_screen
 from utils.screens.menu_bar_line import menu_bar_line
 from utils.screens.menu_prompt import menu_prompt
@@ -78,15 +73,23 @@ def menu_validate() -> None:
                 continue
             ran_any = False
             if "n1" in active_ns:
+                from validates.validate_n1 import validate_n1
+
                 validate_n1("dataset.json", "predicts", "metrics/validate_n1.json")
                 ran_any = True
             if "n2" in active_ns:
+                from validates.validate_n2 import validate_n2
+
                 validate_n2("dataset.json", "predicts", "metrics/validate_n2.json")
                 ran_any = True
             if "n3" in active_ns:
+                from validates.validate_n3 import validate_n3
+
                 validate_n3("dataset.json", "predicts", "metrics/validate_n3.json")
                 ran_any = True
             if "n1n2" in active_ns:
+                from validates.validate_n1n2 import validate_n1n2
+
                 validate_n1n2(
                     "dataset.json",
                     "predicts",
@@ -94,6 +97,8 @@ def menu_validate() -> None:
                 )
                 ran_any = True
             if "n1n2n3" in active_ns:
+                from validates.validate_n1n2n3 import validate_n1n2n3
+
                 validate_n1n2n3(
                     "dataset.json",
                     "predicts",
@@ -48,7 +48,7 @@ def validate_n1n2(
     n2_model_data = prepare_model_data(
         dataset, predicts_dir, build_pairs_n2, "generate_n1n2", label="N2"
     )
-    compute_all_scores([n1_model_data, n2_model_data])
+    compute_all_scores([n1_model_data, n2_model_data], "n1n2")
 
     n1_metrics = build_metrics(n1_model_data, level="n1")
     n2_metrics = build_metrics(n2_model_data, level="n2")